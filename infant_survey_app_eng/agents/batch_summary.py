@@ -0,0 +1,262 @@
+
+# Headless clinical-summary job: finds saved responses without a summary for the current
+# prompt version, summarises them with bounded concurrency and rate-limit-aware retries,
+# and writes each result back into its response file.
+#   python -m agents.batch_summary [--resp-dir data/responses] [--concurrency 4] [--fake]
+import argparse, glob, json, os, random, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from agents.summary import PROMPT_VERSION, summary_messages
+from modules.persistence import write_json_atomic
+
+CHECKPOINT_NAME = ".summary_job.json"
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 5            # per response, for errors other than rate limits
+RATE_LIMIT_DEADLINE = 600.0  # seconds a response keeps waiting out 429s before it fails
+MAX_ATTEMPTS = 3           # runs a failing response is tried in before it is left for a person
+BACKOFF_BASE = 1.0         # seconds; doubled per retry, with jitter
+BACKOFF_CAP = 60.0
+
+def needs_summary(payload: dict) -> bool:
+    return not payload.get("ai_summary") or payload.get("summary_version") != PROMPT_VERSION
+
+def retry_delay(exc: BaseException, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retrying `exc`, or None when retrying cannot help.
+    Rate limits honour the server's Retry-After; timeouts, connection errors and
+    5xx back off exponentially. Other errors (bad request, auth) are final.
+    """
+    status = getattr(exc, "status_code", None)
+    backoff = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random() / 2)
+    if status == 429:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        try:
+            return min(BACKOFF_CAP, float(headers.get("retry-after")))
+        except (TypeError, ValueError):
+            return backoff
+    if status is not None:
+        return backoff if status >= 500 else None
+    name = type(exc).__name__
+    if isinstance(exc, (TimeoutError, ConnectionError)) or "Timeout" in name or "Connection" in name:
+        return backoff
+    return None
+
+class Checkpoint:
+    """
+    Per-response failure counts across runs, saved atomically. Finished responses
+    need no entry: their files already carry the current summary version.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.failed: Dict[str, dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("prompt_version") == PROMPT_VERSION:
+                    self.failed = data.get("failed", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable checkpoint {path}: {e}")
+        self._lock = threading.Lock()
+
+    def attempts(self, name: str) -> int:
+        with self._lock:
+            return self.failed.get(name, {}).get("attempts", 0)
+
+    def record(self, name: str, error: Optional[str]):
+        with self._lock:
+            if error is None:
+                self.failed.pop(name, None)
+            else:
+                entry = self.failed.setdefault(name, {"attempts": 0})
+                entry["attempts"] += 1
+                entry["error"] = error
+
+    def save(self):
+        with self._lock:
+            data = {"prompt_version": PROMPT_VERSION, "failed": dict(self.failed)}
+        write_json_atomic(self.path, data, fsync=False)
+
+class SummaryJob:
+    """
+    `llm_factory()` is called once; the model is shared by the worker threads. When
+    any worker is rate limited, all of them wait out the same cool-down and fewer
+    requests are sent at once until the provider accepts them again.
+    """
+
+    def __init__(self, llm_factory: Callable[[], object], resp_dir: str = "data/responses",
+                 concurrency: int = DEFAULT_CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 max_attempts: int = MAX_ATTEMPTS, checkpoint_every: float = 10.0,
+                 sleep: Callable[[float], None] = time.sleep, rules=None,
+                 rate_limit_deadline: float = RATE_LIMIT_DEADLINE):
+        self.llm_factory = llm_factory
+        self.resp_dir = resp_dir
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.rate_limit_deadline = rate_limit_deadline
+        self.max_attempts = max_attempts
+        self.checkpoint_every = checkpoint_every
+        self.sleep = sleep
+        self.rules = rules   # questionnaire rule table: flagged answers survive the prompt budget
+        self.checkpoint = Checkpoint(os.path.join(resp_dir, CHECKPOINT_NAME))
+        # Requests in flight are capped at `allowed`: halved on a 429, raised by one after
+        # `allowed` successes in a row, so the job settles near what the provider accepts.
+        self.allowed = concurrency
+        self._in_flight = 0
+        self._streak = 0
+        self._pause_until = 0.0
+        self._cond = threading.Condition()
+        self.counters = {"retries": 0, "rate_limited": 0, "min_allowed": concurrency}
+
+    def pending(self) -> List[str]:
+        out = []
+        for path in sorted(glob.glob(os.path.join(self.resp_dir, "resp_*.json"))):
+            if self.checkpoint.attempts(os.path.basename(path)) >= self.max_attempts:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    if needs_summary(json.load(f)):
+                        out.append(path)
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable response {path}: {e}")
+        return out
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                wait = self._pause_until - time.monotonic()
+                if wait <= 0 and self._in_flight < self.allowed:
+                    self._in_flight += 1
+                    return
+                self._cond.wait(wait if wait > 0 else None)
+
+    def _release(self, rate_limited: bool = False, delay: float = 0.0):
+        with self._cond:
+            self._in_flight -= 1
+            if rate_limited:
+                self.allowed = max(1, self.allowed // 2)
+                self._streak = 0
+                self._pause_until = max(self._pause_until, time.monotonic() + delay)
+                self.counters["rate_limited"] += 1
+                self.counters["min_allowed"] = min(self.counters["min_allowed"], self.allowed)
+            else:
+                self._streak += 1
+                if self._streak >= self.allowed and self.allowed < self.concurrency:
+                    self.allowed += 1
+                    self._streak = 0
+            self._cond.notify_all()
+
+    def _generate(self, llm, payload: dict) -> str:
+        """
+        A 429 says the provider is busy, not that this response is bad: rate-limited
+        attempts do not use up max_retries and are only given up after
+        rate_limit_deadline seconds of being limited.
+        """
+        messages = summary_messages(payload["responses"], payload["child_info"], rules=self.rules)
+        attempt, limits, limited_since = 0, 0, None
+        while True:
+            self._acquire()
+            try:
+                text = llm.invoke(messages).content
+            except Exception as e:
+                limited = getattr(e, "status_code", None) == 429
+                delay = retry_delay(e, limits if limited else attempt)
+                self._release(limited, delay or 0.0)
+                if limited:
+                    limits += 1
+                    if limited_since is None:
+                        limited_since = time.monotonic()
+                    elif time.monotonic() - limited_since >= self.rate_limit_deadline:
+                        raise
+                else:
+                    if delay is None or attempt == self.max_retries:
+                        raise
+                    attempt += 1
+                with self._cond:
+                    self.counters["retries"] += 1
+                if not limited:
+                    self.sleep(delay)
+                continue
+            self._release()
+            return text
+
+    def summarize_file(self, llm, path: str) -> str:
+        """
+        Returns "summarized", or "skipped" when the file was already up to date or
+        changed while its summary was generated.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if not needs_summary(payload):
+            return "skipped"
+        mtime = os.stat(path).st_mtime_ns
+        summary = self._generate(llm, payload)
+        if os.stat(path).st_mtime_ns != mtime:
+            return "skipped"   # rewritten meanwhile; the next run sees the new content
+        payload.update(ai_summary=summary, summary_version=PROMPT_VERSION,
+                       summarized_at=datetime.now().isoformat(), summary_source="batch")
+        write_json_atomic(path, payload)
+        return "summarized"
+
+    def run(self, progress: Optional[Callable[[dict], None]] = None) -> dict:
+        t0 = time.perf_counter()
+        paths = self.pending()
+        report = {"pending": len(paths), "summarized": 0, "skipped": 0, "failed": 0, "errors": {}}
+        llm = self.llm_factory() if paths else None
+        last_save = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="summary-job") as pool:
+            futures = {pool.submit(self.summarize_file, llm, p): os.path.basename(p) for p in paths}
+            for fut in as_completed(futures):
+                name = futures[fut]
+                try:
+                    report[fut.result()] += 1
+                    self.checkpoint.record(name, None)
+                except Exception as e:
+                    report["failed"] += 1
+                    report["errors"][name] = str(e)
+                    self.checkpoint.record(name, str(e))
+                if time.monotonic() - last_save >= self.checkpoint_every:
+                    self.checkpoint.save()
+                    last_save = time.monotonic()
+                if progress is not None:
+                    progress(report)
+        if paths:
+            self.checkpoint.save()
+        report.update(self.counters)
+        report["seconds"] = time.perf_counter() - t0
+        report["patients_per_min"] = report["summarized"] * 60 / report["seconds"] if report["seconds"] else 0.0
+        return report
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--resp-dir", default="data/responses")
+    ap.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    ap.add_argument("--fake", action="store_true", help="fake provider, no API calls (SUMMARY_LLM_PROVIDER=fake)")
+    ap.add_argument("--survey", default="config/questionnaires/px_previsit_1.0.0.json")
+    args = ap.parse_args()
+
+    rules = None
+    try:
+        from modules.survey_index import load_survey_index
+        rules = load_survey_index(args.survey).rules
+    except Exception as e:
+        print(f"Questionnaire rules unavailable, answers kept in questionnaire order: {e}")
+
+    if args.fake:
+        os.environ["SUMMARY_LLM_PROVIDER"] = "fake"
+        os.environ.setdefault("FAKE_LLM_LATENCY", "0.2")
+    from agents import registry
+    job = SummaryJob(lambda: registry.chat_model(role="summary"), args.resp_dir,
+                     concurrency=args.concurrency, rules=rules)
+    r = job.run(lambda r: print(f"\r{r['summarized'] + r['skipped'] + r['failed']}/{r['pending']}", end="", flush=True))
+    print(f"\nSummarized {r['summarized']}/{r['pending']} in {r['seconds']:.1f}s "
+          f"({r['patients_per_min']:.1f} patients/min), {r['failed']} failed, "
+          f"{r['retries']} retries ({r['rate_limited']} rate limited)")
+    for name, err in r["errors"].items():
+        print(f"  {name}: {err}")
+
+if __name__ == "__main__":
+    main()
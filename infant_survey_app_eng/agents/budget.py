@@ -0,0 +1,200 @@
+
+# Prompt-size budgets. Tokens are counted locally (tiktoken, or ~4 characters per token
+# when its encoding cannot be loaded); survey answers are ranked by clinical relevance
+# and chat context is deduplicated and compacted until each prompt fits its budget.
+import logging, re, threading, time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from agents.prescreen import FLAG, NORMAL
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+CHARS_PER_TOKEN = 4
+SUMMARY_BUDGET = 1500      # tokens of survey answers in the summary prompt
+CHAT_BUDGET = 1200         # tokens of history + guidance + documents in a chat prompt
+GUIDANCE_SHARE = 0.4       # of CHAT_BUDGET at most; unused room goes to the history
+DOCUMENT_SHARE = 0.35
+RECENT_TURNS = 2           # newest chat turns kept verbatim; older ones shrink to one sentence
+OLD_TURN_TOKENS = 40
+
+SENTENCE_END = re.compile(r"(?<=[.!?。])\s+|\n+")
+SENTENCE_SPLIT = re.compile(r"((?<=[.!?。])\s+|\n+)")
+MIN_DEDUPE_WORDS = 4       # shorter fragments ("Yes.", headers) repeat legitimately
+
+_encoders: Dict[str, object] = {}
+_encoders_lock = threading.Lock()
+
+def get_encoder(model: str = DEFAULT_MODEL):
+    """
+    tiktoken encoding for `model`, loaded once; None (character estimate) when
+    tiktoken is missing or its encoding file cannot be fetched.
+    """
+    with _encoders_lock:
+        if model not in _encoders:
+            enc = None
+            if tiktoken is not None:
+                try:
+                    try:
+                        enc = tiktoken.encoding_for_model(model)
+                    except KeyError:
+                        enc = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    print(f"tiktoken unavailable, estimating {CHARS_PER_TOKEN} characters per token: {e}")
+            _encoders[model] = enc
+        return _encoders[model]
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    if not text:
+        return 0
+    enc = get_encoder(model)
+    if enc is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(enc.encode(text, disallowed_special=()))
+
+def clip(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """
+    First `max_tokens` of `text`, cut back to a sentence or line end when one is near.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    enc = get_encoder(model)
+    if enc is None:
+        head = text[:max_tokens * CHARS_PER_TOKEN]
+    else:
+        head = enc.decode(enc.encode(text, disallowed_special=())[:max_tokens])
+    ends = [m.start() for m in SENTENCE_END.finditer(head)]
+    if ends and ends[-1] >= len(head) // 2:
+        head = head[:ends[-1]]
+    return head.rstrip() + " …"
+
+@dataclass
+class PromptMetrics:
+    label: str
+    budget: int
+    raw_tokens: int            # before compaction
+    tokens: int                # after
+    dropped: int = 0           # answers, turns or sentences left out
+    seconds: float = 0.0
+    at: float = field(default_factory=time.time)
+
+# Recent prompt sizes, newest last, for operators to inspect.
+recent_prompts: "deque[PromptMetrics]" = deque(maxlen=200)
+_metrics_lock = threading.Lock()
+
+def record(prompt: PromptMetrics) -> PromptMetrics:
+    with _metrics_lock:
+        recent_prompts.append(prompt)
+    metrics.inc("prompt_tokens_total", prompt.tokens, prompt=prompt.label)
+    metrics.inc("prompt_tokens_saved_total", max(prompt.raw_tokens - prompt.tokens, 0), prompt=prompt.label)
+    logger.info("%s prompt: %d -> %d tokens (budget %d, %d dropped, %.1f ms)", prompt.label,
+                prompt.raw_tokens, prompt.tokens, prompt.budget, prompt.dropped, prompt.seconds * 1000)
+    return prompt
+
+# --- Survey answers ---
+
+def answer_priority(item: dict, rules=None, flagged: Iterable[str] = ()) -> int:
+    """
+    0: flagged (triage warning or a rule-table flag), 1: needs judgement (free text,
+    unlabelled options), 2: an answer the questionnaire marks as normal.
+    """
+    if item.get("id") in flagged:
+        return 0
+    if rules is None:
+        return 1
+    verdict = rules.lookup(item.get("id"), str(item.get("answer"))).verdict
+    return {FLAG: 0, NORMAL: 2}.get(verdict, 1)
+
+def fit_answers(lines: Sequence[Tuple[dict, str]], budget: int, rules=None, flagged: Iterable[str] = (),
+                model: str = DEFAULT_MODEL) -> Tuple[List[str], int]:
+    """
+    (item, rendered line) pairs -> the lines that fit `budget`, most relevant first in
+    line for the room, returned in questionnaire order; plus how many were left out.
+    """
+    flagged = set(flagged)
+    order = sorted(range(len(lines)), key=lambda i: (answer_priority(lines[i][0], rules, flagged), i))
+    keep, used = set(), 0
+    for i in order:
+        n = count_tokens(lines[i][1], model)
+        if used + n > budget:
+            continue
+        keep.add(i)
+        used += n
+    return [lines[i][1] for i in range(len(lines)) if i in keep], len(lines) - len(keep)
+
+# --- Chat ---
+
+def _norm(sentence: str) -> str:
+    return " ".join(re.findall(r"\w+", sentence.lower()))
+
+def dedupe_sentences(text: str, seen: set) -> Tuple[str, int]:
+    """
+    Drops sentences of `text` already in `seen` (normalised), adding the rest to it.
+    Line breaks and "[section]" headers are kept.
+    """
+    out, dropped = [], 0
+    pieces = SENTENCE_SPLIT.split(text or "")
+    for sentence, sep in zip(pieces[::2], pieces[1::2] + [""]):
+        key = _norm(sentence)
+        if not key:
+            continue
+        if len(key.split()) >= MIN_DEDUPE_WORDS and not sentence.lstrip().startswith("["):
+            if key in seen:
+                dropped += 1
+                continue
+            seen.add(key)
+        out.append(sentence + sep)
+    return "".join(out).strip(), dropped
+
+def compact_history(messages: Sequence[dict], budget: int, seen: Optional[set] = None,
+                    model: str = DEFAULT_MODEL) -> Tuple[List[str], int]:
+    """
+    "role: content" lines within `budget`. The newest RECENT_TURNS stay whole (clipped
+    if huge, e.g. a full clinical summary); older turns shrink to their first sentence;
+    the oldest go first when still over budget. Sentences in `seen` are left out.
+    """
+    seen = set() if seen is None else seen
+    lines, dropped = [], 0
+    for age, m in enumerate(reversed(messages)):
+        content, n = dedupe_sentences(m["content"], seen)
+        dropped += n
+        if not content:
+            continue
+        if age >= RECENT_TURNS:
+            content = clip(SENTENCE_END.split(content, maxsplit=1)[0], OLD_TURN_TOKENS, model)
+        lines.append(f"{m['role']}: {clip(content, budget // 2, model)}")
+    while lines and count_tokens("\n".join(lines), model) > budget:
+        lines.pop()
+        dropped += 1
+    return list(reversed(lines)), dropped
+
+def chat_context(question: str, history: Sequence[dict], guidance: str, documents: str,
+                 budget: int = CHAT_BUDGET, model: str = DEFAULT_MODEL) -> Dict[str, str]:
+    """
+    history/guidance/documents sections for the sidebar prompt, within `budget` tokens
+    together. Guidance outranks documents, documents outrank history; a sentence
+    appears once, in the highest section that has it.
+    """
+    t0 = time.perf_counter()
+    raw = sum(count_tokens(t, model) for t in [guidance, documents] + [m["content"] for m in history])
+    seen = {_norm(question)}
+    guidance, d1 = dedupe_sentences(guidance, seen) if guidance else ("", 0)
+    guidance = clip(guidance, int(budget * GUIDANCE_SHARE), model)
+    documents, d2 = dedupe_sentences(documents, seen) if documents else ("", 0)
+    documents = clip(documents, int(budget * DOCUMENT_SHARE), model)
+    room = budget - count_tokens(guidance, model) - count_tokens(documents, model)
+    lines, d3 = compact_history(history, room, seen, model)
+    out = {"history": "\n".join(lines), "guidance": guidance, "documents": documents}
+    record(PromptMetrics("chat", budget, raw, sum(count_tokens(t, model) for t in out.values()),
+                         d1 + d2 + d3, time.perf_counter() - t0))
+    return out
@@ -1,13 +1,24 @@
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from utils.splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+from utils.llm_cache import cached_llm
+from agents.streaming import background
+from agents.registry import chat_model, embeddings
+from utils.ingest import MANIFEST_NAME, ingest_directory, load_manifest
+from utils.bm25 import HybridRetriever
+from utils.ann import IndexSpec
+from utils.metrics import metrics
 from langchain_core.prompts import ChatPromptTemplate
-import glob, os
+from concurrent.futures import Future
+import json, os
+from typing import Optional
 
 VS_DIR = "data/vectorstore"
+VS_DIR_ENV = "VECTORSTORE_DIR"      # another store folder (benchmarks, a scratch copy)
+VS_MODEL_NAME = "embeddings.json"   # which embedding model the stored vectors came from
 DOC_DIR = "data/docs"
+INGEST_BATCH = 256  # chunks per embedding request
+VS_INDEX = IndexSpec("hnsw", m=32, ef_construction=200, ef_search=64)  # Chroma HNSW, set at collection creation
 
 SYSTEM = """
 You are a pediatric guide assistant. Answer accurately and concisely in English based on the provided documents.
@@ -19,37 +30,82 @@ QA_TMPL = ChatPromptTemplate.from_messages([
     ("human", "Question: {question}\nReference:\n{context}\nAnswer based on the reference.")
 ])
 
-def ensure_vectorstore():
-    os.makedirs(VS_DIR, exist_ok=True)
-    if not os.listdir(VS_DIR):
-        docs = []
-        for p in glob.glob(os.path.join(DOC_DIR, "**/*"), recursive=True):
-            try:
-                lp = p.lower()
-                if lp.endswith(".pdf"): docs.extend(PyPDFLoader(p).load())
-                elif lp.endswith(".docx"): docs.extend(Docx2txtLoader(p).load())
-                elif lp.endswith(".txt"): docs.extend(TextLoader(p, encoding="utf-8").load())
-            except Exception as e:
-                print(f"Failed to load document {p}: {e}")
-
-        if docs:
-            splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-            chunks = splitter.split_documents(docs)
-            vs = Chroma.from_documents(chunks, embedding=OpenAIEmbeddings(), persist_directory=VS_DIR)
-            vs.persist()
-
-def get_rag_chain():
-    ensure_vectorstore()
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    vs = Chroma(persist_directory=VS_DIR, embedding_function=OpenAIEmbeddings())
-    retriever = vs.as_retriever(search_kwargs={"k": 3})
+def _print_progress(r):
+    print(f"Ingesting: {r['added'] + r['changed'] + r['failed']}/{r['files']} files, "
+          f"{r['embedded']} chunks embedded ({r['embed_chunks_per_sec']:.0f}/s)")
 
-    def _invoke(inputs):
-        question = inputs.get("question","")
-        docs = retriever.get_relevant_documents(question) if vs else []
+def _stored_model(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def ensure_vectorstore(vs_dir: Optional[str] = None):
+    """
+    Opens the Chroma store and embeds only documents added or edited since the last run.
+    """
+    vs_dir = vs_dir or os.environ.get(VS_DIR_ENV) or VS_DIR
+    os.makedirs(vs_dir, exist_ok=True)
+    manifest = os.path.join(vs_dir, MANIFEST_NAME)
+    model_path = os.path.join(vs_dir, VS_MODEL_NAME)
+    emb = embeddings()
+    model = {"provider": emb.provider, "model": emb.model}
+    legacy = os.listdir(vs_dir) and (load_manifest(manifest) is None or _stored_model(model_path) != model)
+    vs = Chroma(persist_directory=vs_dir, embedding_function=emb,
+                   collection_metadata=VS_INDEX.chroma_metadata())
+    if legacy:
+        # Built before the manifest existed (chunk ids unknown) or with another embedding
+        # model (vectors not comparable with the queries): rebuild once.
+        vs.delete_collection()
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        vs = Chroma(persist_directory=vs_dir, embedding_function=emb,
+                   collection_metadata=VS_INDEX.chroma_metadata())
+    with open(model_path, "w", encoding="utf-8") as f:
+        json.dump(model, f)
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+    persist = (lambda store: store.persist()) if hasattr(vs, "persist") else None
+    _, report = ingest_directory(DOC_DIR, vs, manifest, splitter=splitter, persist=persist,
+                                 batch_size=INGEST_BATCH, progress=_print_progress)
+    if report["embedded"] or report["removed"]:
+        print(f"Vector store updated: {report}")
+    return vs
+
+def get_rag_chain(llm=None, retriever=None):
+    """
+    retrieve() and answer() are exposed separately so callers can start retrieval
+    with submit() and keep assembling their own prompt while it runs.
+    """
+    if retriever is None:
+        vs = ensure_vectorstore()
+        try:
+            # BM25 over the same chunks; keyword questions skip the embedding call.
+            retriever = HybridRetriever.from_vectorstore(vs, k=3)
+        except Exception as e:
+            print(f"Lexical index unavailable, using vector search only: {e}")
+            retriever = vs.as_retriever(search_kwargs={"k": 3})
+    llm = cached_llm(llm or chat_model(role="rag"))
+
+    def _retrieve(question):
+        return retriever.invoke(question) if retriever else []
+
+    def _answer(question, docs):
         context = "\n\n".join(d.page_content[:1200] for d in docs) if docs else "No documents"
         prompt = QA_TMPL.format_messages(question=question, context=context)
         out = llm.invoke(prompt)
         return {"answer": out.content, "sources": [getattr(d, "metadata", {}) for d in docs]}
 
-    return type("RAGChain", (), {"invoke": staticmethod(_invoke)})
+    def _invoke(inputs):
+        question = inputs.get("question","")
+        with metrics.span("rag.retrieve"):
+            docs = _retrieve(question)
+        with metrics.span("rag.answer"):
+            return _answer(question, docs)
+
+    def _submit(inputs) -> Future:
+        return background.submit(_invoke, inputs)
+
+    return type("RAGChain", (), {"invoke": staticmethod(_invoke), "submit": staticmethod(_submit),
+                                 "retrieve": staticmethod(_retrieve), "answer": staticmethod(_answer)})
@@ -0,0 +1,55 @@
+
+import threading, time
+from typing import Callable, Iterator, Optional
+
+def prompt_text(messages) -> str:
+    """
+    Flattens whatever a chat model accepts (str, (role, text) tuples, message objects) to text.
+    """
+    if isinstance(messages, str):
+        return messages
+    parts = []
+    for m in messages:
+        if isinstance(m, tuple):
+            parts.append(str(m[1]))
+        else:
+            parts.append(str(getattr(m, "content", m)))
+    return "\n".join(parts)
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+class FakeChatModel:
+    """
+    In-process stand-in for ChatOpenAI: same invoke()/stream() shape, fixed latency, no network.
+    Used by the benchmarks to measure orchestration overhead deterministically.
+    `latency` is the time to the first token; each further token adds `token_latency`.
+    """
+
+    def __init__(self, respond: Optional[Callable[[str], str]] = None, latency: float = 0.0,
+                 model_name: str = "fake", temperature: float = 0.0, token_latency: float = 0.0):
+        self.respond = respond or (lambda text: "PASS")
+        self.latency = latency
+        self.token_latency = token_latency
+        self.model_name = model_name
+        self.temperature = temperature
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **kwargs) -> FakeMessage:
+        with self._lock:
+            self.calls += 1
+        text = self.respond(prompt_text(messages))
+        time.sleep(self.latency + self.token_latency * max(len(text.split(" ")) - 1, 0))
+        return FakeMessage(text)
+
+    def stream(self, messages, **kwargs) -> Iterator[FakeMessage]:
+        with self._lock:
+            self.calls += 1
+        words = self.respond(prompt_text(messages)).split(" ")
+        time.sleep(self.latency)
+        for i, w in enumerate(words):
+            if i:
+                time.sleep(self.token_latency)
+            yield FakeMessage(w if i == 0 else " " + w)
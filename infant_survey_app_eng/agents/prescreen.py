@@ -0,0 +1,94 @@
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+# Verdicts of the rule table.
+NORMAL = "normal"      # no warning, skip the LLM
+FLAG = "flag"          # canned warning from the questionnaire's own guidance
+NEEDS_LLM = "llm"      # ambiguous or free text: ask the model
+
+# "Yes = Good, No/Don't Know = Education Needed"
+LABEL_PAIR = re.compile(r"([A-Za-z' ]+(?:/[A-Za-z' ]+)*?)\s*=\s*([^,/]+?)(?=,|$)")
+# Criteria that describe the finding itself ("If there is a history of ...", "... needed if ...")
+CONDITIONAL = re.compile(r"(^|\b)if\b|risk", re.I)
+NEGATED = re.compile(r"\bnot\s+(taken|performed|done)\b", re.I)
+
+@dataclass(frozen=True)
+class Rule:
+    verdict: str
+    message: Optional[str] = None
+
+ASK_LLM = Rule(NEEDS_LLM)
+
+def _flag_message(label: str, actions: Optional[str]) -> str:
+    # First sentence of the question's own action text, so flags carry concrete advice.
+    advice = (actions or "").strip()
+    advice = re.split(r"(?<=[.!?])\s", advice, maxsplit=1)[0] if advice and advice != "None" else ""
+    return f"⚠️ {label.strip()}" + (f": {advice}" if advice else "")
+
+def _labelled_rules(q, options) -> Dict[str, Rule]:
+    rules = {}
+    for names, label in LABEL_PAIR.findall(q.criteria or ""):
+        verdict = NORMAL if "good" in label.lower() else FLAG
+        for name in names.split("/"):
+            name = name.strip()
+            if name in options:
+                rules[name] = Rule(verdict, None if verdict == NORMAL else _flag_message(label, q.actions))
+    # "Yes = Caution Needed" alone: the other option of a two-way question is the normal one.
+    if len(options) == 2 and len(rules) == 1:
+        (only, rule), = rules.items()
+        if rule.verdict == FLAG:
+            rules[next(o for o in options if o != only)] = Rule(NORMAL)
+    return rules
+
+def _conditional_rules(q, options) -> Dict[str, Rule]:
+    crit = q.criteria or ""
+    if len(options) != 2 or not CONDITIONAL.search(crit):
+        return {}
+    if set(options) == {"Yes", "No"}:
+        # The question asks about the risk finding: "No" is clear, "Yes" needs age-aware advice.
+        return {"No": Rule(NORMAL)}
+    positive = next((o for o in options if not o.lower().startswith("not ")), None)
+    negative = next((o for o in options if o.lower().startswith("not ")), None)
+    if not positive or not negative:
+        return {}
+    # "Early evaluation needed if hearing test not performed" flags "Not Taken";
+    # "If currently wearing a device" flags "Wearing".
+    flagged, normal = (negative, positive) if NEGATED.search(crit) else (positive, negative)
+    return {flagged: Rule(FLAG, _flag_message("Follow-up Needed", q.actions)), normal: Rule(NORMAL)}
+
+class RuleTable:
+    """
+    (question id, option) -> Rule, compiled once from the questionnaire.
+    Anything not in the table (free text, numbers, unlabelled options) goes to the LLM.
+    """
+
+    def __init__(self, rules: Dict[Tuple[str, str], Rule]):
+        self.rules = rules
+
+    @classmethod
+    def compile(cls, questions: Iterable) -> "RuleTable":
+        rules = {}
+        for q in questions:
+            if q.qtype != "single" or not q.options:
+                continue
+            per_option = _labelled_rules(q, q.options) or _conditional_rules(q, q.options)
+            for option, rule in per_option.items():
+                rules[(q.id, option)] = rule
+        return cls(rules)
+
+    def lookup(self, q_id: str, answer: str) -> Rule:
+        return self.rules.get((q_id, answer), ASK_LLM)
+
+    def coverage(self) -> Dict[str, int]:
+        """
+        Number of (question, option) pairs per verdict.
+        """
+        out = {NORMAL: 0, FLAG: 0}
+        for rule in self.rules.values():
+            out[rule.verdict] += 1
+        return out
+
+def compile_rules(pack) -> RuleTable:
+    return RuleTable.compile(pack.questions)
@@ -0,0 +1,126 @@
+
+# Chat model backends by name: "openai" (hosted, over the shared HTTP pool), "local"
+# (llama.cpp or transformers on this machine, no network) and "fake" (deterministic,
+# for benchmarks). Each role picks its backend from the environment; clients are built
+# and shared by agents.registry.chat_model().
+#   LLM_PROVIDER=local LOCAL_LLM_PATH=models/qwen2.5-1.5b-instruct-q4_k_m.gguf
+#   TRIAGE_LLM_PROVIDER=local    (triage on-box, chat and summary still hosted)
+import importlib.util, os, threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Tuple
+
+DEFAULT_PROVIDER = "openai"
+ROLES = ("chat", "triage", "summary", "rag")
+LOCAL_DEFAULT_MODEL = "Qwen/Qwen2.5-0.5B-Instruct"   # transformers id, used when LOCAL_LLM_PATH is unset
+LOCAL_MAX_TOKENS = 512
+LOCAL_CONTEXT = 4096
+FAKE_REPLY = "- Key symptoms: none flagged.\n※ Accurate diagnosis is made by a doctor."
+
+@dataclass(frozen=True)
+class Provider:
+    name: str
+    build: Callable[[str, float], object]   # (model, temperature) -> chat model with invoke()/stream()
+    default_model: Callable[[], str]
+    ready: Callable[[str], bool]            # model -> configured and installed, worth calling
+    cacheable: bool = True                  # completions go through utils.llm_cache
+
+PROVIDERS: Dict[str, Provider] = {}
+
+def register(provider: Provider) -> Provider:
+    PROVIDERS[provider.name] = provider
+    return provider
+
+def role_config(role: str = "chat") -> Tuple[Provider, str]:
+    """
+    (provider, model) for `role`: <ROLE>_LLM_PROVIDER / <ROLE>_LLM_MODEL when set,
+    else LLM_PROVIDER / LLM_MODEL, else the hosted default.
+    """
+    r = role.upper()
+    name = (os.environ.get(f"{r}_LLM_PROVIDER") or os.environ.get("LLM_PROVIDER") or DEFAULT_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name}")
+    provider = PROVIDERS[name]
+    model = os.environ.get(f"{r}_LLM_MODEL")
+    if not model and not os.environ.get(f"{r}_LLM_PROVIDER"):
+        model = os.environ.get("LLM_MODEL")
+    return provider, model or provider.default_model()
+
+def ready(role: str = "chat") -> bool:
+    """
+    False when the role's backend cannot answer (no API key, no local runtime).
+    """
+    try:
+        provider, model = role_config(role)
+        return provider.ready(model)
+    except ValueError:
+        return False
+
+# --- openai ---
+
+def _openai(model: str, temperature: float):
+    from langchain_openai import ChatOpenAI
+    from agents.registry import http_client
+    return ChatOpenAI(model=model, temperature=temperature, http_client=http_client())
+
+register(Provider("openai", _openai, lambda: os.environ.get("OPENAI_MODEL", "gpt-4o-mini"),
+                  lambda model: bool(os.environ.get("OPENAI_API_KEY"))))
+
+# --- local ---
+
+class SerializedChatModel:
+    """
+    One generation at a time: a local model holds one context and is not thread-safe,
+    while triage calls it from a worker pool.
+    """
+
+    def __init__(self, llm, model_name: str, temperature: float):
+        self.llm = llm
+        self.model_name = model_name
+        self.temperature = temperature
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **kwargs):
+        with self._lock:
+            return self.llm.invoke(messages, **kwargs)
+
+    def stream(self, messages, **kwargs) -> Iterator[object]:
+        with self._lock:
+            yield from self.llm.stream(messages, **kwargs)
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def _local(model: str, temperature: float):
+    if model.endswith(".gguf"):
+        # llama.cpp: quantised weights, CPU threads, no Python-side tensor work.
+        from langchain_community.chat_models import ChatLlamaCpp
+        llm = ChatLlamaCpp(model_path=model, temperature=temperature, max_tokens=LOCAL_MAX_TOKENS,
+                           n_ctx=LOCAL_CONTEXT, n_threads=os.cpu_count() or 1, verbose=False)
+    else:
+        from langchain_huggingface import ChatHuggingFace, HuggingFacePipeline
+        kw = {"max_new_tokens": LOCAL_MAX_TOKENS, "return_full_text": False, "do_sample": temperature > 0}
+        if temperature > 0:
+            kw["temperature"] = temperature
+        llm = ChatHuggingFace(llm=HuggingFacePipeline.from_model_id(model, task="text-generation",
+                                                                    pipeline_kwargs=kw))
+    return SerializedChatModel(llm, os.path.basename(model), temperature)
+
+def _local_ready(model: str) -> bool:
+    if model.endswith(".gguf"):
+        return os.path.exists(model) and _installed("llama_cpp")
+    return _installed("transformers") and _installed("langchain_huggingface")
+
+register(Provider("local", _local, lambda: os.environ.get("LOCAL_LLM_PATH", LOCAL_DEFAULT_MODEL), _local_ready))
+
+# --- fake ---
+
+def fake_reply(text: str) -> str:
+    # Triage prompts get a clean PASS; everything else a short fixed summary.
+    return "PASS" if 'ONLY print "PASS"' in text else FAKE_REPLY
+
+def _fake(model: str, temperature: float):
+    from agents.fake_llm import FakeChatModel
+    latency = float(os.environ.get("FAKE_LLM_LATENCY", "0"))
+    return FakeChatModel(fake_reply, latency=latency, model_name=model, temperature=temperature)
+
+register(Provider("fake", _fake, lambda: "fake", lambda model: True, cacheable=False))
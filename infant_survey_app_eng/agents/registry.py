@@ -0,0 +1,170 @@
+
+# Process-wide model clients and the RAG retriever, shared by every Streamlit session.
+import os, threading, time
+from typing import Callable, Dict, Iterable, Optional
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# One connection pool for all OpenAI calls (chat, triage, summary, embeddings).
+HTTP_LIMITS = dict(max_connections=100, max_keepalive_connections=20)
+HTTP_TIMEOUT = 60.0
+
+_clients: Dict[str, object] = {}
+_init_locks: Dict[str, threading.Lock] = {}
+_init_stats: Dict[str, Dict[str, float]] = {}
+_sessions = 0
+_lock = threading.Lock()
+_building = threading.local()
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+def get_client(name: str, factory: Callable[[], object]):
+    """
+    Builds `name` once per process; concurrent first callers wait for the same build.
+    Init time and resident-memory growth are recorded per client.
+    """
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        key_lock = _init_locks.setdefault(name, threading.Lock())
+    with key_lock:
+        if name not in _clients:
+            # Clients built inside another factory (e.g. embeddings for "rag") are
+            # marked nested, so their memory is not counted twice in the total.
+            depth = getattr(_building, "depth", 0)
+            _building.depth = depth + 1
+            t0, m0 = time.perf_counter(), _rss_bytes()
+            try:
+                _clients[name] = factory()
+            finally:
+                _building.depth = depth
+            _init_stats[name] = {"init_seconds": time.perf_counter() - t0,
+                                 "rss_bytes": max(_rss_bytes() - m0, 0), "nested": bool(depth)}
+        return _clients[name]
+
+def http_client():
+    if httpx is None:
+        return None
+    return get_client("http", lambda: httpx.Client(limits=httpx.Limits(**HTTP_LIMITS), timeout=HTTP_TIMEOUT))
+
+def chat_model(model: Optional[str] = None, temperature: float = 0, role: str = "chat"):
+    """
+    Shared, cached chat model for one (provider, model, temperature). The provider and
+    default model come from `role`'s configuration (see agents.providers).
+    """
+    from agents.providers import role_config
+    provider, default = role_config(role)
+    model = model or default
+
+    def build():
+        llm = provider.build(model, temperature)
+        if not provider.cacheable:
+            return llm
+        from utils.llm_cache import cached_llm
+        return cached_llm(llm)
+    return get_client(f"chat:{provider.name}:{model}:{temperature}", build)
+
+def embeddings():
+    """
+    Shared, disk-cached embeddings with the configured model (utils.embeddings), the
+    one the vector store and the semantic cache are built with.
+    """
+    def build():
+        from utils.embedding_cache import cached_embeddings
+        from utils.embeddings import OPENAI_MODEL, get_embeddings
+        emb = get_embeddings("openai", OPENAI_MODEL, http_client=http_client())
+        return cached_embeddings(emb, "openai", OPENAI_MODEL)
+    return get_client("embeddings", build)
+
+def semantic_cache():
+    """
+    Answers to earlier chat questions, looked up by meaning and scoped per age group.
+    """
+    def build():
+        from utils.semantic_cache import SemanticCache
+        return SemanticCache(embeddings())
+    return get_client("semantic_cache", build)
+
+def rag_chain():
+    """
+    The RAG chain over the shared vector store; None if it cannot be built.
+    """
+    def build():
+        from agents.chains import get_rag_chain
+        try:
+            return get_rag_chain()
+        except Exception as e:
+            print(f"Failed to build RAG chain: {e}")
+            return False  # remembered, so a broken store is not retried on every message
+    return get_client("rag", build) or None
+
+WARM_UP = {
+    "http": http_client,
+    "chat": chat_model,
+    "chat_sidebar": lambda: chat_model(temperature=0.3),
+    "triage": lambda: chat_model(role="triage"),
+    "embeddings": embeddings,
+    "semantic_cache": semantic_cache,
+    "rag": rag_chain,
+}
+
+def warm_up(names: Optional[Iterable[str]] = None, background: bool = True):
+    """
+    Builds the clients ahead of the first request; in a daemon thread by default.
+    """
+    def run():
+        for n in names or WARM_UP:
+            try:
+                WARM_UP[n]()
+            except Exception as e:
+                print(f"Warm-up of {n} failed: {e}")
+    if not background:
+        run()
+        return None
+    t = threading.Thread(target=run, name="registry-warm-up", daemon=True)
+    t.start()
+    return t
+
+def attach_session():
+    """
+    Called once per new Streamlit session, for the per-session memory figure.
+    """
+    global _sessions
+    with _lock:
+        _sessions += 1
+
+def stats() -> Dict[str, object]:
+    """
+    Per-client init time and memory, plus the shared memory amortized over attached sessions.
+    """
+    with _lock:
+        clients = {n: dict(s) for n, s in _init_stats.items()}
+        sessions = _sessions
+    total = sum(s["rss_bytes"] for s in clients.values() if not s["nested"])
+    return {"clients": clients, "sessions": sessions, "rss_bytes": total,
+            "rss_bytes_per_session": total / sessions if sessions else float(total)}
+
+def reset():
+    """
+    Drops every shared client (tests and benchmarks only).
+    """
+    global _sessions
+    with _lock:
+        c = _clients.get("http")
+        _clients.clear(); _init_locks.clear(); _init_stats.clear()
+        _sessions = 0
+    if c is not None and hasattr(c, "close"):
+        c.close()
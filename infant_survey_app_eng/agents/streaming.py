@@ -0,0 +1,65 @@
+
+import logging, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Recent stream timings, newest last, for operators to inspect.
+recent_timings: "deque[StreamTiming]" = deque(maxlen=200)
+_timings_lock = threading.Lock()
+
+# Shared pool for work that should overlap with prompt assembly (e.g. RAG retrieval).
+background = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-bg")
+
+@dataclass
+class StreamTiming:
+    label: str
+    started: float = field(default_factory=time.perf_counter)
+    first_token: Optional[float] = None
+    finished: Optional[float] = None
+    chunks: int = 0
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """
+        Seconds until the first non-empty chunk arrived.
+        """
+        return None if self.first_token is None else self.first_token - self.started
+
+    @property
+    def total(self) -> Optional[float]:
+        return None if self.finished is None else self.finished - self.started
+
+def stream_text(llm, messages, label: str = "llm", timing: Optional[StreamTiming] = None) -> Iterator[str]:
+    """
+    Yields the model's answer chunk by chunk and records time-to-first-token and
+    total latency. Models without stream() yield their whole answer once.
+    """
+    timing = timing or StreamTiming(label)
+    try:
+        if hasattr(llm, "stream"):
+            chunks = (getattr(c, "content", c) for c in llm.stream(messages))
+        else:
+            resp = llm.invoke(messages)
+            chunks = iter([resp.content if hasattr(resp, "content") else str(resp)])
+        for text in chunks:
+            if not text:
+                continue
+            if timing.first_token is None:
+                timing.first_token = time.perf_counter()
+            timing.chunks += 1
+            yield text
+    finally:
+        timing.finished = time.perf_counter()
+        with _timings_lock:
+            recent_timings.append(timing)
+        metrics.observe("llm_seconds", timing.total, call=timing.label)
+        if timing.ttft is not None:
+            metrics.observe("llm_ttft_seconds", timing.ttft, call=timing.label)
+        logger.info("%s: ttft=%.3fs total=%.3fs chunks=%d", timing.label,
+                    timing.ttft if timing.ttft is not None else -1, timing.total, timing.chunks)
@@ -0,0 +1,72 @@
+
+import hashlib, time
+from typing import Iterable, Iterator, List, Optional
+
+from agents.budget import SUMMARY_BUDGET, PromptMetrics, answer_priority, count_tokens, fit_answers, record
+from agents.streaming import StreamTiming, stream_text
+
+SUMMARY_SYSTEM = """
+You are an AI assistant (CDSS) for a pediatrician.
+Analyze the patient's survey data and write a report in English.
+[Rules]
+1. Summarize key symptoms.
+2. List potential suspected conditions (Probability: High/Medium).
+3. Provide recommendation points for the doctor.
+4. End with "※ Accurate diagnosis is made by a doctor."
+"""
+
+SUMMARY_HUMAN = """
+[Patient Info]
+Name: {name}, Gender: {gender}
+Age: {months_old} months ({days_old} days old)
+
+[Survey Content]
+{context}
+"""
+
+# Stored with each summary; editing the prompt marks earlier summaries as stale
+# (see agents.batch_summary).
+PROMPT_VERSION = hashlib.sha256((SUMMARY_SYSTEM + SUMMARY_HUMAN).encode("utf-8")).hexdigest()[:12]
+
+# Skip negative answers for summary focus
+NEGATIVE_ANSWERS = ("No", "Not at all", "None")
+
+def summary_context(responses, budget: Optional[int] = SUMMARY_BUDGET, rules=None,
+                    flagged: Iterable[str] = ()) -> str:
+    """
+    Non-negative and flagged answers as Q/A lines. Over `budget` tokens, flagged answers are kept
+    first, then those needing judgement, then ones the questionnaire calls normal
+    (see agents.budget.answer_priority).
+    """
+    t0 = time.perf_counter()
+    flagged = set(flagged)
+    lines = []
+    for item in responses:
+        ans = item['answer']
+        # A negative answer still counts when the questionnaire flags it ("No = Education Needed").
+        if ans and (ans not in NEGATIVE_ANSWERS or answer_priority(item, rules, flagged) == 0):
+            lines.append((item, f"- Q: {item['text']}\n  A: {ans}\n"))
+    raw = sum(count_tokens(line) for _, line in lines)
+    if budget is None:
+        kept, omitted = [line for _, line in lines], 0
+    else:
+        kept, omitted = fit_answers(lines, budget, rules, flagged)
+    context = "".join(kept)
+    if omitted:
+        context += f"({omitted} lower-priority answers omitted)\n"
+    record(PromptMetrics("summary", budget or 0, raw, count_tokens(context), omitted, time.perf_counter() - t0))
+    return context or "No significant findings."
+
+def summary_messages(responses, child_info, **context_kw) -> List[tuple]:
+    # Plain (role, text) pairs: answers may contain braces, so no template formatting.
+    human = SUMMARY_HUMAN.format(name=child_info['name'], gender=child_info['gender'],
+                                 months_old=child_info['months_old'], days_old=child_info['days_old'],
+                                 context=summary_context(responses, **context_kw))
+    return [("system", SUMMARY_SYSTEM), ("human", human)]
+
+def stream_summary(llm, responses, child_info, timing: StreamTiming = None, **context_kw) -> Iterator[str]:
+    """
+    Streams the 'Clinical Summary Report' as it is generated. `context_kw` (budget,
+    rules, flagged) go to summary_context().
+    """
+    return stream_text(llm, summary_messages(responses, child_info, **context_kw), label="summary", timing=timing)
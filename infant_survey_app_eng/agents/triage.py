@@ -0,0 +1,184 @@
+
+import json, re, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from agents.prescreen import NEEDS_LLM, RuleTable
+from utils.metrics import metrics
+
+FEEDBACK_SYSTEM = """
+You are a pediatric specialist AI.
+Analyze the child's age (months), question, and guardian's answer to determine if 'Clinical Attention' is needed.
+
+[Analysis Rules]
+1. If the answer is within normal medical range or no urgent advice is needed, ONLY print "PASS". (No explanation)
+2. If there is a suspicion of developmental delay or pathological symptoms requiring 'Attention', write a 1-sentence advice in the format below.
+   Format: "⚠️ [Key Advice]"
+
+[Precautions]
+- Do NOT add fluff like "It is normal". ONLY output "PASS" or "⚠️ ...".
+- Answer in English.
+"""
+
+FEEDBACK_HUMAN = """
+[Data]
+- Age: {months_old} months
+- Question: {q_text}
+- Answer: {answer}
+
+Analysis Result:
+"""
+
+BATCH_HUMAN = """
+Apply the rules to every numbered item below independently.
+Reply with ONLY a JSON object mapping each item number to "PASS" or "⚠️ ..." (e.g. {{"1": "PASS", "2": "⚠️ ..."}}).
+
+[Data]
+{items}
+"""
+
+FAILED = object()   # evaluate_one()'s result when the model call failed; never memoised
+
+@dataclass(frozen=True)
+class TriageItem:
+    q_id: str
+    q_text: str
+    answer: str
+    months_old: int
+
+    @property
+    def key(self):
+        return (self.q_id, self.answer, self.months_old)
+
+def parse_feedback(text: Optional[str]) -> Optional[str]:
+    """
+    Keeps only well-formed warnings; "PASS" and anything off-format become None.
+    """
+    text = (text or "").strip()
+    if not text.startswith("⚠️"):
+        return None
+    return text
+
+class TriageEngine:
+    """
+    Evaluates all answered questions of a rerun together.
+
+    mode="pool":  one prompt per answer, at most `max_workers` in flight.
+    mode="batch": answers are packed `batch_size` per prompt; items the model
+                  leaves out of its JSON reply fall back to the pool.
+    Answers the questionnaire's rule table can decide never reach the model.
+    Results are memoised per (question, answer, age), so a rerun only pays for
+    answers that actually changed; a failed call is shown as no warning and asked again.
+    """
+
+    def __init__(self, llm_factory: Callable[[], object], mode: str = "pool",
+                 max_workers: int = 8, batch_size: int = 15, cache_size: int = 4096):
+        if mode not in ("pool", "batch"):
+            raise ValueError(f"Unknown triage mode: {mode}")
+        self.llm_factory = llm_factory
+        self.mode = mode
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._llm = None
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="triage")
+        self._memo: "OrderedDict[tuple, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"rule": 0, "memo": 0, "llm": 0}
+
+    @property
+    def llm(self):
+        with self._lock:
+            if self._llm is None:
+                self._llm = self.llm_factory()
+            return self._llm
+
+    def evaluate_one(self, item: TriageItem) -> Optional[str]:
+        """
+        The warning for one answer, None when there is none, FAILED when the model call failed.
+        """
+        try:
+            messages = [("system", FEEDBACK_SYSTEM),
+                        ("human", FEEDBACK_HUMAN.format(months_old=item.months_old, q_text=item.q_text, answer=item.answer))]
+            return parse_feedback(self.llm.invoke(messages).content)
+        except Exception as e:
+            metrics.inc("stage_errors_total", stage="triage.llm", error=type(e).__name__)
+            print(f"Triage failed for {item.q_id}: {e}")
+            return FAILED
+
+    def evaluate_batch(self, items: List[TriageItem]) -> Dict[str, Optional[str]]:
+        """
+        One prompt for several items. Only items the model answered are returned.
+        """
+        lines = [f"{i}. Age: {it.months_old} months | Question: {it.q_text} | Answer: {it.answer}"
+                 for i, it in enumerate(items, start=1)]
+        messages = [("system", FEEDBACK_SYSTEM), ("human", BATCH_HUMAN.format(items="\n".join(lines)))]
+        try:
+            raw = self.llm.invoke(messages).content
+            m = re.search(r"\{.*\}", raw or "", re.S)
+            verdicts = json.loads(m.group(0)) if m else {}
+        except Exception as e:
+            metrics.inc("stage_errors_total", stage="triage.batch", error=type(e).__name__)
+            print(f"Batched triage failed: {e}")
+            return {}
+        out = {}
+        for i, it in enumerate(items, start=1):
+            if str(i) in verdicts:
+                out[it.q_id] = parse_feedback(str(verdicts[str(i)]))
+        return out
+
+    def _evaluate(self, items: List[TriageItem]) -> Dict[str, Optional[str]]:
+        results: Dict[str, Optional[str]] = {}
+        todo = list(items)
+        if self.mode == "batch":
+            chunks = [todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)]
+            for part in self._pool.map(self.evaluate_batch, chunks):
+                results.update(part)
+            todo = [it for it in todo if it.q_id not in results]
+        for it, res in zip(todo, self._pool.map(self.evaluate_one, todo)):
+            results[it.q_id] = res
+        return results
+
+    def triage(self, items: List[TriageItem], rules: Optional[RuleTable] = None) -> Dict[str, Optional[str]]:
+        """
+        Returns {q_id: warning or None} in the order of `items`.
+        """
+        results: Dict[str, Optional[str]] = {}
+        ask = []
+        for it in items:
+            rule = rules.lookup(it.q_id, it.answer) if rules else None
+            if rule is not None and rule.verdict != NEEDS_LLM:
+                results[it.q_id] = rule.message
+            else:
+                ask.append(it)
+
+        with self._lock:
+            known = {}
+            for it in ask:
+                if it.key in self._memo:
+                    self._memo.move_to_end(it.key)
+                    known[it.key] = self._memo[it.key]
+        changed = [it for it in ask if it.key not in known]
+        if changed:
+            fresh = self._evaluate(changed)
+            with self._lock:
+                for it in changed:
+                    res = fresh.get(it.q_id, FAILED)
+                    if res is FAILED:
+                        known[it.key] = None
+                        continue
+                    known[it.key] = self._memo[it.key] = res
+                    self._memo.move_to_end(it.key)
+                while len(self._memo) > self.cache_size:
+                    self._memo.popitem(last=False)
+        for it in ask:
+            results[it.q_id] = known[it.key]
+
+        with self._lock:
+            self.stats["rule"] += len(items) - len(ask)
+            self.stats["memo"] += len(ask) - len(changed)
+            self.stats["llm"] += len(changed)
+        for source, n in (("rule", len(items) - len(ask)), ("memo", len(ask) - len(changed)), ("llm", len(changed))):
+            metrics.inc("triage_answers_total", n, source=source)
+        return {it.q_id: results[it.q_id] for it in items}
@@ -0,0 +1,96 @@
+# recall@k, query latency, build time and memory of the FAISS index types in utils.ann on a
+# locally generated corpus of clustered unit vectors (shaped like sentence embeddings).
+# Exact flat search is the ground truth. Pick an operating point, then pass its spec
+# as get_vectorstore(index=...).
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_ann_index --n 200000
+import argparse, multiprocessing, os, tempfile, time
+
+import faiss
+import numpy as np
+
+from utils.ann import IndexSpec, apply_search_params, build_index, load_mmapped
+
+SPECS = [
+    ("flat", []),
+    ("ivf", [f"nprobe={p}" for p in (1, 4, 16, 64)]),
+    ("hnsw:m=32,ef_construction=200", [f"ef_search={e}" for e in (16, 64, 256)]),
+    ("pq", [""]),
+    ("ivfpq", [f"nprobe={p}" for p in (4, 16, 64)]),
+]
+
+def corpus(n, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    def draw(m):
+        x = centers[rng.integers(0, clusters, m)] + rng.normal(scale=0.7, size=(m, dim)).astype(np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+    return draw(n), draw(1000)
+
+def with_params(spec, params):
+    if not params:
+        return IndexSpec.parse(spec)
+    return IndexSpec.parse(f"{spec}{',' if ':' in spec else ':'}{params}")
+
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def _load_rss(path, mmap, queries, k):
+    # In a fresh process, so each measurement starts from the same baseline.
+    m0 = rss()
+    index = load_mmapped(lambda flags: faiss.read_index(path, flags)) if mmap else faiss.read_index(path)
+    loaded = rss() - m0
+    index.search(queries, k)
+    return loaded, rss() - m0
+
+def measure_load(path, mmap, queries, k):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(_load_rss, (path, mmap, queries, k))
+
+def search(index, queries, k):
+    t0 = time.perf_counter()
+    ids = np.vstack([index.search(q[None, :], k)[1] for q in queries])
+    return ids, (time.perf_counter() - t0) / len(queries)
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--clusters", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--k", type=int, default=10)
+    args = ap.parse_args()
+    faiss.omp_set_num_threads(1)   # per-query latency as a single request sees it
+
+    x, queries = corpus(args.n, args.dim, args.clusters)
+    queries = queries[:args.queries]
+    print(f"{args.n} vectors x {args.dim} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<42} {'build s':>8} {'MB':>7} {'recall@k':>9} {'ms/query':>9} "
+          f"{'RSS MB':>7} {'mmap RSS MB':>17}")
+    truth = None
+    tmp = tempfile.mkdtemp()
+    for base, sweep in SPECS:
+        t0 = time.perf_counter()
+        index = build_index(IndexSpec.parse(base), x)
+        build = time.perf_counter() - t0
+        path = os.path.join(tmp, "index.faiss")
+        faiss.write_index(index, path)
+        size = os.path.getsize(path) / 2 ** 20
+        _, loaded = measure_load(path, False, queries, args.k)
+        mapped = measure_load(path, True, queries, args.k)
+        for params in sweep or [""]:
+            spec = with_params(base, params)
+            apply_search_params(index, spec)
+            ids, per = search(index, queries, args.k)
+            if truth is None:
+                truth = ids
+            label = str(spec.resolve(args.n, args.dim))
+            print(f"{label:<42} {build:>8.1f} {size:>7.1f} {recall(ids, truth):>9.3f} {per * 1000:>9.3f} "
+                  f"{loaded / 2 ** 20:>7.1f} {mapped[0] / 2 ** 20:>7.1f} -> {mapped[1] / 2 ** 20:>6.1f}")
+    assert recall(truth, truth) == 1.0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Progress bar cost per rerun as a session accumulates widget keys: the old scan over every
+# session_state key (substring match per question) vs the answer store's counters. Also
+# checks the counts: the scan also counted other age groups' keys whose ids overlap.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_answer_store
+import argparse, random, time
+
+from modules.answer_store import AnswerStore, widget_key
+from modules.survey_index import load_survey_index
+
+def old_count(state, qs):
+    # The loop app.py ran on every rerun.
+    ans_cnt = 0
+    current_page_q_ids = [q.id for q in qs]
+    for k, v in state.items():
+        if k.startswith("ans_") and v:
+            if any(q_id in k for q_id in current_page_q_ids):
+                ans_cnt += 1
+    return ans_cnt
+
+def session(survey, n_keys, rng):
+    """
+    session_state and store after answering questions across age groups until the state
+    holds `n_keys` keys (answers, chat history, UI keys); a few answers were typed before
+    the questionnaire gained categories, so stale keys share question ids.
+    """
+    state = {"messages": [], "selected_age": survey.age_labels[0], "last_dob": None}
+    store = AnswerStore(survey.version)
+    questions = list(survey.pack.questions)
+    rng.shuffle(questions)
+    i = 0
+    while len(state) < n_keys:
+        q = questions[i % len(questions)]
+        value = rng.choice(q.options) if q.options else "3"
+        if i < len(questions):
+            idx = survey.questions_for(q.age, q.category).index(q)
+            state[widget_key(q, idx)] = value
+            store.set(q, value)
+        else:
+            state[f"ans_{q.id}_old_{i}"] = value
+        i += 1
+    return state, store
+
+def per_call(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", default="config/questionnaires/px_previsit_1.0.0.json")
+    ap.add_argument("--keys", type=int, nargs="+", default=[50, 200, 500, 1000])
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    survey = load_survey_index(args.path)
+    age = max(survey.age_labels, key=lambda a: len(survey.questions_for(a)))
+    qs = survey.questions_for(age)
+    rng = random.Random(0)
+    print(f"age group {age!r}, {len(qs)} questions")
+    print(f"{'state keys':>10} {'scan us':>9} {'store us':>9} {'payload us':>11} {'scan count':>11} {'answered':>9}")
+    for n in args.keys:
+        state, store = session(survey, n, rng)
+        scan = per_call(lambda: old_count(state, qs), args.repeat)
+        fast = per_call(lambda: store.progress(age, len(qs)), args.repeat)
+        payload = per_call(lambda: store.responses(qs), args.repeat)
+        truth = sum(q.id in store.values for q in qs)
+        assert store.answered(age) == truth
+        print(f"{n:>10} {scan:>9.1f} {fast:>9.2f} {payload:>11.1f} {old_count(state, qs):>11} {truth:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Patients/min of the batch summary job against a local fake model, with and without a
+# provider-style rate limit (429 + Retry-After) and transient connection errors, plus
+# resume-after-interruption and the give-up limit for responses that always fail. The
+# scripted burst (calls N..N+k all get a 429) checks that waiting out a rate limit never
+# costs a response its retries, whatever order the threads run in.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_batch_summary
+import argparse, glob, json, os, random, tempfile, threading, time
+
+from agents.batch_summary import MAX_ATTEMPTS, MAX_RETRIES, SummaryJob
+from agents.fake_llm import FakeChatModel
+from agents.summary import PROMPT_VERSION
+from modules.persistence import write_json_atomic
+
+class FakeResponse:
+    def __init__(self, retry_after):
+        self.headers = {"retry-after": str(retry_after)}
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(retry_after) if retry_after is not None else None
+
+class FlakyModel(FakeChatModel):
+    """
+    Allows `limit` requests per `window` seconds (429 with Retry-After beyond that), answers
+    429 to the calls numbered in `burst` (start, count), fails a share of calls with
+    connection errors, and always rejects prompts mentioning `poison`.
+    """
+
+    def __init__(self, latency, limit=None, window=1.0, flaky=0.0, poison="POISON", seed=0, burst=None):
+        super().__init__(lambda text: "- Key symptoms: none flagged.\n※ Accurate diagnosis is made by a doctor.",
+                         latency=latency)
+        self.limit, self.window, self.flaky, self.poison = limit, window, flaky, poison
+        self.rng = random.Random(seed)
+        self.burst = burst
+        self.requests = 0
+        self.sent = []
+        self._guard = threading.Lock()
+
+    def invoke(self, messages, **kwargs):
+        now = time.monotonic()
+        with self._guard:
+            self.requests += 1
+            if self.burst and self.burst[0] <= self.requests < self.burst[0] + self.burst[1]:
+                raise FakeStatusError(429, retry_after=0.02)
+            if self.limit:
+                self.sent = [t for t in self.sent if now - t < self.window]
+                if len(self.sent) >= self.limit:
+                    raise FakeStatusError(429, retry_after=round(self.window - (now - self.sent[0]), 3))
+                self.sent.append(now)
+            roll = self.rng.random()
+        if self.poison in str(messages):
+            raise FakeStatusError(400)
+        if roll < self.flaky:
+            raise ConnectionError("Connection reset by peer")
+        return super().invoke(messages, **kwargs)
+
+def make_responses(d, n, poison=0, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        state = rng.choice(["missing", "stale", "current"])
+        payload = {"response_id": f"20260101_0900{i % 60:02d}_{i:012x}",
+                   "child_info": {"name": "POISON" if i < poison else f"Child {i}", "gender": "Girl",
+                                  "months_old": 6, "days_old": 190},
+                   "ai_summary": "" if state == "missing" else "old summary",
+                   "summary_version": {"missing": None, "stale": "0ld", "current": PROMPT_VERSION}[state],
+                   "responses": [{"text": f"Question {j}?", "answer": "Yes"} for j in range(20)]}
+        write_json_atomic(os.path.join(d, f"resp_{payload['response_id']}.json"), payload, fsync=False)
+
+def up_to_date(d):
+    n = 0
+    for p in glob.glob(os.path.join(d, "resp_*.json")):
+        with open(p) as f:
+            n += json.load(f).get("summary_version") == PROMPT_VERSION
+    return n
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--responses", type=int, default=120)
+    ap.add_argument("--latency", type=float, default=0.1, help="seconds per fake summary")
+    args = ap.parse_args()
+
+    print(f"{'scenario':<34} {'conc':>4} {'done':>5} {'failed':>6} {'retries':>7} {'429s':>5} {'min conc':>8} {'pat/min':>8}")
+    scenarios = [("clean", dict(), [1, 4, 16]),
+                 ("5% connection errors", dict(flaky=0.05), [16]),
+                 ("rate limit 600/min (10/s)", dict(limit=10), [4, 16]),
+                 ("429 burst of 3 x MAX_RETRIES", dict(burst=(10, 3 * MAX_RETRIES)), [1, 4])]
+    for label, kw, concs in scenarios:
+        for c in concs:
+            with tempfile.TemporaryDirectory() as d:
+                make_responses(d, args.responses)
+                model = FlakyModel(args.latency, **kw)
+                job = SummaryJob(lambda: model, d, concurrency=c)
+                job.sleep = lambda s: time.sleep(min(s, 0.5))  # connection-error backoff capped to keep it short
+                r = job.run()
+                assert r["failed"] == 0 and up_to_date(d) == args.responses, r
+                if "burst" in kw:
+                    assert r["rate_limited"] == r["retries"] == kw["burst"][1], r
+                print(f"{label:<34} {c:>4} {r['summarized']:>5} {r['failed']:>6} {r['retries']:>7} "
+                      f"{r['rate_limited']:>5} {r['min_allowed']:>8} {r['patients_per_min']:>8.0f}")
+
+    with tempfile.TemporaryDirectory() as d:
+        # A provider that never stops limiting: responses fail once the 429 deadline passes.
+        make_responses(d, 4)
+        r = SummaryJob(lambda: FlakyModel(0.0, burst=(1, 10 ** 9)), d, concurrency=1, rate_limit_deadline=0.1).run()
+        assert r["summarized"] == 0 and r["failed"] == r["pending"] and r["rate_limited"] > MAX_RETRIES, r
+
+    with tempfile.TemporaryDirectory() as d:
+        make_responses(d, args.responses, poison=3)
+        # Interrupted run: the model goes away after 20 calls; finished files stay finished.
+        model = FlakyModel(args.latency)
+        calls = [0]
+        real_invoke = model.invoke
+        def dying(messages, **kw):
+            calls[0] += 1
+            if calls[0] > 20:
+                raise FakeStatusError(401)
+            return real_invoke(messages, **kw)
+        model.invoke = dying
+        first = SummaryJob(lambda: model, d, concurrency=4).run()
+        second = SummaryJob(lambda: FlakyModel(args.latency), d, concurrency=4).run()
+        print(f"\ninterrupted run: {first['summarized']} summarized, {first['failed']} failed; "
+              f"resumed run: {second['pending']} pending, {second['summarized']} summarized")
+        assert second["pending"] == first["failed"] and second["failed"] == 3
+        runs = 2
+        while SummaryJob(lambda: FlakyModel(args.latency), d).pending():
+            SummaryJob(lambda: FlakyModel(args.latency), d).run()
+            runs += 1
+        print(f"always-failing responses given up after {runs} runs (MAX_ATTEMPTS={MAX_ATTEMPTS})")
+        assert runs == MAX_ATTEMPTS
+
+if __name__ == "__main__":
+    main()
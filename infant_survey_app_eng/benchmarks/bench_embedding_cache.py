@@ -0,0 +1,81 @@
+# Embedding calls and wall time for index rebuilds and repeated queries, with and without the cache.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_embedding_cache
+import argparse, os, tempfile, time
+
+import numpy as np
+
+from utils.embedding_cache import CachedEmbeddings
+from benchmarks.fakes import HashEmbeddings
+from utils.vectorstore import get_vectorstore
+
+class SlowEmbeddings(HashEmbeddings):
+    # Fixed cost per request plus per text, like a remote API.
+    def __init__(self, per_call, per_text):
+        super().__init__()
+        self.per_call, self.per_text = per_call, per_text
+
+    def embed_documents(self, texts):
+        time.sleep(self.per_call + self.per_text * len(texts))
+        return super().embed_documents(texts)
+
+class AsymmetricEmbeddings(HashEmbeddings):
+    # Instruction-style models (e5, bge) embed a question differently from a passage.
+    def embed_query(self, text):
+        return super().embed_documents(["query: " + text])[0]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=5000)
+    ap.add_argument("--per-call", type=float, default=0.05)
+    ap.add_argument("--per-text", type=float, default=0.0002)
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+
+    texts = [f"chunk {i}: infant fever rash feeding sleep development {i % 97}" for i in range(args.chunks)]
+    queries = [f"question {i % 20} about fever" for i in range(args.queries)]  # caregivers repeat themselves
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'step':<28} {'seconds':>8} {'model calls':>12} {'texts sent':>11}")
+        for label, cached in (("plain", False), ("cached", True)):
+            inner = SlowEmbeddings(args.per_call, args.per_text)
+            emb = CachedEmbeddings(inner, "fake", "hash-256", root=os.path.join(tmp, "cache")) if cached else inner
+            results = []
+            for step in ("build index", "rebuild from scratch"):
+                idx = os.path.join(tmp, f"{label}_{step.replace(' ', '_')}")
+                c, n, t0 = inner.calls, inner.texts, time.perf_counter()
+                vs = get_vectorstore(texts, embeddings=emb, index_dir=idx)
+                print(f"{label + ' ' + step:<28} {time.perf_counter() - t0:>8.3f} {inner.calls - c:>12} {inner.texts - n:>11}")
+                results.append(vs)
+            c, n, t0 = inner.calls, inner.texts, time.perf_counter()
+            for q in queries:
+                results[-1].similarity_search(q, k=3)
+            print(f"{label + ' ' + str(len(queries)) + ' queries':<28} {time.perf_counter() - t0:>8.3f} "
+                  f"{inner.calls - c:>12} {inner.texts - n:>11}")
+            if cached:
+                assert inner.texts - n == len(set(queries))
+                print(emb.stats())
+                # Cached vectors are identical to freshly computed ones.
+                fresh = np.asarray(HashEmbeddings().embed_documents(texts[:100]), dtype=np.float32)
+                assert np.array_equal(np.stack(emb.embed_arrays(texts[:100])), fresh)
+                # Lookups return views into the memory map rather than copies.
+                v = emb.embed_arrays(texts[:1])[0]
+                assert isinstance(v.base, np.memmap) or isinstance(v, np.memmap)
+                t0 = time.perf_counter()
+                for i in range(0, args.chunks, 100):
+                    emb.embed_arrays(texts[i:i + 100])
+                dt = time.perf_counter() - t0
+                print(f"cached lookup: {dt / args.chunks * 1e6:.1f} us/text")
+
+        # The same text as a query and as a document: two vectors, each cached under its own key.
+        inner = AsymmetricEmbeddings()
+        emb = CachedEmbeddings(inner, "fake", "asym", root=os.path.join(tmp, "cache"))
+        t = "is a fever after vaccination normal"
+        f32 = lambda v: np.asarray(v, dtype=np.float32)
+        for _ in range(2):
+            assert np.array_equal(f32(emb.embed_query(t)), f32(inner.embed_query(t)))
+            assert np.array_equal(f32(emb.embed_documents([t])[0]), f32(inner.embed_documents([t])[0]))
+        assert not np.array_equal(f32(emb.embed_query(t)), f32(emb.embed_documents([t])[0]))
+        assert emb.stats()["embedded"] == 2
+
+if __name__ == "__main__":
+    main()
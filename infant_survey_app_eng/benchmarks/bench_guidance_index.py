@@ -0,0 +1,46 @@
+# Build cost and per-query latency of the questionnaire guidance index, with age/category filters.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_guidance_index
+import argparse, time
+
+from modules.guidance_index import GuidanceIndex  # imported up front: time the build, not the imports
+from modules.survey_index import build_survey_index, load_survey_index
+
+QUERIES = [
+    "hip dysplasia ultrasound", "cough etiquette", "falls asleep while nursing", "car seat",
+    "teeth brushing fluoride", "vaccination schedule", "sleeping on the back", "screen time tv",
+    "fever medicine", "bottle at night", "walking with support", "picky eating vegetables",
+]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", default="config/questionnaires/px_previsit_1.0.0.json")
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    survey = build_survey_index(args.path)
+    t0 = time.perf_counter()
+    index = survey.guidance
+    print(f"build: {(time.perf_counter() - t0) * 1000:.1f} ms for {len(index.bm25)} questions")
+    # Built once per questionnaire version, then shared.
+    cached = load_survey_index(args.path)
+    assert cached.guidance is cached.guidance
+
+    print(f"{'filter':<16} {'us/query':>9} {'hits/query':>11}")
+    for label, age, cat in (("none", None, None), ("age group", survey.age_labels[1], None),
+                            ("age + category", survey.age_labels[1], survey.categories_for(survey.age_labels[1])[0])):
+        n, t0 = 0, time.perf_counter()
+        for _ in range(args.repeat):
+            for q in QUERIES:
+                hits = index.search(q, age, cat)
+                n += len(hits)
+                assert all((age is None or h.age == age) and (cat is None or h.category == cat) for h in hits)
+        dt = time.perf_counter() - t0
+        total = args.repeat * len(QUERIES)
+        print(f"{label:<16} {dt / total * 1e6:>9.1f} {n / total:>11.2f}")
+
+    for q in QUERIES[:4]:
+        hits = index.search(q)
+        print(f"\n{q!r} -> " + (f"{hits[0].q_id} ({hits[0].coverage:.0%} of terms): {hits[0].question}" if hits else "no match"))
+
+if __name__ == "__main__":
+    main()
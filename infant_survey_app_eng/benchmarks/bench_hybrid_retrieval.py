@@ -0,0 +1,113 @@
+# Latency and recall@k of dense, BM25 and hybrid retrieval on a synthetic caregiver query set.
+# The fake "dense" model maps synonyms to shared concepts (so it handles paraphrases that
+# BM25 misses), does not know rare clinical terms such as "ddh" (as real embedding models
+# often blur acronyms), and sleeps per query like a remote embedding API.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_hybrid_retrieval
+import argparse, random, time
+
+from langchain_community.vectorstores import FAISS
+
+from utils.bm25 import BM25Index, HybridRetriever, vectorstore_chunks
+from benchmarks.fakes import HashEmbeddings
+
+TOPICS = {
+    "ddh": ["hip", "dysplasia"], "otitis": ["ear", "infection"], "stool": ["poop", "bowel"],
+    "jaundice": ["yellow", "bilirubin"], "rsv": ["bronchiolitis", "wheeze"], "colic": ["crying", "fussy"],
+    "eczema": ["dermatitis", "itchy"], "reflux": ["spitting", "gerd"], "fever": ["temperature", "pyrexia"],
+    "thrush": ["candida", "oral"], "croup": ["barking", "stridor"], "teething": ["gums", "tooth"],
+    "diaper": ["nappy", "rash"], "vaccine": ["immunization", "shot"], "sids": ["cot", "death"],
+    "torticollis": ["neck", "tilt"], "plagiocephaly": ["flat", "head"], "hernia": ["umbilical", "bulge"],
+}
+ASPECTS = {
+    "signs": ["symptoms", "indicators"], "treatment": ["therapy", "management"],
+    "dosage": ["dose", "amount"], "timing": ["schedule", "when"], "emergency": ["urgent", "danger"],
+    "prevention": ["avoid", "prevent"], "diet": ["feeding", "nutrition"], "sleep": ["nap", "bedtime"],
+}
+UNKNOWN_TO_MODEL = {"ddh", "rsv", "sids", "torticollis", "plagiocephaly", "otitis"}
+FILLER = "guideline pediatric infant parent clinic visit doctor advice note months weeks daily".split()
+
+class ConceptEmbeddings(HashEmbeddings):
+    def __init__(self, latency, size=512):
+        super().__init__(size)
+        self.latency = latency
+        self.concept = {}
+        for table in (TOPICS, ASPECTS):
+            for head, syns in table.items():
+                for w in [head] + syns:
+                    self.concept[w] = head
+        for w in UNKNOWN_TO_MODEL:
+            self.concept[w] = "condition"
+
+    def _vector(self, text):
+        return super()._vector(" ".join(self.concept.get(w, w) for w in text.lower().split()))
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return super().embed_query(text)
+
+def corpus(rng, per_pair):
+    texts, target = [], {}
+    for topic in TOPICS:
+        for aspect in ASPECTS:
+            for j in range(per_pair):
+                words = [topic, aspect] + rng.sample(FILLER, 6) + [f"ref{rng.randrange(10**6)}"]
+                rng.shuffle(words)
+                target.setdefault((topic, aspect), len(texts))
+                texts.append(" ".join(words))
+    return texts, target
+
+def queries(rng, target, n):
+    out = []
+    for _ in range(n):
+        topic, aspect = rng.choice(list(target))
+        if rng.random() < 0.5:
+            q, kind = f"{topic} {aspect}", "keyword"   # exact questionnaire terms
+        else:
+            q, kind = f"{rng.choice(TOPICS[topic])} {rng.choice(ASPECTS[aspect])}", "paraphrase"
+        out.append((q, kind, (topic, aspect)))
+    return out
+
+def on_target(doc, pair):
+    words = set(doc.page_content.split())
+    return pair[0] in words and pair[1] in words
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--per-pair", type=int, default=8, help="chunks per (topic, aspect)")
+    ap.add_argument("--queries", type=int, default=400)
+    ap.add_argument("--latency", type=float, default=0.08, help="seconds per query embedding")
+    ap.add_argument("--k", type=int, default=4)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    texts, target = corpus(rng, args.per_pair)
+    qs = queries(rng, target, args.queries)
+    emb = ConceptEmbeddings(args.latency)
+    vs = FAISS.from_texts(texts, emb)
+    bm25 = BM25Index()
+    bm25.add(*vectorstore_chunks(vs))
+
+    modes = {
+        "dense": lambda q: vs.similarity_search(q, k=args.k),
+        "bm25": lambda q: [bm25.document(i) for i, _, _ in bm25.search(q, args.k)],
+        "hybrid": HybridRetriever(vs, bm25, k=args.k, fast_path=False).get_relevant_documents,
+        "hybrid+fast": HybridRetriever(vs, bm25, k=args.k).get_relevant_documents,
+    }
+    print(f"{len(texts)} chunks, {len(qs)} queries, k={args.k}")
+    print(f"{'mode':<12} {'ms/query':>9} {'recall@k':>9} {'keyword':>8} {'paraphr.':>9} {'embeds':>7}")
+    for mode, search in modes.items():
+        calls = emb.calls
+        hits = {"keyword": [], "paraphrase": []}
+        t0 = time.perf_counter()
+        for q, kind, pair in qs:
+            docs = search(q)
+            hits[kind].append(any(on_target(d, pair) for d in docs))
+        dt = time.perf_counter() - t0
+        allhits = hits["keyword"] + hits["paraphrase"]
+        rate = lambda h: sum(h) / len(h) if h else 0.0
+        print(f"{mode:<12} {dt * 1000 / len(qs):>9.1f} {rate(allhits):>9.2f} {rate(hits['keyword']):>8.2f} "
+              f"{rate(hits['paraphrase']):>9.2f} {emb.calls - calls:>7}")
+    print("hybrid+fast routes:", dict(modes["hybrid+fast"].__self__.routes))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Embedding work per ingestion run (full build, unchanged rerun, one edit, one delete),
+# and peak memory of the streaming pipeline vs loading the whole corpus at once.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_ingest
+import argparse, os, tempfile, time, tracemalloc
+
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.fakes import HashEmbeddings
+from utils.ingest import MANIFEST_NAME, ingest_directory, list_documents, load_file
+from utils.splitters import RecursiveCharacterTextSplitter
+from utils.vectorstore import get_vectorstore
+
+def write_doc(path, i, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(f"Document {i} paragraph {p}: " + "fever cough rash feeding sleep " * 20
+                            for p in range(paragraphs)))
+
+class NullStore:
+    # Embeds and discards, so only the pipeline's own memory is measured.
+    def __init__(self, emb):
+        self.emb = emb
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        self.emb.embed_documents(texts)
+
+    def delete(self, ids=None):
+        pass
+
+def load_all(doc_dir, splitter, emb):
+    # The old ensure_vectorstore: every document, every chunk and every vector in memory at once.
+    docs = []
+    for p in list_documents(doc_dir):
+        docs.extend(load_file(p))
+    chunks = splitter.split_documents(docs)
+    return emb.embed_documents([c.page_content for c in chunks])
+
+def peak_mb(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+def memory(args, emb, splitter, tmp):
+    print(f"\n{'docs':>6} {'all-at-once MB':>15} {'pipeline MB':>12}")
+    for n in (args.docs, args.docs * 4):
+        doc_dir = os.path.join(tmp, f"mem_{n}")
+        os.makedirs(doc_dir)
+        for i in range(n):
+            write_doc(os.path.join(doc_dir, f"doc_{i:04d}.txt"), i, args.paragraphs)
+        old = peak_mb(lambda: load_all(doc_dir, splitter, emb))
+        new = peak_mb(lambda: ingest_directory(doc_dir, NullStore(emb), os.path.join(tmp, f"m_{n}.json"),
+                                               splitter=splitter, workers=args.workers, batch_size=args.batch_size))
+        print(f"{n:>6} {old:>15.1f} {new:>12.1f}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=200)
+    ap.add_argument("--paragraphs", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--batch-size", type=int, default=256)
+    args = ap.parse_args()
+
+    emb = HashEmbeddings()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+    with tempfile.TemporaryDirectory() as tmp:
+        doc_dir, vs_dir = os.path.join(tmp, "docs"), os.path.join(tmp, "vs")
+        os.makedirs(doc_dir)
+        for i in range(args.docs):
+            write_doc(os.path.join(doc_dir, f"doc_{i:04d}.txt"), i, args.paragraphs)
+        manifest = os.path.join(vs_dir, MANIFEST_NAME)
+
+        def run(label):
+            # Each run starts from disk, as after a server restart.
+            store = None
+            if os.path.exists(os.path.join(vs_dir, "index.faiss")):
+                store = FAISS.load_local(vs_dir, emb, allow_dangerous_deserialization=True)
+            calls, texts = emb.calls, emb.texts
+            t0 = time.perf_counter()
+            store, report = ingest_directory(
+                doc_dir, store, manifest, splitter=splitter,
+                create=lambda t, m, ids: FAISS.from_texts(t, emb, metadatas=m, ids=ids),
+                persist=lambda s: s.save_local(vs_dir), workers=args.workers, batch_size=args.batch_size)
+            dt = time.perf_counter() - t0
+            print(f"{label:<12} {dt:>8.3f} {emb.calls - calls:>6} {emb.texts - texts:>9} {report['removed']:>8} "
+                  f"{len(store.index_to_docstore_id):>8}")
+            return store, emb.calls - calls, emb.texts - texts
+
+        print(f"{'run':<12} {'seconds':>8} {'calls':>6} {'embedded':>9} {'removed':>8} {'vectors':>8}")
+        store, _, full = run("full build")
+        calls = []
+        _, last = ingest_directory(doc_dir, None, os.path.join(tmp, "rate", MANIFEST_NAME), splitter=splitter,
+                         create=lambda t, m, ids: FAISS.from_texts(t, emb, metadatas=m, ids=ids),
+                         workers=args.workers, batch_size=args.batch_size, progress=calls.append)
+        print(f"  stages: scan {last['scan_seconds']:.3f}s, parse {last['parse_seconds']:.3f}s cpu "
+              f"({last['parse_files_per_sec']:.0f} files/s), embed+upsert {last['embed_seconds']:.3f}s "
+              f"({last['embed_chunks_per_sec']:.0f} chunks/s) in {last['batches']} batches, {len(calls)} progress reports")
+        _, calls, _ = run("unchanged")
+        assert calls == 0, "unchanged corpus must not reach the embedding model"
+
+        os.utime(os.path.join(doc_dir, "doc_0001.txt"))
+        _, calls, _ = run("touched")
+        assert calls == 0
+
+        write_doc(os.path.join(doc_dir, "doc_0002.txt"), 2, args.paragraphs + 1)
+        _, _, texts = run("one edited")
+        assert 0 < texts < full / args.docs + 2
+
+        os.remove(os.path.join(doc_dir, "doc_0003.txt"))
+        store, calls, _ = run("one deleted")
+        assert calls == 0
+        assert not any(d.metadata.get("source", "").endswith("doc_0003.txt") for d in store.docstore._dict.values())
+
+        # Same texts as a from-scratch build of the current corpus.
+        fresh_manifest = os.path.join(tmp, "fresh", MANIFEST_NAME)
+        fresh, _ = ingest_directory(doc_dir, None, fresh_manifest, splitter=splitter,
+                                    create=lambda t, m, ids: FAISS.from_texts(t, emb, metadatas=m, ids=ids))
+        assert sorted(d.page_content for d in store.docstore._dict.values()) == \
+               sorted(d.page_content for d in fresh.docstore._dict.values())
+
+        # utils.vectorstore.get_vectorstore: the same for callers that pass raw texts.
+        texts = [f"note {i}" for i in range(500)]
+        idx = os.path.join(tmp, "texts")
+        get_vectorstore(texts, embeddings=emb, index_dir=idx)
+        calls = emb.calls
+        get_vectorstore(texts, embeddings=emb, index_dir=idx)
+        assert emb.calls == calls
+        before = emb.texts
+        vs = get_vectorstore(texts[1:] + ["note new"], embeddings=emb, index_dir=idx)
+        assert emb.texts - before == 1 and len(vs.index_to_docstore_id) == 500
+        print("get_vectorstore: unchanged texts -> 0 embedding calls")
+
+        memory(args, emb, splitter, tmp)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# LLM response cache: repeated prompts answered from disk instead of the model, TTL
+# expiry, least-recently-used eviction by entry count and size, and one SQLite file
+# shared by several processes (entries and hit/miss counters).
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_llm_cache
+import argparse, multiprocessing, os, random, tempfile, time
+
+from agents.fake_llm import FakeChatModel
+from utils.llm_cache import CachedChatModel, LLMCache
+
+def prompt(i: int) -> str:
+    return f"""
+        You are a pediatric assistant.
+        [Question] Is a temperature of 38.{i % 10} degrees at {i} months a concern?
+    """
+
+def replica(db_path: str, n: int) -> int:
+    # Another server process on the same data/ folder: its own connection, same file.
+    model = FakeChatModel(lambda text: "answer " + text.split()[-1])
+    llm = CachedChatModel(model, LLMCache(db_path))
+    for i in range(n):
+        llm.invoke(prompt(i))
+    return model.calls
+
+def check_ttl(tmp: str):
+    cache = LLMCache(os.path.join(tmp, "ttl.sqlite"), ttl=0.2)
+    cache.set("k", "old answer")
+    assert cache.get("k") == "old answer"
+    time.sleep(0.3)
+    assert cache.get("k") is None
+    s = cache.stats()
+    assert (s["hits"], s["misses"], s["expired"], s["entries"]) == (1, 1, 1, 0), s
+    print("ttl: an entry past its TTL is a miss, counted as expired and deleted")
+
+def check_lru(tmp: str):
+    cache = LLMCache(os.path.join(tmp, "lru.sqlite"), max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+        time.sleep(0.01)   # distinct last_used stamps
+    cache.get("a")         # a is now the most recently used
+    time.sleep(0.01)
+    cache.set("d", "d")
+    assert [k for k in "abcd" if cache.get(k) is not None] == ["a", "c", "d"]
+    assert cache.stats()["evictions"] == 1
+
+    # By size: one large answer pushes out the oldest entries until the total fits again.
+    cache = LLMCache(os.path.join(tmp, "bytes.sqlite"), max_bytes=1000)
+    for key in ("a", "b", "c"):
+        cache.set(key, "x" * 300)
+        time.sleep(0.01)
+    cache.set("big", "y" * 600)
+    s = cache.stats()
+    assert cache.get("a") is None and cache.get("b") is None and cache.get("c") is not None
+    assert s["bytes"] <= 1000 and s["evictions"] == 2, s
+    print("lru: the least recently read entries go first, by entry count and by size")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--prompts", type=int, default=200)
+    ap.add_argument("--distinct", type=int, default=40, help="caregivers repeat the same questions")
+    ap.add_argument("--latency", type=float, default=0.02, help="seconds per fake model call")
+    ap.add_argument("--processes", type=int, default=2)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rng = random.Random(0)
+        picks = [rng.randrange(args.distinct) for _ in range(args.prompts)]
+        print(f"{'mode':<10} {'prompts':>8} {'model calls':>12} {'ms/prompt':>10}")
+        for label, cached in (("direct", False), ("cached", True)):
+            model = FakeChatModel(lambda text: "answer", latency=args.latency)
+            llm = CachedChatModel(model, LLMCache(os.path.join(tmp, "bench.sqlite"))) if cached else model
+            t0 = time.perf_counter()
+            for i in picks:
+                llm.invoke(prompt(i))
+            dt = time.perf_counter() - t0
+            print(f"{label:<10} {args.prompts:>8} {model.calls:>12} {dt / args.prompts * 1000:>10.2f}")
+        assert model.calls == len(set(picks))
+        # Indentation is not part of the key.
+        assert llm.invoke(" ".join(prompt(picks[0]).split())).content == "answer" and model.calls == len(set(picks))
+
+        check_ttl(tmp)
+        check_lru(tmp)
+
+        # Replicas: the first fills the shared file, the others are answered from it, and
+        # the counters in the file add up what every process saw.
+        db = os.path.join(tmp, "shared.sqlite")
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            first = pool.apply(replica, (db, args.distinct))
+            others = pool.starmap(replica, [(db, args.distinct)] * (args.processes - 1))
+        s = LLMCache(db).stats()
+        assert first == args.distinct and others == [0] * (args.processes - 1), (first, others)
+        assert (s["misses"], s["hits"]) == (args.distinct, args.distinct * (args.processes - 1)), s
+        print(f"shared file, {args.processes} processes: {first} model calls, then {sum(others)}; "
+              f"hit rate {s['hit_rate']:.2f} across processes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Overhead of the instrumentation: a bare block vs one timed as a span (in memory, with
+# a JSONL sink, inside a rerun trace), counters from 8 threads at once, and how long a
+# Prometheus export takes. Checks the quantiles and bucket counts on a known distribution.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_metrics
+import argparse, os, random, tempfile, threading, time
+
+from utils.metrics import BUCKETS, Metrics
+
+def per_call(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=50000)
+    ap.add_argument("--stages", type=int, default=40, help="distinct stage labels in the export")
+    args = ap.parse_args()
+
+    m = Metrics()
+    def timed():
+        with m.span("stats"):
+            pass
+    print(f"{'operation':<30} {'us/call':>8}")
+    print(f"{'bare block':<30} {per_call(lambda: None, args.calls):>8.2f}")
+    print(f"{'span (memory)':<30} {per_call(timed, args.calls):>8.2f}")
+    m.trace()
+    print(f"{'span in a rerun trace':<30} {per_call(timed, args.calls):>8.2f}")
+    print(f"{'counter inc':<30} {per_call(lambda: m.inc('llm_cache_total', result='hit'), args.calls):>8.2f}")
+    with tempfile.TemporaryDirectory() as d:
+        m.jsonl_path = os.path.join(d, "metrics.jsonl")
+        print(f"{'span + JSONL line':<30} {per_call(timed, args.calls // 10):>8.2f}")
+        m.jsonl_path = None
+
+    # Counters stay exact under concurrency.
+    c = Metrics()
+    threads = [threading.Thread(target=lambda: [c.inc("hits") for _ in range(10000)]) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert c.counters[("hits", ())] == 80000
+
+    # Quantiles and buckets on a known distribution: uniform 0..1 s.
+    q = Metrics()
+    values = [i / 1000 for i in range(1, 1001)]
+    random.Random(0).shuffle(values)
+    for v in values:
+        q.observe("stage_seconds", v, stage="uniform")
+    _, _, count, p50, p95, p99, mean = q.snapshot()["stages"][0]
+    assert count == 1000 and (p50, p95, p99) == (0.5, 0.95, 0.99), (p50, p95, p99)
+    text = q.prometheus_text()
+    assert 'stage_seconds_bucket{stage="uniform",le="0.5"} 500' in text
+    assert 'stage_seconds_bucket{stage="uniform",le="+Inf"} 1000' in text
+
+    for i in range(args.stages):
+        for v in values[:200]:
+            q.observe("stage_seconds", v, stage=f"s{i}")
+        q.inc("stage_errors_total", stage=f"s{i}", error="ValueError")
+    t0 = time.perf_counter()
+    text = q.prometheus_text()
+    dt = time.perf_counter() - t0
+    print(f"\nPrometheus export: {args.stages + 1} stages x {len(BUCKETS) + 1} buckets, "
+          f"{len(text.splitlines())} lines in {dt * 1000:.1f} ms")
+    print(f"uniform 0-1 s: p50={p50:.3f} p95={p95:.3f} p99={p99:.3f} mean={mean:.3f}")
+
+if __name__ == "__main__":
+    main()
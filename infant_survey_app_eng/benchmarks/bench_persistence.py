@@ -0,0 +1,91 @@
+
+# Hundreds of parallel submissions: no lost records, and throughput of the
+# synchronous save vs the background writer.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_persistence
+import argparse, glob, json, os, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from modules.persistence import ResponseWriter, save_response, stats_db_for
+from modules.response_stats import ResponseStatsIndex
+from utils.metrics import metrics
+
+def payload(i):
+    return {
+        "submitted_at": datetime.now().isoformat(),
+        "child_info": {"name": f"child-{i}", "age_group": "4~6 months"},
+        "responses": [{"id": "q-bench", "answer": "Yes"}],
+    }
+
+def verify(resp_dir, n):
+    files = glob.glob(os.path.join(resp_dir, "*.json"))
+    ids = set()
+    for p in files:
+        with open(p, "r", encoding="utf-8") as f:
+            ids.add(json.load(f)["child_info"]["name"])
+    stats = ResponseStatsIndex(stats_db_for(resp_dir))
+    counted = stats.answered("q-bench", "4~6 months")
+    stats.close()
+    assert len(files) == n and len(ids) == n and counted == n, (len(files), len(ids), counted)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--submissions", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=32)
+    args = ap.parse_args()
+    n = args.submissions
+
+    # Previous naming scheme: one file name per wall-clock second.
+    names = {datetime.now().strftime("resp_%Y%m%d_%H%M%S") for _ in range(n)}
+    print(f"old resp_%Y%m%d_%H%M%S names: {len(names)} distinct files for {n} submissions")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        resp_dir = os.path.join(tmp, "sync", "responses")
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(lambda i: save_response(payload(i), resp_dir), range(n)))
+        dt = time.perf_counter() - t0
+        verify(resp_dir, n)
+        print(f"save_response x{args.threads} threads: {n / dt:8.0f} responses/s, {dt / n * 1000:.2f} ms per Submit")
+
+        resp_dir = os.path.join(tmp, "queued", "responses")
+        writer = ResponseWriter(resp_dir)
+        submit_times = []
+
+        def submit(i):
+            t = time.perf_counter()
+            fut = writer.submit(payload(i))
+            submit_times.append(time.perf_counter() - t)
+            return fut
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            futures = list(pool.map(submit, range(n)))
+        for f in futures:
+            f.result()
+        dt = time.perf_counter() - t0
+        writer.close()
+        verify(resp_dir, n)
+        submit_times.sort()
+        print(f"ResponseWriter x{args.threads} threads: {n / dt:8.0f} responses/s, "
+              f"Submit returns in {submit_times[len(submit_times) // 2] * 1e6:.0f} us (p50), "
+              f"{submit_times[-1] * 1e6:.0f} us (max)")
+    print(f"all {n} records written once each, with matching statistics counts")
+
+    # A response that cannot be written fails its future and is counted, even when
+    # nobody waits on it.
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = ResponseWriter(os.path.join(tmp, "responses"))
+        errors = lambda: sum(v for (name, l), v in metrics.counters.items() if dict(l).get("stage") == "save")
+        before = errors()
+        bad = payload(0)
+        bad["attachment"] = object()   # not JSON
+        fut = writer.submit(bad)
+        writer.submit(payload(1)).result()
+        writer.close()
+        assert isinstance(fut.exception(), TypeError) and errors() == before + 1
+        assert len(glob.glob(os.path.join(tmp, "responses", "*.json"))) == 1
+    print("a failed write is reported to its future and counted as a save error")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+
+# How many triage LLM calls the compiled rule table removes on a synthetic answer corpus.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_prescreen
+import argparse, json, random, time
+from collections import Counter
+
+from agents.fake_llm import FakeChatModel
+from agents.prescreen import FLAG, NEEDS_LLM, NORMAL, compile_rules
+from agents.triage import TriageEngine, TriageItem
+from modules.survey_schema import SurveyPack
+
+SURVEY_PATH = "config/questionnaires/px_previsit_1.0.0.json"
+
+def synthetic_sessions(pack, n, rng):
+    """
+    Each session answers every question of one random age group.
+    Options are drawn uniformly; free-text/number answers get a random value.
+    """
+    by_age = {}
+    for q in pack.questions:
+        by_age.setdefault(q.age, []).append(q)
+    ages = sorted(by_age)
+    for _ in range(n):
+        months = rng.randint(0, 71)
+        items = []
+        for q in by_age[rng.choice(ages)]:
+            if q.qtype == "multi":
+                ans = str(rng.sample(q.options or ["a", "b", "c"], 1))
+            elif q.options or q.qtype == "single":
+                ans = rng.choice(q.options or ["Yes", "No"])
+            else:
+                ans = str(rng.randint(0, 24))
+            items.append(TriageItem(q.id, q.text, ans, months))
+        yield items
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    with open(SURVEY_PATH, "r", encoding="utf-8") as f:
+        pack = SurveyPack(**json.load(f))
+
+    t0 = time.perf_counter()
+    rules = compile_rules(pack)
+    t_compile = time.perf_counter() - t0
+    singles = sum(1 for q in pack.questions if q.qtype == "single")
+    print(f"rule table: {len(rules.rules)} (question, option) pairs over {singles} single-choice questions, "
+          f"compiled in {t_compile * 1000:.1f} ms {rules.coverage()}")
+
+    rng = random.Random(args.seed)
+    sessions = list(synthetic_sessions(pack, args.sessions, rng))
+    verdicts = Counter()
+    t0 = time.perf_counter()
+    for items in sessions:
+        for it in items:
+            verdicts[rules.lookup(it.q_id, it.answer).verdict] += 1
+    n = sum(verdicts.values())
+    per_lookup = (time.perf_counter() - t0) / n * 1e6
+    print(f"answers: {n}  normal: {verdicts[NORMAL]}  flag: {verdicts[FLAG]}  llm: {verdicts[NEEDS_LLM]}")
+    print(f"lookup: {per_lookup:.2f} us/answer")
+
+    # Same corpus through the engine, without memo hits inflating the gain.
+    for label, table in (("without rules", None), ("with rules", rules)):
+        llm = FakeChatModel()
+        engine = TriageEngine(lambda: llm, cache_size=0)
+        for items in sessions:
+            engine.triage(items, table)
+        print(f"{label:<14} LLM calls: {llm.calls}")
+    print(f"LLM calls removed: {(verdicts[NORMAL] + verdicts[FLAG]) / n:.1%}")
+
+if __name__ == "__main__":
+    main()
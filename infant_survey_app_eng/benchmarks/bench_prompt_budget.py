@@ -0,0 +1,86 @@
+# Prompt sizes before/after budgeting: the clinical summary of a fully answered questionnaire
+# (are the flagged answers kept?) and a long sidebar chat whose history holds full summaries
+# and repeated guidance. Also the cost of counting and compacting per prompt.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_prompt_budget
+import argparse, random, time
+
+from agents.budget import CHAT_BUDGET, SUMMARY_BUDGET, chat_context, count_tokens, get_encoder, recent_prompts
+from agents.prescreen import FLAG
+from agents.summary import NEGATIVE_ANSWERS, summary_context
+from modules.guidance_index import format_hits
+from modules.survey_index import load_survey_index
+
+FREE_TEXT = ("She has had a runny nose for three days and wakes up twice a night coughing, "
+             "mostly after feeding; no fever so far but she seems more tired than usual.")
+
+def answers(survey, rng):
+    out = []
+    for q in survey.pack.questions:
+        if q.options:
+            ans = rng.choice(q.options)
+        else:
+            ans = FREE_TEXT if q.qtype == "text" else str(rng.randrange(1, 30))
+        out.append({"id": q.id, "category": q.category, "text": q.text, "answer": ans})
+    return out
+
+def flagged_kept(context, items, rules):
+    flags = [it for it in items if rules.lookup(it["id"], it["answer"]).verdict == FLAG]
+    return sum(f"A: {it['answer']}\n" in context and it["text"] in context for it in flags), len(flags)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", default="config/questionnaires/px_previsit_1.0.0.json")
+    ap.add_argument("--turns", type=int, default=20)
+    args = ap.parse_args()
+
+    survey = load_survey_index(args.path)
+    print(f"token counter: {'tiktoken ' + get_encoder().name if get_encoder() else 'estimate (~4 chars/token)'}")
+    rng = random.Random(0)
+    items = answers(survey, rng)
+
+    print(f"\nsummary context, {len(items)} answers")
+    print(f"{'mode':<30} {'tokens':>7} {'flagged kept':>13}")
+    full = summary_context(items, budget=None, rules=survey.rules)
+    naive = "".join(f"- Q: {it['text']}\n  A: {it['answer']}\n" for it in items
+                    if it["answer"] not in NEGATIVE_ANSWERS)
+    cut = naive[:SUMMARY_BUDGET * 4]   # first answers that fit, by characters
+    for label, ctx in (("before: negatives dropped", summary_context(items, budget=None)),
+                       ("unbounded, flagged negatives", full), ("truncated in order", cut),
+                       (f"budget {SUMMARY_BUDGET}, ranked", summary_context(items, rules=survey.rules))):
+        kept, total = flagged_kept(ctx, items, survey.rules)
+        print(f"{label:<30} {count_tokens(ctx):>7} {kept:>6}/{total:<6}")
+    kept, total = flagged_kept(summary_context(items, rules=survey.rules), items, survey.rules)
+    assert kept == total
+
+    # Chat: every third assistant turn carries a full clinical summary; guidance repeats.
+    guidance = survey.guidance
+    questions = ["Is it normal that my baby does not roll over?", "How often should she feed at night?",
+                 "Should I worry about the cough?", "When is the next vaccination?", "Is tummy time needed?"]
+    messages = [{"role": "assistant", "content": "Hello! Ask me anything about the survey questions."}]
+    print(f"\n{'turn':>4} {'old prompt':>11} {'budgeted':>9} {'dropped':>8} {'ms':>6}")
+    before, after = [], []
+    for turn in range(args.turns):
+        q = questions[turn % len(questions)]
+        messages.append({"role": "user", "content": q})
+        hits = guidance.search(q, None)
+        g = format_hits(hits)
+        docs = " ".join(h.text for h in hits[:2]) + " Consult your pediatrician if symptoms persist."
+        old = "\n".join(f"{m['role']}: {m['content']}" for m in messages[-5:]) + g + docs + q
+        t0 = time.perf_counter()
+        ctx = chat_context(q, messages[-11:-1], g, docs)
+        ms = (time.perf_counter() - t0) * 1000
+        new = ctx["history"] + ctx["guidance"] + ctx["documents"] + q
+        before.append(count_tokens(old))
+        after.append(count_tokens(new))
+        assert after[-1] <= CHAT_BUDGET + count_tokens(q)
+        if turn % 4 == 0 or turn == args.turns - 1:
+            print(f"{turn + 1:>4} {before[-1]:>11} {after[-1]:>9} {recent_prompts[-1].dropped:>8} {ms:>6.2f}")
+        answer = g if turn % 2 else "Based on the guidance: " + docs
+        if turn % 3 == 2:
+            answer = "📝 **[Analysis Result]** has arrived.\n\n" + full[:4000]
+        messages.append({"role": "assistant", "content": answer})
+    print(f"mean chat prompt: {sum(before) / len(before):.0f} -> {sum(after) / len(after):.0f} tokens, "
+          f"max {max(before)} -> {max(after)}")
+
+if __name__ == "__main__":
+    main()
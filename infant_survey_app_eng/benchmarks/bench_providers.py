@@ -0,0 +1,66 @@
+# Cost of the provider layer: a new client per call (the old call sites) vs the registry's
+# shared one, and triage of one page through each configured backend. The fake backend's
+# --rtt stands in for the hosted round-trip; "local" runs only when its runtime and model
+# are installed (LOCAL_LLM_PATH), "openai" only with an API key and network.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_providers
+import argparse, os, tempfile, time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")  # clients are built, not called, in the first part
+
+from langchain_openai import ChatOpenAI
+
+from agents import providers, registry
+from agents.triage import TriageEngine, TriageItem
+from utils.llm_cache import LLM_CACHE_ENV
+
+def per_call(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=200)
+    ap.add_argument("--questions", type=int, default=30)
+    ap.add_argument("--rtt", type=float, default=0.4, help="seconds per simulated hosted call")
+    ap.add_argument("--providers", nargs="+", default=["fake", "local", "openai"])
+    args = ap.parse_args()
+
+    # The shared clients open the LLM cache; keep it out of data/.
+    with tempfile.TemporaryDirectory() as d:
+        os.environ[LLM_CACHE_ENV] = os.path.join(d, "llm_cache.sqlite")
+        registry.reset()
+        print(f"{'client per call':<28} {'us/call':>9}")
+        print(f"{'ChatOpenAI() (old)':<28} {per_call(lambda: ChatOpenAI(model='gpt-4o-mini', temperature=0), args.repeat):>9.1f}")
+        registry.chat_model()
+        print(f"{'registry.chat_model()':<28} {per_call(registry.chat_model, args.repeat * 10):>9.1f}")
+        assert registry.chat_model() is registry.chat_model(role="summary")
+
+        items = [TriageItem(f"q-{i:03d}", f"Does the child do thing {i}?", "Sometimes", 4) for i in range(args.questions)]
+        runs = [("fake", 0.0, "fake, no latency"), ("fake", args.rtt, f"fake, {args.rtt:.1f}s round-trip")]
+        runs += [(p, None, p) for p in args.providers if p != "fake"]
+        print(f"\n{'triage backend':<28} {'ready':>5} {'build s':>8} {'page s':>7} {'calls':>6}")
+        for name, latency, label in runs:
+            os.environ["TRIAGE_LLM_PROVIDER"] = name
+            if latency is not None:
+                os.environ["FAKE_LLM_LATENCY"] = str(latency)
+            if not providers.ready("triage") or (name == "openai" and os.environ["OPENAI_API_KEY"] == "sk-bench"):
+                print(f"{label:<28} {'no':>5}")
+                continue
+            registry.reset()
+            t0 = time.perf_counter()
+            llm = registry.chat_model(role="triage")
+            build = time.perf_counter() - t0
+            engine = TriageEngine(lambda: llm)
+            t0 = time.perf_counter()
+            out = engine.triage(items)
+            page = time.perf_counter() - t0
+            calls = getattr(getattr(llm, "llm", llm), "calls", engine.stats["llm"])
+            assert len(out) == len(items)
+            print(f"{label:<28} {'yes':>5} {build:>8.2f} {page:>7.2f} {calls:>6}")
+        os.environ.pop("TRIAGE_LLM_PROVIDER", None)
+        registry.reset()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+
+# Construction time and retained memory per 205-question pack:
+# validated pydantic models vs the slotted QuestionView fast path.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_question_model
+import argparse, gc, json, os, tempfile, time, tracemalloc
+
+from modules.survey_schema import QUESTION_FIELDS, Question, QuestionView, SurveyPack, SurveyPackView
+from modules.survey_snapshot import build_snapshot, read_snapshot, read_snapshot_view
+
+SURVEY_PATH = "config/questionnaires/px_previsit_1.0.0.json"
+
+def raw_pack():
+    with open(SURVEY_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def measure(label, build, repeat):
+    raws = [raw_pack() for _ in range(repeat)]
+    t0 = time.perf_counter()
+    for raw in raws:
+        build(raw)
+    ms = (time.perf_counter() - t0) / repeat * 1000
+
+    # Retained size of one pack (including strings it shares with the parsed
+    # JSON) once the JSON containers themselves are dropped.
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    raw = raw_pack()
+    pack = build(raw)
+    del raw
+    gc.collect()
+    kept = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    print(f"{label:<32} {ms:>8.3f} ms {kept / 1024:>9.0f} KiB")
+    return pack
+
+def check_compatible(views, models):
+    # Everything app.py reads off a question must be identical.
+    assert len(views) == len(models)
+    for v, m in zip(views, models):
+        for name in QUESTION_FIELDS:
+            assert getattr(v, name) == getattr(m, name), (m.id, name)
+        assert v.to_question() == m
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    print(f"{'construction from parsed JSON':<32} {'time':>11} {'retained':>13}")
+    validated = measure("pydantic SurveyPack(**raw)", lambda raw: SurveyPack(**raw), args.repeat)
+    measure("pydantic model_construct", lambda raw: [Question.model_construct(**q) for q in raw["questions"]], args.repeat)
+    views = measure("QuestionView.trusted", lambda raw: SurveyPackView.trusted(raw), args.repeat)
+    check_compatible(views.questions, validated.questions)
+    check_compatible(SurveyPackView.from_pack(validated).questions, validated.questions)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snap = build_snapshot(SURVEY_PATH, os.path.join(tmp, "pack.pxsnap"))
+        print(f"\n{'load from snapshot':<32} {'time':>11}")
+        for label, fn in (("read_snapshot (pydantic)", read_snapshot), ("read_snapshot_view", read_snapshot_view)):
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                fn(snap)
+            print(f"{label:<32} {(time.perf_counter() - t0) / args.repeat * 1000:>8.3f} ms")
+    print("\nQuestionView matches the validated Question on every field for all questions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# First-chat cost per new session: building clients per session vs the shared registry.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_registry
+import argparse, gc, os, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")  # clients are built, never called
+
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from agents import registry
+from agents.registry import _rss_bytes
+from utils.embedding_cache import EMBED_CACHE_ENV
+from utils.llm_cache import LLM_CACHE_ENV
+
+def per_session():
+    # What every session used to build for itself (minus the Chroma client).
+    return ChatOpenAI(model="gpt-4o-mini", temperature=0), OpenAIEmbeddings()
+
+def shared():
+    return registry.chat_model(), registry.embeddings()
+
+def run(build, sessions, threads):
+    gc.collect()
+    m0, t0 = _rss_bytes(), time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        kept = list(ex.map(lambda _: build(), range(sessions)))
+    dt = time.perf_counter() - t0
+    return dt, max(_rss_bytes() - m0, 0), len({id(c[0]) for c in kept})
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=300)
+    ap.add_argument("--threads", type=int, default=16)
+    args = ap.parse_args()
+
+    print(f"{'mode':<12} {'sessions':>8} {'ms/session':>11} {'KB/session':>11} {'clients':>8}")
+    # The shared clients open the LLM and embedding caches; keep them out of data/.
+    with tempfile.TemporaryDirectory() as d:
+        os.environ[LLM_CACHE_ENV] = os.path.join(d, "llm_cache.sqlite")
+        os.environ[EMBED_CACHE_ENV] = os.path.join(d, "embedding_cache")
+        for mode, build in (("per-session", per_session), ("registry", shared)):
+            registry.reset()
+            dt, mem, distinct = run(build, args.sessions, args.threads)
+            print(f"{mode:<12} {args.sessions:>8} {dt * 1000 / args.sessions:>11.3f} "
+                  f"{mem / 1024 / args.sessions:>11.1f} {distinct:>8}")
+        # Racing first callers must still get exactly one client.
+        assert distinct == 1
+        print(registry.stats())
+        assert os.path.exists(os.environ[LLM_CACHE_ENV]), "the LLM cache was opened outside the temp folder"
+        registry.reset()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# PDF report throughput: time per report with the standard and a TTF font, how long
+# Submit waits, and batch rendering of saved responses.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_report --files 200
+import argparse, json, os, random, tempfile, time
+
+import reportlab
+
+from modules.persistence import write_json_atomic
+from modules.report import ReportService, render_report, responses_for_day
+
+TTF = os.path.join(os.path.dirname(reportlab.__file__), "fonts", "Vera.ttf")
+
+def payloads(n, path="config/questionnaires/px_previsit_1.0.0.json", seed=0):
+    rng = random.Random(seed)
+    with open(path, "r", encoding="utf-8") as f:
+        qs = json.load(f)["questions"]
+    for i in range(n):
+        picked = rng.sample(qs, min(25, len(qs)))
+        yield {
+            "response_id": f"20260101_0900{i % 60:02d}_{i:012x}",
+            "child_info": {"name": f"Child {i}", "gender": rng.choice(["Boy", "Girl"]), "months_old": rng.randrange(24)},
+            "ai_summary": "\n".join(f"- finding {j}: answers suggest a follow-up on item {j} & <review>" for j in range(8)),
+            "responses": [{"text": q.get("text", ""), "answer": rng.choice(["Yes", "No", "<1 hour"])} for q in picked],
+        }
+
+def per_report(fn, items):
+    t0 = time.perf_counter()
+    for p in items:
+        fn(p)
+    return (time.perf_counter() - t0) / len(items)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reports", type=int, default=60, help="reports per serial measurement")
+    ap.add_argument("--files", type=int, default=120, help="saved responses in the batch run")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    args = ap.parse_args()
+
+    items = list(payloads(args.reports))
+    render_report(items[0])  # imports and first-use costs out of the way
+    print(f"{'serial render':<34} {'ms/report':>10}")
+    for label, fn in (("Helvetica", render_report),
+                      ("TTF font", lambda p: render_report(p, "Vera", TTF))):
+        print(f"{label:<34} {per_report(fn, items) * 1000:>10.1f}")
+
+    # Submit: the page waits for render_report() before, for submit() now.
+    service = ReportService(workers=1)
+    service.submit(items[0]).pdf()  # worker started
+    t0 = time.perf_counter()
+    handle = service.submit(items[1], "Result.pdf")
+    waited = time.perf_counter() - t0
+    pdf = handle.pdf(60)
+    ready = time.perf_counter() - t0
+    assert pdf.startswith(b"%PDF")
+    print(f"\nSubmit waits {waited * 1000:.2f} ms (was {per_report(render_report, items[1:2]) * 1000:.1f} ms); "
+          f"PDF ready after {ready * 1000:.1f} ms")
+    service.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        resp_dir = os.path.join(tmp, "responses")
+        os.makedirs(resp_dir)
+        for p in payloads(args.files, seed=1):
+            write_json_atomic(os.path.join(resp_dir, f"resp_{p['response_id']}.json"), p, fsync=False)
+        with open(os.path.join(resp_dir, "resp_20260101_000000_broken.json"), "w") as f:
+            f.write("{")
+        paths = responses_for_day(resp_dir, "2026-01-01")
+        assert len(paths) == args.files + 1 and not responses_for_day(resp_dir, "2026-01-02")
+
+        print(f"\n{'batch':<12} {'files':>6} {'failed':>7} {'seconds':>8} {'pdfs/s':>7}   ({os.cpu_count()} CPUs)")
+        for w in args.workers:
+            service = ReportService(workers=w)
+            r = service.render_batch(paths, os.path.join(tmp, f"reports_{w}"))
+            service.close()
+            assert r["rendered"] == args.files and r["failed"] == 1
+            print(f"{w} worker(s) {r['files']:>8} {r['failed']:>7} {r['seconds']:>8.2f} {r['pdfs_per_sec']:>7.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+
+# Rerun latency of calculate_stats as the number of saved responses grows.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_response_stats
+import argparse, glob, json, os, random, tempfile, time
+
+from modules.response_stats import ResponseStatsIndex
+
+QUESTIONS = [f"q-{i:08x}" for i in range(30)]  # one 30-question age group
+AGE_GROUP = "4~6 months"
+
+def fake_payload(rng):
+    return {
+        "child_info": {"age_group": AGE_GROUP},
+        "responses": [{"id": q, "answer": rng.choice(["Yes", "No"])} for q in QUESTIONS],
+    }
+
+def rerun_index(idx):
+    # What one rerun costs when every question on the page is answered.
+    for q in QUESTIONS:
+        if idx.answered(q, AGE_GROUP):
+            idx.distribution(q, AGE_GROUP)
+
+def rerun_glob(resp_dir):
+    # The old calculate_stats: one directory scan per answered question.
+    for _ in QUESTIONS:
+        len(glob.glob(os.path.join(resp_dir, "*.json")))
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    ap.add_argument("--glob-max", type=int, default=10000, help="largest size to also time the old glob path at")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        resp_dir = os.path.join(tmp, "responses")
+        os.makedirs(resp_dir)
+        idx = ResponseStatsIndex(os.path.join(tmp, "stats.sqlite"))
+        n = 0
+        print(f"{'responses':>10} {'index ms/rerun':>15} {'glob ms/rerun':>14}")
+        for size in sorted(int(s) for s in args.sizes.split(",")):
+            batch = [(fake_payload(rng), None) for _ in range(size - n)]
+            idx.record_many(batch)
+            if size <= args.glob_max:
+                for i, (p, _) in enumerate(batch, start=n):
+                    with open(os.path.join(resp_dir, f"resp_{i}.json"), "w") as f:
+                        json.dump(p, f)
+            n = size
+
+            t_idx = timed(lambda: rerun_index(idx), args.repeat)
+            t_glob = timed(lambda: rerun_glob(resp_dir), max(1, args.repeat // 10)) if size <= args.glob_max else None
+            print(f"{size:>10} {t_idx:>15.3f} {('%.3f' % t_glob) if t_glob is not None else '-':>14}")
+        idx.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Hit rate, wrong-answer rate and lookup cost of the semantic answer cache on a synthetic
+# stream of repeated caregiver questions (reworded, spread over age groups, Zipf-distributed).
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_semantic_cache
+import argparse, random, time
+
+from benchmarks.fakes import HashEmbeddings
+from utils.semantic_cache import DEFAULT_THRESHOLD, SemanticCache, shareable
+
+SUBJECTS = ["sleep", "feed", "bathe", "burp", "vaccinate", "weigh", "swaddle", "walk", "talk", "teethe"]
+ASKS = ["how much should {s} happen per day", "when should my infant {s}", "is it normal not to {s}",
+        "what helps to {s} better", "how often do doctors say to {s}"]
+FILLERS = ["hi", "please", "quick question", "sorry", "doctor"]
+AGES = ["14~35 days", "4~6 months", "9~12 months"]
+
+def variant(rng, text):
+    words = text.split()
+    if rng.random() < 0.5:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+    if rng.random() < 0.4:
+        words.insert(0, rng.choice(FILLERS))
+    out = " ".join(words)
+    return out.upper() if rng.random() < 0.1 else out
+
+def stream(rng, n):
+    bases = [a.format(s=s) for s in SUBJECTS for a in ASKS]
+    weights = [1 / (i + 1) for i in range(len(bases))]
+    for _ in range(n):
+        b = rng.choices(range(len(bases)), weights)[0]
+        yield rng.choice(AGES), b, variant(rng, bases[b])
+
+def run(threshold, n, seed=0, **kwargs):
+    cache = SemanticCache(HashEmbeddings(), threshold=threshold, **kwargs)
+    rng = random.Random(seed)
+    wrong, answers, t_lookup = 0, 0, 0.0
+    for age, base, q in stream(rng, n):
+        t0 = time.perf_counter()
+        hit, vec = cache.lookup(q, age)
+        t_lookup += time.perf_counter() - t0
+        if hit:
+            wrong += hit.answer != f"answer {base} for {age}"
+        else:
+            cache.put(q, f"answer {base} for {age}", age, vec)
+            answers += 1
+    return cache.stats(), wrong, answers, t_lookup / n
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--questions", type=int, default=5000)
+    args = ap.parse_args()
+
+    print(f"{'threshold':>9} {'hit rate':>9} {'wrong':>6} {'generations':>12} {'us/lookup':>10}")
+    for th in (0.8, 0.85, 0.9, DEFAULT_THRESHOLD, 0.95, 0.99):
+        st, wrong, gens, per = run(th, args.questions)
+        print(f"{th:>9.2f} {st['hit_rate']:>9.2f} {wrong:>6} {gens:>12} {per * 1e6:>10.1f}")
+
+    # Scopes do not leak: the same question for another age group is a miss.
+    c = SemanticCache(HashEmbeddings())
+    c.put("when should my infant sleep", "A", "4~6 months")
+    assert c.lookup("when should my infant sleep", "4~6 months")[0].answer == "A"
+    assert c.lookup("when should my infant sleep", "9~12 months")[0] is None
+
+    # Only answers that did not depend on a caregiver's conversation are cached.
+    assert shareable([]) and shareable(None)
+    assert shareable([{"role": "assistant", "content": "Hello! Ask me anything."}])
+    assert not shareable([{"role": "user", "content": "my son has a rash"}])
+    assert not shareable([{"role": "assistant", "content": "📝 **[Analysis Result]** Child A: ..."}])
+
+    # A scope goes away with its last entry.
+    c = SemanticCache(HashEmbeddings(), max_entries=1)
+    c.put("when should my infant sleep", "A", "4~6 months")
+    c.put("when should my infant sleep", "A", "9~12 months")
+    assert c.stats()["scopes"] == 1
+
+    st, _, _, _ = run(0.9, args.questions, max_entries=50)
+    assert st["entries"] <= 50 and st["evictions"] > 0
+    print(f"max_entries=50: {st['evictions']} LRU evictions, hit rate {st['hit_rate']:.2f}")
+    st, _, _, _ = run(0.9, 500, ttl=0)
+    assert st["hits"] == 0 and st["scopes"] <= st["entries"]
+    print(f"ttl=0: {st['expired']} expired, hit rate {st['hit_rate']:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# Survey service: what the async layer and HTTP add per call, then N caregivers at once
+# (triage per page, streamed summary, submit, PDF download) in process vs against
+# `python -m service.api` with one and with --workers server processes. The model is the
+# fake backend with --llm-latency; the PDF is real. Checks every session got its PDF.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_service
+import argparse, math, os, random, signal, socket, subprocess, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+os.environ["LLM_PROVIDER"] = "fake"   # before anything builds a client
+
+from agents import registry
+from agents.chains import VS_DIR_ENV
+from modules.answer_store import AnswerStore
+from service.client import HttpClient, LocalClient
+from service.core import REPORT_STALE_AFTER, SurveyService
+from benchmarks.fakes import HashEmbeddings
+from utils.metrics import metrics
+from utils.semantic_cache import SemanticCache
+
+MAX_DAYS = 71 * 30
+
+def per_call(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def group_alive(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+
+def stop_group(proc, timeout: float = 30.0):
+    """
+    Stops the server and everything it forked (uvicorn workers, PDF workers) and waits
+    until none is left, so no process keeps the port or our stdout open.
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    proc.wait()
+    deadline = time.monotonic() + timeout
+    while group_alive(proc.pid):
+        if time.monotonic() > deadline:
+            os.killpg(proc.pid, signal.SIGKILL)
+            raise RuntimeError(f"service.api left processes behind after {timeout:.0f}s")
+        time.sleep(0.05)
+
+@contextmanager
+def server(workers: int, data_dir: str):
+    """
+    `python -m service.api` on a free port in its own process group, ready (clients
+    warmed up) when the block starts.
+    """
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "-m", "service.api", "--port", str(port), "--workers", str(workers),
+                             "--data-dir", data_dir], start_new_session=True)
+    client = HttpClient(f"http://127.0.0.1:{port}")
+    try:
+        for _ in range(600):
+            try:
+                if not client.http.get("/health").json()["warming"]:
+                    break
+            except Exception:
+                pass
+            time.sleep(0.1)
+        else:
+            raise RuntimeError("service.api did not start")
+        yield client
+    finally:
+        client.http.close()
+        stop_group(proc)
+
+def session(client, i: int, page: int) -> float:
+    t0, rng = time.perf_counter(), random.Random(i)
+    survey = client.survey()
+    days = rng.randrange(MAX_DAYS)
+    age = survey.age_labels[survey.group_for_days(days)]
+    store, qs = AnswerStore(survey.version), survey.questions_for(age)
+    feedback = {}
+    for start in range(0, len(qs), page):
+        for q in qs[start:start + page]:
+            store.set(q, rng.choice(q.options) if q.options else str(rng.randrange(1, 10)))
+        answered = [q for q in qs if q.id in store.values]
+        feedback = client.triage({q.id: store.get(q.id) for q in answered}, days // 30)
+        client.stats(age, answered)
+    child = {"name": f"Child {i}", "gender": "Female", "months_old": days // 30, "days_old": days, "age_group": age}
+    responses = store.responses(qs)
+    summary = "".join(client.summarize(responses, child, {k for k, v in feedback.items() if v}))
+    result = client.submit(child, responses, summary)
+    while True:
+        status, data = client.report(result["report_id"])
+        if status != "pending":
+            break
+        time.sleep(0.05)
+    assert status == "ready" and data.startswith(b"%PDF"), (status, data)
+    return time.perf_counter() - t0
+
+def load(client, sessions: int, rounds: int, page: int):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(sessions) as pool:
+        times = sorted(pool.map(lambda i: session(client, i, page), range(sessions * rounds)))
+    wall = time.perf_counter() - t0
+    return len(times) * 60 / wall, times[len(times) // 2], times[max(0, math.ceil(len(times) * 0.95) - 1)]
+
+def run(label: str, client, args):
+    load(client, min(args.sessions, 4), 1, args.page)   # first use of pools, memos and PDF workers, untimed
+    print(f"{label:<28} " + "{:>12.0f} {:>7.2f} {:>7.2f}".format(*load(client, args.sessions, args.rounds, args.page)))
+
+def check_chat_cache(local):
+    """
+    Fresh sessions share answers for the age group; once a conversation carries the
+    caregiver's own summary the cache is neither read nor filled.
+    """
+    cache = registry.semantic_cache()
+    q = "Is a cough without fever serious?"
+    greeting = [{"role": "assistant", "content": "Hello! Ask me anything about the survey questions."}]
+    a = greeting + [{"role": "assistant", "content": "📝 **[Analysis Result]** Child A: fever flagged."}]
+    before = dict(cache.counters)
+    "".join(local.chat(q, greeting, "4~6 months"))
+    "".join(local.chat(q, greeting, "4~6 months"))   # another session: served from the cache
+    "".join(local.chat(q, a, "4~6 months"))          # private history: no lookup
+    hits, misses = cache.counters["hits"] - before["hits"], cache.counters["misses"] - before["misses"]
+    assert (hits, misses) == (1, 1), (hits, misses)
+
+def check_trace(client, age, qs):
+    """
+    The page's profile: the service's stages of a call are in the caller's trace next
+    to the client.* span, over HTTP as well as in process.
+    """
+    trace = metrics.trace()
+    client.stats(age, qs)
+    "".join(client.summarize([], {"name": "Trace", "gender": "Female", "months_old": 1, "days_old": 30}))
+    stages = {stage for stage, _, _ in trace.spans}
+    assert {"client.stats", "stats", "client.summarize", "summary"} <= stages, stages
+
+def check_failed_save(local):
+    """
+    Submit only succeeds once the response is on disk: a write that fails raises to the
+    page (which shows "Submission Failed") instead of being lost behind a success.
+    """
+    child = {"name": "Unsaved", "gender": "Female", "months_old": 1, "days_old": 30}
+    try:
+        local.submit(child, [{"id": "q", "answer": object()}], "")   # not JSON: the write fails
+    except TypeError:
+        return
+    raise AssertionError("submit() reported a response that was not written")
+
+def check_report_restart(local):
+    """
+    A saved response whose render was lost with its process (a restart) is rendered
+    again when it is polled instead of staying "pending".
+    """
+    child = {"name": "Restart", "gender": "Male", "months_old": 2, "days_old": 60}
+    rid = local.submit(child, [], "")["report_id"]
+    while local.report(rid)[0] == "pending":
+        time.sleep(0.05)
+    os.remove(local.service.report_path(rid))
+    old = time.time() - 2 * REPORT_STALE_AFTER
+    os.utime(os.path.join(local.service.resp_dir, f"resp_{rid}.json"), (old, old))
+    svc = SurveyService(resp_dir=local.service.resp_dir, report_dir=local.service.report_dir)
+    try:
+        restarted = LocalClient(svc)
+        status, _ = restarted.report(rid)
+        while status == "pending":
+            time.sleep(0.05)
+            status, _ = restarted.report(rid)
+        assert status == "ready", status
+    finally:
+        svc.close()
+
+def check_report_statuses():
+    """
+    Whatever the server (or a proxy in front of it) answers, report() gives the page a
+    status it can show: a redirect or a bare error page is a failure, not None.
+    """
+    import httpx
+    client = HttpClient("http://survey.invalid")
+    for code, expected in ((200, "ready"), (202, "pending"), (404, "unknown"), (302, "failed"), (502, "failed")):
+        body = {"status": expected} if code in (202, 404) else None
+        client.http = httpx.Client(base_url=client.base_url, transport=httpx.MockTransport(
+            lambda request: httpx.Response(code, json=body) if body else httpx.Response(code, content=b"%PDF")))
+        status, _ = client.report("r1")
+        assert status == expected, (code, status)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=300)
+    ap.add_argument("--sessions", type=int, default=16, help="concurrent caregivers")
+    ap.add_argument("--rounds", type=int, default=2)
+    ap.add_argument("--page", type=int, default=8, help="answers per rerun")
+    ap.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake model call")
+    ap.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1), help="server processes for the last run")
+    args = ap.parse_args()
+    os.environ["FAKE_LLM_LATENCY"] = str(args.llm_latency)   # inherited by the servers
+
+    # Offline embeddings for the chat cache, registered before the warm-up builds the real one.
+    registry.get_client("semantic_cache", lambda: SemanticCache(HashEmbeddings()))
+    with tempfile.TemporaryDirectory() as d:
+        os.environ[VS_DIR_ENV] = os.path.join(d, "vectorstore")   # inherited by the servers
+        svc = SurveyService(resp_dir=os.path.join(d, "local", "responses"),
+                            report_dir=os.path.join(d, "local", "reports")).start()
+        local = LocalClient(svc)
+        while svc.warming():
+            time.sleep(0.1)
+        survey = local.survey()
+        age = survey.age_labels[0]
+        qs = survey.questions_for(age)
+        check_chat_cache(local)
+        check_report_statuses()
+        check_failed_save(local)
+        check_report_restart(local)
+        check_trace(local, age, qs)
+
+        with server(1, os.path.join(d, "http_1")) as http:
+            assert len(http.survey().pack.questions) == len(survey.pack.questions)
+            check_trace(http, age, qs)
+            print(f"{'per call (' + str(len(qs)) + ' questions)':<28} {'direct':>9} {'in process':>11} {'HTTP':>9}  us")
+            print(f"{'stats':<28} {per_call(lambda: svc._stats(age, [(q.id, q.qtype) for q in qs]), args.calls):>9.0f} "
+                  f"{per_call(lambda: local.stats(age, qs), args.calls):>11.0f} "
+                  f"{per_call(lambda: http.stats(age, qs), args.calls):>9.0f}")
+            print(f"{'survey (unchanged)':<28} {per_call(svc.index, args.calls):>9.0f} "
+                  f"{per_call(local.survey, args.calls):>11.0f} {per_call(http.survey, args.calls):>9.0f}")
+
+            print(f"\n{args.sessions} caregivers x {args.rounds}, fake model {args.llm_latency}s, {os.cpu_count()} CPUs")
+            print(f"{'mode':<28} {'sessions/min':>12} {'p50 s':>7} {'p95 s':>7}")
+            run("in process", local, args)
+            run("HTTP, 1 process", http, args)
+        with server(args.workers, os.path.join(d, f"http_{args.workers}")) as http:
+            run(f"HTTP, {args.workers} processes", http, args)
+        svc.close()
+
+if __name__ == "__main__":
+    main()
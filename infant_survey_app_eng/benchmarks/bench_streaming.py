@@ -0,0 +1,88 @@
+# Time to first visible token for the clinical summary and the sidebar chat: blocking vs streamed.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_streaming
+import argparse, os, tempfile, time
+
+from agents.chains import get_rag_chain
+from agents.fake_llm import FakeChatModel
+from agents.streaming import StreamTiming, stream_text
+from agents.summary import stream_summary, summary_messages
+from utils.llm_cache import LLMCache, cached_llm
+
+REPORT = " ".join(f"word{i}" for i in range(200))
+
+class FakeDoc:
+    def __init__(self, text):
+        self.page_content = text
+        self.metadata = {"source": "fake"}
+
+class FakeRetriever:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get_relevant_documents(self, question):
+        time.sleep(self.latency)
+        return [FakeDoc(f"note about {question}")] * 3
+
+def blocking(llm, messages):
+    t0 = time.perf_counter()
+    text = llm.invoke(messages).content
+    dt = time.perf_counter() - t0
+    return text, dt, dt
+
+def streamed(llm, messages, label):
+    timing = StreamTiming(label)
+    text = "".join(stream_text(llm, messages, label=label, timing=timing))
+    return text, timing.ttft, timing.total
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ttft", type=float, default=0.3, help="fake model seconds to first token")
+    ap.add_argument("--token-latency", type=float, default=0.01, help="fake model seconds per further token")
+    ap.add_argument("--retrieval", type=float, default=0.2, help="fake retriever seconds per query")
+    ap.add_argument("--assembly", type=float, default=0.05,
+                    help="seconds spent building the chat prompt and client while retrieval runs")
+    args = ap.parse_args()
+
+    responses = [{"text": f"question {i}", "answer": "Yes"} for i in range(30)]
+    child = {"name": "Test", "gender": "Female", "months_old": 4, "days_old": 125}
+    messages = summary_messages(responses, child)
+    llm = FakeChatModel(lambda _: REPORT, latency=args.ttft, token_latency=args.token_latency)
+
+    print(f"{'path':<24} {'first token':>12} {'total':>8}")
+    text, first, total = blocking(llm, messages)
+    print(f"{'summary blocking':<24} {first:>12.3f} {total:>8.3f}")
+    timing = StreamTiming("summary")
+    out = "".join(stream_summary(llm, responses, child, timing=timing))
+    assert out == text
+    print(f"{'summary streamed':<24} {timing.ttft:>12.3f} {timing.total:>8.3f}")
+    assert timing.ttft < first / 2
+
+    with tempfile.TemporaryDirectory() as d:
+        cache = LLMCache(os.path.join(d, "cache.sqlite"))
+        cached = cached_llm(llm, cache)
+        for label in ("summary cache miss", "summary cache hit"):
+            out, first, total = streamed(cached, messages, label)
+            assert out == text
+            print(f"{label:<24} {first:>12.3f} {total:>8.3f}")
+
+        # Chat: the RAG answer feeds the final prompt, so only the prompt assembly can overlap with it.
+        rag = get_rag_chain(llm=cached_llm(FakeChatModel(lambda _: "rag answer", latency=args.ttft), cache),
+                            retriever=FakeRetriever(args.retrieval))
+        chat_llm = FakeChatModel(lambda _: REPORT, latency=args.ttft, token_latency=args.token_latency)
+        for mode in ("serial", "concurrent"):
+            question = f"fever ({mode})"  # distinct prompts, so neither run is a cache hit
+            t0 = time.perf_counter()
+            if mode == "serial":
+                rag_answer = rag.invoke({"question": question})["answer"]
+                time.sleep(args.assembly)
+            else:
+                fut = rag.submit({"question": question})
+                time.sleep(args.assembly)
+                rag_answer = fut.result()["answer"]
+            timing = StreamTiming("chat")
+            timing.started = t0
+            "".join(stream_text(chat_llm, f"[Medical Info] {rag_answer}", label="chat", timing=timing))
+            print(f"{'chat ' + mode:<24} {timing.ttft:>12.3f} {timing.total:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+
+# Per-rerun render preparation: the previous app.py path vs the cached SurveyIndex.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_survey_index
+import argparse, json, re, time
+
+from modules.survey_index import load_survey_index
+from modules.survey_schema import SurveyPack
+
+SURVEY_PATH = "config/questionnaires/px_previsit_1.0.0.json"
+
+# --- previous app.py helpers, kept verbatim as the baseline ---
+def find_matching_index(days, age_labels):
+    for i, label in enumerate(age_labels):
+        m = re.search(r"(\d+)\s*~\s*(\d+)\s*months", label.lower())
+        if m:
+            if int(m.group(1)) <= (days//30) <= int(m.group(2)): return i
+        m2 = re.search(r"(\d+)\s*~\s*(\d+)\s*days", label.lower())
+        if m2:
+            if int(m2.group(1)) <= days <= int(m2.group(2)): return i
+    return 0
+
+def age_sort_key(s):
+    s = s.lower().replace(" ","")
+    if "days" in s: return int(re.match(r"(\d+)", s).group(1))
+    if "months" in s: return int(re.match(r"(\d+)", s).group(1)) * 30
+    return 9999
+
+def prep_before(days):
+    with open(SURVEY_PATH, "r", encoding="utf-8") as f: raw = json.load(f)
+    pack = SurveyPack(**raw)
+    age_list = sorted(list({q.age for q in pack.questions}), key=age_sort_key)
+    sel_age = age_list[find_matching_index(days, age_list)]
+    qs = [q for q in pack.questions if q.age == sel_age]
+    cats = sorted(list({q.category for q in qs}))
+    return age_list, sel_age, {cat: [q.id for q in qs if q.category == cat] for cat in cats}
+
+def prep_after(days):
+    survey = load_survey_index(SURVEY_PATH)
+    age_list = survey.age_labels
+    sel_age = age_list[survey.group_for_days(days)]
+    cats = survey.categories_for(sel_age)
+    return age_list, sel_age, {cat: [q.id for q in survey.questions_for(sel_age, cat)] for cat in cats}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    # Same answers for every age the questionnaire covers.
+    for days in range(0, 2200, 5):
+        assert prep_before(days) == prep_after(days), days
+
+    t0 = time.perf_counter()
+    for i in range(args.repeat):
+        prep_before(i * 43 % 2200)
+    before = (time.perf_counter() - t0) / args.repeat * 1000
+    t0 = time.perf_counter()
+    for i in range(args.repeat):
+        prep_after(i * 43 % 2200)
+    after = (time.perf_counter() - t0) / args.repeat * 1000
+    print(f"render prep per rerun: before {before:.3f} ms, after {after:.4f} ms ({before / after:.0f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Load time and retained memory of the page's read path (SurveyPackView.load): questionnaire
+# JSON vs compact snapshot, the snapshot's freshness checked against the JSON's content.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_survey_snapshot
+import argparse, gc, json, os, shutil, tempfile, time, tracemalloc
+
+from modules.survey_schema import SurveyPackView
+from modules.survey_snapshot import build_snapshot, fresh_snapshot, snapshot_path_for
+
+SURVEY_PATH = "config/questionnaires/px_previsit_1.0.0.json"
+
+def measure(label, fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    ms = (time.perf_counter() - t0) / repeat * 1000
+
+    # Memory still held by the loaded pack once temporaries are gone.
+    gc.collect()
+    tracemalloc.start()
+    pack = fn()
+    gc.collect()
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {ms:>8.2f} ms {kept / 1024:>9.0f} KiB {peak / 1024:>9.0f} KiB")
+    return ms
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = shutil.copy(SURVEY_PATH, os.path.join(tmp, "pack.json"))
+        print(f"{'path':<28} {'load':>11} {'retained':>13} {'peak':>13}")
+        json_ms = measure("json + validation", lambda: SurveyPackView.load(path), args.repeat)
+        snap = build_snapshot(path)
+        snap_ms = measure("snapshot (render fields)", lambda: SurveyPackView.load(path), args.repeat)
+
+        def full():
+            pack = SurveyPackView.load(path)
+            pack.guidance(pack.questions[0].id)
+            return pack
+        measure("snapshot + guidance", full, args.repeat)
+        print(f"snapshot load is {json_ms / snap_ms:.1f}x faster, hash check included; "
+              f"file size: json {os.path.getsize(path) / 1024:.0f} KiB, snapshot {os.path.getsize(snap) / 1024:.0f} KiB")
+
+        # An edit after the snapshot was built: the snapshot is newer on disk but stale in content.
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        raw["questions"][0]["text"] = "Edited after the snapshot was built?"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(raw, f, ensure_ascii=False)
+        os.utime(snap, (time.time() + 60, time.time() + 60))
+        with open(path, "rb") as f:
+            assert fresh_snapshot(path, f.read()) is None
+        assert SurveyPackView.load(path).questions[0].text == raw["questions"][0]["text"]
+        build_snapshot(path)
+        assert SurveyPackView.load(path).questions[0].text == raw["questions"][0]["text"]
+        assert snapshot_path_for(path) == snap
+        print("a snapshot older in content than its JSON is ignored, whatever its mtime")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+
+# Wall-clock cost of triaging one 30-question page: serial vs pooled vs batched.
+# Run from infant_survey_app_eng/:  python -m benchmarks.bench_triage
+import argparse, json, re, time
+
+from agents.fake_llm import FakeChatModel
+from agents.triage import TriageEngine, TriageItem
+from utils.metrics import metrics
+
+def verdict(q_text, answer):
+    # Deterministic "model": every "No" answer gets a warning naming its question.
+    return f"⚠️ Check {q_text}" if answer == "No" else "PASS"
+
+def respond(text):
+    items = re.findall(r"^(\d+)\. Age: .*? \| Question: (.*?) \| Answer: (.*)$", text, re.M)
+    if items:
+        return json.dumps({n: verdict(q, a) for n, q, a in items}, ensure_ascii=False)
+    q = re.search(r"- Question: (.*)", text).group(1)
+    a = re.search(r"- Answer: (.*)", text).group(1)
+    return verdict(q, a)
+
+def triage_errors() -> float:
+    return sum(v for (name, labels), v in metrics.counters.items()
+               if name == "stage_errors_total" and dict(labels).get("stage") == "triage.llm")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--questions", type=int, default=30)
+    ap.add_argument("--latency", type=float, default=0.05, help="seconds per fake LLM call")
+    ap.add_argument("--workers", type=int, default=8)
+    args = ap.parse_args()
+
+    items = [TriageItem(f"q-{i:03d}", f"question {i}", "No" if i % 3 == 0 else "Yes", 4)
+             for i in range(args.questions)]
+    expected = {it.q_id: (f"⚠️ Check {it.q_text}" if it.answer == "No" else None) for it in items}
+
+    # Baseline: the old render loop, one blocking call per widget.
+    llm = FakeChatModel(respond, latency=args.latency)
+    serial = TriageEngine(lambda: llm, max_workers=1)
+    t0 = time.perf_counter()
+    serial_out = {it.q_id: serial.evaluate_one(it) for it in items}
+    t_serial = time.perf_counter() - t0
+    assert serial_out == expected
+
+    print(f"{'mode':<8} {'seconds':>8} {'speedup':>8} {'llm calls':>10}")
+    print(f"{'serial':<8} {t_serial:>8.3f} {1.0:>8.1f} {llm.calls:>10}")
+    for mode in ("pool", "batch"):
+        llm = FakeChatModel(respond, latency=args.latency)
+        engine = TriageEngine(lambda: llm, mode=mode, max_workers=args.workers)
+        t0 = time.perf_counter()
+        out = engine.triage(items)
+        dt = time.perf_counter() - t0
+        # Same verdict per question id, and keys come back in page order.
+        assert out == expected and list(out) == [it.q_id for it in items], mode
+        calls = llm.calls
+        # A rerun with nothing changed must not reach the model.
+        engine.triage(items)
+        assert llm.calls == calls
+        print(f"{mode:<8} {dt:>8.3f} {t_serial / dt:>8.1f} {calls:>10}")
+
+    # A failed model call is not remembered as "no warning": the next rerun asks again.
+    down = {"on": True}
+    def flaky(text):
+        if down["on"]:
+            raise TimeoutError("model timed out")
+        return respond(text)
+    llm = FakeChatModel(flaky)
+    engine = TriageEngine(lambda: llm)
+    before = triage_errors()
+    assert engine.triage(items[:3]) == {it.q_id: None for it in items[:3]}
+    assert triage_errors() - before == 3
+    down["on"] = False
+    assert engine.triage(items[:3]) == {it.q_id: expected[it.q_id] for it in items[:3]}
+    assert engine.stats["memo"] == 0
+
+if __name__ == "__main__":
+    main()
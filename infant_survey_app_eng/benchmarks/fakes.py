@@ -0,0 +1,39 @@
+# Test doubles shared by the benchmarks, kept out of the app's modules: the provider
+# lookup (utils.embeddings.get_embeddings) refuses "fake", so only code that imports
+# this module on purpose gets one.
+import hashlib, threading
+from typing import List
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:
+    Embeddings = object
+
+class HashEmbeddings(Embeddings):
+    """
+    Offline stand-in: deterministic vectors from token hashes. Counts calls and
+    embedded texts so benchmarks can check how much work reached the model.
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        v = [0.0] * self.size
+        for tok in text.lower().split():
+            h = int.from_bytes(hashlib.md5(tok.encode("utf-8")).digest()[:4], "little")
+            v[h % self.size] += 1.0
+        norm = sum(x * x for x in v) ** 0.5 or 1.0
+        return [x / norm for x in v]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,224 @@
+# Clinic-morning load test: N caregivers fill in the survey at once, outside Streamlit.
+# Each session loads the questionnaire, matches the age group, answers page by page with
+# triage after every page (as reruns do), asks the chatbot, submits (clinical summary,
+# PDF report, saved response). Model and embeddings are local fakes with configurable
+# latency, answers are seeded, so runs are repeatable. Reports throughput, p50/p95/p99 and
+# first-use memory per stage, and compares against benchmarks/baselines/loadtest.json.
+# Run from infant_survey_app_eng/:  python -m benchmarks.loadtest [--sessions 20] [--save-baseline]
+import argparse, json, os, platform, random, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+os.environ["LLM_PROVIDER"] = "fake"   # before anything builds a client
+
+from agents import registry
+from agents.budget import chat_context
+from agents.registry import _rss_bytes
+from agents.streaming import stream_text
+from agents.summary import stream_summary
+from agents.triage import TriageEngine, TriageItem
+from modules.answer_store import AnswerStore
+from modules.guidance_index import format_hits
+from modules.persistence import ResponseWriter
+from modules.report import ReportService
+from modules.survey_index import load_survey_index
+from benchmarks.fakes import HashEmbeddings
+from utils.metrics import Metrics, metrics as app_metrics
+from utils.semantic_cache import SemanticCache
+
+STAGES = ("load", "age", "triage", "chat", "summary", "report", "save", "session")
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "loadtest.json")
+QUESTIONS = ["Is it normal that my baby does not roll over yet?", "How often should she feed at night?",
+             "Should I worry about a cough without fever?", "When is the next vaccination due?",
+             "How much tummy time is enough?", "Is it okay to use a pacifier?"]
+MAX_DAYS = 71 * 30
+
+class SlowEmbeddings(HashEmbeddings):
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return super().embed_documents(texts)
+
+class Harness:
+    """
+    Shared, process-wide pieces (as @st.cache_resource holds them in the app) plus the
+    per-stage timings of every session.
+    """
+
+    def __init__(self, args, workdir: str):
+        self.args = args
+        self.timings = Metrics()
+        self.first_use = None   # {stage: bytes} while the warm-up session runs
+        self.engine = TriageEngine(lambda: registry.chat_model(role="triage"))
+        self.cache = SemanticCache(SlowEmbeddings(args.embed_latency))
+        self.writer = ResponseWriter(os.path.join(workdir, "responses"))
+        self.reports = ReportService(workers=args.report_workers)
+
+    def close(self):
+        self.writer.close()
+        self.reports.close()
+
+    @contextmanager
+    def span(self, stage: str):
+        m0 = _rss_bytes() if self.first_use is not None else 0
+        with self.timings.span(stage):
+            yield
+        if self.first_use is not None and stage != "session":
+            self.first_use[stage] = self.first_use.get(stage, 0) + max(_rss_bytes() - m0, 0)
+
+    def warm_up(self) -> dict:
+        """
+        One session alone: the resident memory each stage adds on first use (clients,
+        indexes, pools). Its timings are dropped.
+        """
+        self.first_use = {}
+        self.session(-1)
+        grown, self.first_use = self.first_use, None
+        self.timings = Metrics()
+        return grown
+
+    def session(self, i: int):
+        a, rng, span = self.args, random.Random(i), self.span
+        with span("session"):
+            with span("load"):
+                survey = load_survey_index(a.survey)
+            with span("age"):
+                days = rng.randrange(MAX_DAYS)
+                age = survey.age_labels[survey.group_for_days(days)]
+            months = days // 30
+            store = AnswerStore(survey.version)
+            qs = survey.questions_for(age)
+            feedback = {}
+            for start in range(0, len(qs), a.page):
+                for q in qs[start:start + a.page]:
+                    store.set(q, rng.choice(q.options) if q.options else str(rng.randrange(1, 10)))
+                time.sleep(a.think)
+                with span("triage"):
+                    pending = [TriageItem(q.id, q.text, str(store.get(q.id)), months) for q in qs if q.id in store.values]
+                    feedback = self.engine.triage(pending, survey.rules)
+
+            with span("chat"):
+                question = rng.choice(QUESTIONS)
+                hit, vec = self.cache.lookup(question, age)
+                if hit is None:
+                    hits = survey.guidance.search(question, age)
+                    ctx = chat_context(question, [], format_hits(hits), "")
+                    prompt = f"[Guidance] {ctx['guidance']}\n[Question] {question}"
+                    answer = "".join(stream_text(registry.chat_model(temperature=0.3), prompt, label="chat"))
+                    self.cache.put(question, answer, age, vec)
+
+            child = {"name": f"Child {i}", "gender": rng.choice(["Male", "Female"]), "months_old": months,
+                     "days_old": days, "age_group": age}
+            responses = store.responses(qs)
+            with span("summary"):
+                flagged = {q_id for q_id, msg in feedback.items() if msg}
+                summary = "".join(stream_summary(registry.chat_model(role="summary"), responses, child,
+                                                 rules=survey.rules, flagged=flagged))
+            payload = {"child_info": child, "ai_summary": summary, "responses": responses}
+            with span("report"):
+                assert self.reports.submit(payload).pdf(120).startswith(b"%PDF")
+            with span("save"):
+                self.writer.submit(payload).result(60)
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ["FAKE_LLM_LATENCY"] = str(args.llm_latency)
+        registry.reset()
+        app_metrics.reset()
+        rss0 = _rss_bytes()
+        harness = Harness(args, workdir)
+        grown = harness.warm_up()
+
+        peak, stop = [_rss_bytes()], threading.Event()
+        def sample():
+            while not stop.wait(0.05):
+                peak[0] = max(peak[0], _rss_bytes())
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.sessions) as pool:
+            list(pool.map(harness.session, range(args.sessions * args.rounds)))
+        wall = time.perf_counter() - t0
+        stop.set()
+        harness.close()
+
+    snap = {l["stage"]: (c, p50, p95, p99) for _, l, c, p50, p95, p99, _ in harness.timings.snapshot()["stages"]}
+    stages = {}
+    for s in STAGES:
+        c, p50, p95, p99 = snap.get(s, (0, 0.0, 0.0, 0.0))
+        stages[s] = {"count": c, "per_sec": c / wall, "p50_ms": p50 * 1000, "p95_ms": p95 * 1000,
+                     "p99_ms": p99 * 1000, "first_use_mb": grown.get(s, 0) / 2**20}
+    counters = {n + "{" + ",".join(f"{k}={v}" for k, v in l.items()) + "}": value
+                for n, l, value in app_metrics.snapshot()["counters"]}
+    return {"scenario": scenario(args), "sessions_per_min": args.sessions * args.rounds * 60 / wall,
+            "wall_s": wall, "peak_rss_mb": peak[0] / 2**20, "rss_growth_mb": (peak[0] - rss0) / 2**20,
+            "stages": stages, "counters": counters,
+            "machine": {"cpus": os.cpu_count(), "python": platform.python_version()}}
+
+def scenario(args) -> str:
+    return (f"sessions={args.sessions} rounds={args.rounds} llm={args.llm_latency} embed={args.embed_latency} "
+            f"think={args.think} page={args.page} report_workers={args.report_workers}")
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Regressions against a stored run of the same scenario: slower p95 (beyond
+    `tolerance` and 2 ms of noise) or lower throughput.
+    """
+    out = []
+    for s, cur in result["stages"].items():
+        old = baseline["stages"].get(s)
+        if old and cur["p95_ms"] > old["p95_ms"] * (1 + tolerance) and cur["p95_ms"] - old["p95_ms"] > 2:
+            out.append(f"{s}: p95 {old['p95_ms']:.1f} -> {cur['p95_ms']:.1f} ms")
+    if result["sessions_per_min"] < baseline["sessions_per_min"] * (1 - tolerance):
+        out.append(f"throughput {baseline['sessions_per_min']:.0f} -> {result['sessions_per_min']:.0f} sessions/min")
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=20, help="concurrent caregivers")
+    ap.add_argument("--rounds", type=int, default=2, help="sessions per caregiver slot")
+    ap.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake model call")
+    ap.add_argument("--embed-latency", type=float, default=0.05, help="seconds per fake embedding call")
+    ap.add_argument("--think", type=float, default=0.0, help="seconds between answered pages")
+    ap.add_argument("--page", type=int, default=8, help="answers per rerun")
+    ap.add_argument("--report-workers", type=int, default=1)
+    ap.add_argument("--survey", default="config/questionnaires/px_previsit_1.0.0.json")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    args = ap.parse_args()
+
+    r = run(args)
+    print(f"{r['scenario']}  ({r['machine']['cpus']} CPUs)")
+    print(f"{'stage':<9} {'count':>6} {'per s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'1st-use MB':>11}")
+    for s, v in r["stages"].items():
+        print(f"{s:<9} {v['count']:>6} {v['per_sec']:>7.1f} {v['p50_ms']:>8.1f} {v['p95_ms']:>8.1f} "
+              f"{v['p99_ms']:>8.1f} {v['first_use_mb']:>11.1f}")
+    print(f"{r['sessions_per_min']:.0f} sessions/min, wall {r['wall_s']:.1f}s, peak RSS {r['peak_rss_mb']:.0f} MB "
+          f"(+{r['rss_growth_mb']:.0f} MB; report workers not included)")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        baselines[r["scenario"]] = r
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+    elif r["scenario"] in baselines:
+        regressions = compare(r, baselines[r["scenario"]], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against the stored baseline")
+    else:
+        print("no stored baseline for this scenario (--save-baseline to keep one)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+
+# Per-session answers keyed by question id. Widget on_change callbacks keep it current,
+# together with answered counts per age group and per (age group, category), so the
+# progress bar, triage and the submit payload never scan st.session_state.
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from modules.survey_schema import QuestionView
+
+STATE_KEY = "answers"
+
+def is_answered(value: Any) -> bool:
+    return value is not None and value != "" and value != []
+
+def widget_key(q: QuestionView, idx: int) -> str:
+    # Same keys as before, so answers typed before an upgrade survive the rerun.
+    return f"ans_{q.id}_{q.category}_{idx}"
+
+class AnswerStore:
+    """
+    Answered questions only: clearing a widget removes its entry. `version` is the
+    questionnaire version the answers belong to.
+    """
+
+    def __init__(self, version: str = ""):
+        self.version = version
+        self.values: Dict[str, Any] = {}
+        self._by_age: Dict[str, int] = {}
+        self._by_age_cat: Dict[Tuple[str, str], int] = {}
+
+    def set(self, q: QuestionView, value: Any):
+        was, now = q.id in self.values, is_answered(value)
+        if now:
+            self.values[q.id] = value
+        else:
+            self.values.pop(q.id, None)
+        if was != now:
+            step = 1 if now else -1
+            self._by_age[q.age] = self._by_age.get(q.age, 0) + step
+            key = (q.age, q.category)
+            self._by_age_cat[key] = self._by_age_cat.get(key, 0) + step
+
+    def get(self, q_id: str, default: Any = None) -> Any:
+        return self.values.get(q_id, default)
+
+    def answered(self, age: str, category: Optional[str] = None) -> int:
+        if category is None:
+            return self._by_age.get(age, 0)
+        return self._by_age_cat.get((age, category), 0)
+
+    def progress(self, age: str, total: int) -> float:
+        return min(self.answered(age) / total, 1.0) if total else 0.0
+
+    def responses(self, questions: Iterable[QuestionView]) -> List[dict]:
+        """
+        Payload rows for `questions`, in their order; unanswered ones carry None.
+        """
+        return [{"id": q.id, "category": q.category, "text": q.text, "answer": self.values.get(q.id)}
+                for q in questions]
+
+    def clear(self):
+        self.values.clear()
+        self._by_age.clear()
+        self._by_age_cat.clear()
+
+def answer_store(state, version: str = "") -> AnswerStore:
+    """
+    The session's store in `state` (st.session_state), created on first use and
+    emptied when the questionnaire version changes.
+    """
+    store = state.get(STATE_KEY)
+    if store is None:
+        store = state[STATE_KEY] = AnswerStore(version)
+    elif store.version != version:
+        store.clear()
+        store.version = version
+    return store
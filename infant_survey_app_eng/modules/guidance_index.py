@@ -0,0 +1,71 @@
+
+# Local retrieval over the questionnaire's own clinical text (criteria, actions,
+# caregiver notes, education topics ...), one document per question, filterable by
+# age group and category. Answers chat questions without any network retrieval.
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from modules.survey_schema import GUIDANCE_FIELDS
+from utils.bm25 import BM25Index
+
+FIELD_LABELS = {
+    "criteria": "Criteria", "actions": "Action", "counseling": "Counseling",
+    "item_guide": "Guide", "positive_parenting": "Positive parenting", "caution": "Caution",
+    "caregiver_note": "Note for caregivers", "pe_item": "Physical exam", "pe_caution": "Exam caution",
+    "judgment": "Judgment", "edu_topic": "Education topic",
+}
+
+@dataclass(frozen=True)
+class GuidanceHit:
+    q_id: str
+    age: str
+    category: str
+    question: str
+    text: str
+    score: float
+    coverage: float  # share of query terms found in this question's guidance
+
+def guidance_text(q, guidance: Dict[str, Optional[str]]) -> str:
+    lines = [q.text]
+    for name in ("criteria", "actions") + GUIDANCE_FIELDS:
+        value = getattr(q, name, None) if name in ("criteria", "actions") else guidance.get(name)
+        if value:
+            lines.append(f"{FIELD_LABELS.get(name, name)}: {value}")
+    return "\n".join(lines)
+
+class GuidanceIndex:
+    """
+    BM25 over each question's text and guidance fields. Built once per questionnaire
+    version (SurveyIndex.guidance); search() can be limited to the session's age
+    group and category.
+    """
+
+    def __init__(self, survey):
+        self.version = survey.version
+        self.bm25 = BM25Index()
+        self.questions = {q.id: q for q in survey.pack.questions}
+        ids, texts = [], []
+        for q in survey.pack.questions:
+            ids.append(q.id)
+            texts.append(guidance_text(q, survey.pack.guidance(q.id)))
+        self.bm25.add(ids, texts)
+        self._by_age: Dict[str, FrozenSet[int]] = {
+            a: self.bm25.numbers_for(q.id for q in qs) for a, qs in survey.by_age.items()}
+        self._by_age_cat: Dict[Tuple[str, str], FrozenSet[int]] = {
+            key: self.bm25.numbers_for(q.id for q in qs) for key, qs in survey.by_age_cat.items()}
+
+    def search(self, query: str, age: Optional[str] = None, category: Optional[str] = None,
+               k: int = 3) -> List[GuidanceHit]:
+        allow = None
+        if age is not None:
+            allow = self._by_age_cat.get((age, category), frozenset()) if category else \
+                    self._by_age.get(age, frozenset())
+        hits = []
+        for q_id, score, coverage in self.bm25.search(query, k, allow=allow):
+            q = self.questions[q_id]
+            hits.append(GuidanceHit(q_id, q.age, q.category, q.text,
+                                    self.bm25.docs[self.bm25.numbers[q_id]][1], score, coverage))
+        return hits
+
+def format_hits(hits: List[GuidanceHit]) -> str:
+    return "\n\n".join(f"[{h.category} / {h.age}]\n{h.text}" for h in hits)
@@ -1,13 +1,145 @@
 
-import json, os
+import json, os, queue, tempfile, threading, uuid
+from concurrent.futures import Future
 from datetime import datetime
+from typing import List, Tuple
+
+from modules.response_stats import get_stats_index
+from utils.metrics import metrics
+
+def stats_db_for(base_dir: str) -> str:
+    # data/responses -> data/response_stats.sqlite
+    return os.path.join(os.path.dirname(os.path.normpath(base_dir)), "response_stats.sqlite")
+
+def new_response_id() -> str:
+    # Time prefix keeps files sortable; the random suffix makes same-second submissions distinct.
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:12]}"
+
+def write_json_atomic(path: str, payload: dict, fsync: bool = True):
+    """
+    Writes to a temp file in the same folder and renames it into place, so readers
+    never see a half-written response.
+    """
+    d = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            # ensure_ascii=False: Save non-ASCII characters correctly
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _prepare(payload: dict, base_dir: str) -> Tuple[str, str]:
+    rid = payload.setdefault("response_id", new_response_id())
+    fname = f"resp_{rid}.json"
+    return fname, os.path.join(base_dir, fname)
+
+def _record_stats(items: List[Tuple[dict, str]], base_dir: str):
+    # Keep the answer statistics current without rescanning the folder.
+    try:
+        get_stats_index(stats_db_for(base_dir), resp_dir=base_dir).record_many(items)
+    except Exception as e:
+        metrics.inc("stage_errors_total", stage="save.stats", error=type(e).__name__)
+        print(f"Failed to update response statistics: {e}")
+
+def _log_failure(fut: Future):
+    # Callers that dropped the future still see the failure, as a counter and a log line.
+    e = fut.exception()
+    if e is not None:
+        metrics.error("save", e)
 
 def save_response(payload: dict, base_dir="data/responses"):
     os.makedirs(base_dir, exist_ok=True)
-    # Include time in filename to prevent duplicates (e.g., resp_20251119_123000.json)
-    fname = f"resp_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    path = os.path.join(base_dir, fname)
-    with open(path, "w", encoding="utf-8") as f:
-        # ensure_ascii=False: Save non-ASCII characters correctly
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    # Unique id per submission (e.g., resp_20251119_123000_3f9c0a1b2c4d.json)
+    fname, path = _prepare(payload, base_dir)
+    write_json_atomic(path, payload)
+    _record_stats([(payload, fname)], base_dir)
     return path
+
+class ResponseWriter:
+    """
+    Background writer shared by concurrent Submits. Queued responses are
+    written in batches: each file atomically, then one directory fsync and one
+    statistics transaction per batch.
+    """
+
+    def __init__(self, base_dir: str = "data/responses", batch_size: int = 64, max_queue: int = 10000):
+        self.base_dir = base_dir
+        self.batch_size = batch_size
+        os.makedirs(base_dir, exist_ok=True)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="response-writer", daemon=True)
+        self._thread.start()
+        self.written = 0
+
+    def submit(self, payload: dict) -> Future:
+        """
+        Queues a response; the returned future resolves to the saved file path, or
+        holds the error (also counted as a "save" error) when it could not be written.
+        """
+        # The id is assigned here, on the caller's thread, so the payload is not
+        # mutated while the caller may still be reading it.
+        _prepare(payload, self.base_dir)
+        fut: Future = Future()
+        fut.add_done_callback(_log_failure)
+        self._queue.put((payload, fut))
+        return fut
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._write(batch)
+                    return
+                batch.append(nxt)
+            self._write(batch)
+
+    def _write(self, batch):
+        with metrics.span("save"):
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        done = []
+        for payload, fut in batch:
+            try:
+                fname, path = _prepare(payload, self.base_dir)
+                write_json_atomic(path, payload)
+                done.append((payload, fname, path, fut))
+            except Exception as e:
+                fut.set_exception(e)
+        if hasattr(os, "O_DIRECTORY"):
+            # Make the renames themselves durable, once for the whole batch.
+            try:
+                dfd = os.open(self.base_dir, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(dfd)
+                finally:
+                    os.close(dfd)
+            except OSError as e:
+                print(f"Failed to fsync {self.base_dir}: {e}")
+        _record_stats([(p, fname) for p, fname, _, _ in done], self.base_dir)
+        self.written += len(done)
+        for _, _, path, fut in done:
+            fut.set_result(path)
+
+    def close(self):
+        """
+        Writes everything still queued, then stops the writer thread.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
@@ -0,0 +1,218 @@
+
+# PDF reports. Rendering runs in a worker pool so Submit does not wait for it, and saved
+# responses can be printed in batches (e.g. every submission of a clinic day).
+import atexit, glob, io, json, os, tempfile, threading, time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from xml.sax.saxutils import escape
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+except ImportError:
+    SimpleDocTemplate = None
+
+from utils.metrics import metrics
+
+REPORT_DIR = "data/reports"
+DEFAULT_FONT = "Helvetica"  # standard font for English; pass a TTF path for other scripts
+DEFAULT_WORKERS = min(2, os.cpu_count() or 1)
+
+def register_font(name: str = DEFAULT_FONT, path: Optional[str] = None) -> str:
+    # ReportLab keeps registered fonts for the life of the process.
+    if path and name not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(name, path))
+    return name
+
+def report_styles(font_name: str = DEFAULT_FONT) -> Dict[str, "ParagraphStyle"]:
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle('KT', parent=styles['Heading1'], fontName=font_name, fontSize=18, alignment=1),
+        "head": ParagraphStyle('KH', parent=styles['Heading3'], fontName=font_name, fontSize=12, textColor='navy', spaceBefore=10),
+        "norm": ParagraphStyle('KN', parent=styles['Normal'], fontName=font_name, fontSize=10),
+    }
+
+def _text(value) -> str:
+    # Paragraph parses markup: answers such as "<1 hour" or "A & B" must be escaped.
+    return escape(str(value)).replace('\n', '<br/>')
+
+def build_story(payload: dict, styles: Dict[str, "ParagraphStyle"]) -> list:
+    story = [Paragraph("Pediatric Pre-visit Survey Results", styles["title"]), Spacer(1, 20)]
+    info = payload['child_info']
+    story.append(Paragraph(f"Name: {_text(info['name'])} ({_text(info['gender'])}) | "
+                           f"Age: {_text(info['months_old'])} months", styles["norm"]))
+    story.append(Spacer(1, 10))
+
+    # AI Summary
+    story.append(Paragraph("<b>[AI Clinical Analysis Report]</b>", styles["head"]))
+    story.append(Paragraph(_text(payload.get('ai_summary') or ''), styles["norm"]))
+    story.append(Spacer(1, 15))
+
+    # Detailed Responses
+    story.append(Paragraph("<b>[Survey Details]</b>", styles["head"]))
+    for r in payload['responses']:
+        story.append(Paragraph(f"Q. {_text(r['text'])}<br/>A. <b>{_text(r['answer'])}</b>", styles["norm"]))
+        story.append(Spacer(1, 5))
+    return story
+
+def render_report(payload: dict, font: str = DEFAULT_FONT, font_path: Optional[str] = None) -> bytes:
+    """
+    Converts result data into a PDF file.
+    """
+    if SimpleDocTemplate is None:
+        raise ImportError("reportlab is required for PDF reports: pip install reportlab")
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    doc.build(build_story(payload, report_styles(register_font(font, font_path))))
+    return buffer.getvalue()
+
+def _warm(font: str, font_path: Optional[str]):
+    # Worker initializer: the font is registered before the first job arrives.
+    if SimpleDocTemplate is not None:
+        register_font(font, font_path)
+
+def _write_atomic(path: str, data: bytes):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp_", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _render_to(payload: dict, out: str, font: str, font_path: Optional[str]) -> bytes:
+    """
+    Worker: like render_report, but the PDF (or the error, as out + ".err") is also left
+    at `out`, for readers in other processes.
+    """
+    try:
+        pdf = render_report(payload, font, font_path)
+    except Exception as e:
+        _write_atomic(out + ".err", f"{type(e).__name__}: {e}".encode("utf-8"))
+        raise
+    _write_atomic(out, pdf)
+    return pdf
+
+def _render_file(src: str, out_dir: str, font: str, font_path: Optional[str]) -> Tuple[str, Optional[str], float]:
+    """
+    Worker: saved response JSON -> PDF in out_dir. Returns (src, pdf path or None, seconds).
+    """
+    t0 = time.perf_counter()
+    with open(src, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    out = os.path.join(out_dir, os.path.splitext(os.path.basename(src))[0] + ".pdf")
+    _write_atomic(out, render_report(payload, font, font_path))
+    return src, out, time.perf_counter() - t0
+
+def responses_for_day(resp_dir: str = "data/responses", day: Union[date, str, None] = None) -> List[str]:
+    """
+    Saved responses of one day (all when `day` is None), oldest first. Uses the
+    time-prefixed file names (see modules.persistence.new_response_id), not the contents.
+    """
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    stamp = day.strftime("%Y%m%d") + "_" if day else ""
+    return sorted(glob.glob(os.path.join(resp_dir, f"resp_{stamp}*.json")))
+
+class ReportHandle:
+    """
+    A report being rendered. Poll done(); pdf() returns the bytes once it is.
+    """
+
+    def __init__(self, future: Future, filename: str):
+        self.future = future
+        self.filename = filename
+        self.submitted = time.time()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        return self.future.exception() if self.future.done() else None
+
+    def pdf(self, timeout: Optional[float] = None) -> bytes:
+        return self.future.result(timeout)
+
+class ReportService:
+    """
+    Renders reports in worker processes (ReportLab is pure Python, so threads would
+    queue on the GIL behind the app).
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, font: str = DEFAULT_FONT, font_path: Optional[str] = None):
+        self.workers = workers
+        self.font, self.font_path = font, font_path
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm, initargs=(font, font_path))
+
+    def submit(self, payload: dict, filename: str = "Result.pdf", out_path: Optional[str] = None) -> ReportHandle:
+        """
+        Queues a render; with `out_path` the worker also writes the PDF there.
+        """
+        t0 = time.perf_counter()
+        if out_path:
+            future = self._pool.submit(_render_to, payload, out_path, self.font, self.font_path)
+        else:
+            future = self._pool.submit(render_report, payload, self.font, self.font_path)
+
+        def timed(f: Future):
+            # Queue wait plus render: how long the user waits for the download button.
+            exc = None if f.cancelled() else f.exception()
+            metrics.record_span("report", time.perf_counter() - t0, type(exc).__name__ if exc else None)
+        future.add_done_callback(timed)
+        return ReportHandle(future, filename)
+
+    def render_batch(self, paths: Iterable[str], out_dir: str = REPORT_DIR,
+                     progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Renders saved response files to out_dir. A file that fails is reported and
+        skipped; the rest of the batch continues.
+        """
+        paths = list(paths)
+        os.makedirs(out_dir, exist_ok=True)
+        report = {"files": len(paths), "rendered": 0, "failed": 0, "errors": {}, "pdfs": []}
+        t0 = time.perf_counter()
+        futures = {self._pool.submit(_render_file, p, out_dir, self.font, self.font_path): p for p in paths}
+        for fut in futures:
+            src = futures[fut]
+            try:
+                _, out, _ = fut.result()
+                report["pdfs"].append(out)
+                report["rendered"] += 1
+            except Exception as e:
+                report["errors"][src] = str(e)
+                report["failed"] += 1
+            if progress is not None:
+                progress(report)
+        report["seconds"] = time.perf_counter() - t0
+        report["pdfs_per_sec"] = report["rendered"] / report["seconds"] if report["seconds"] else 0.0
+        return report
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+_services: Dict[Tuple[str, Optional[str]], ReportService] = {}
+_services_lock = threading.Lock()
+
+def get_report_service(font: str = DEFAULT_FONT, font_path: Optional[str] = None) -> ReportService:
+    with _services_lock:
+        key = (font, font_path)
+        if key not in _services:
+            _services[key] = ReportService(font=font, font_path=font_path)
+            atexit.register(_services[key].close)
+        return _services[key]
+
+if __name__ == "__main__":
+    # Clinic-day printout:  python -m modules.report [YYYY-MM-DD]
+    import sys
+    day = sys.argv[1] if len(sys.argv) > 1 else date.today().isoformat()
+    service = get_report_service()
+    r = service.render_batch(responses_for_day("data/responses", day), os.path.join(REPORT_DIR, day))
+    print(f"{r['rendered']}/{r['files']} reports for {day} in {r['seconds']:.1f}s "
+          f"({r['pdfs_per_sec']:.1f}/s), {r['failed']} failed")
@@ -0,0 +1,168 @@
+
+import glob, json, os, sqlite3, threading
+from typing import Dict, Iterable, Optional, Tuple
+
+# The aggregate index lives next to data/responses, not inside it,
+# so glob("*.json") over the response folder never sees it.
+STATS_DB = "data/response_stats.sqlite"
+
+# Free-text answers are clipped so a long essay cannot bloat the table.
+MAX_ANSWER_LEN = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answer_counts (
+    age_group TEXT NOT NULL,
+    q_id      TEXT NOT NULL,
+    answer    TEXT NOT NULL,
+    n         INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (age_group, q_id, answer)
+);
+CREATE TABLE IF NOT EXISTS question_totals (
+    age_group TEXT NOT NULL,
+    q_id      TEXT NOT NULL,
+    n         INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (age_group, q_id)
+);
+CREATE TABLE IF NOT EXISTS indexed_files (
+    name TEXT PRIMARY KEY
+);
+"""
+
+def _answer_keys(answer):
+    # Multi-select answers count once per chosen option.
+    if isinstance(answer, (list, tuple)):
+        return [str(a)[:MAX_ANSWER_LEN] for a in answer if a not in (None, "")]
+    if answer is None or answer == "":
+        return []
+    return [str(answer)[:MAX_ANSWER_LEN]]
+
+class ResponseStatsIndex:
+    """
+    Per-question answer distributions, updated incrementally on every save.
+    Lookups hit a primary key, so they cost the same at 10 or 100k responses.
+    """
+
+    def __init__(self, db_path: str = STATS_DB):
+        self.db_path = db_path
+        d = os.path.dirname(db_path)
+        if d: os.makedirs(d, exist_ok=True)
+        # One connection shared by all Streamlit session threads, guarded by a lock.
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            # WAL lets several server processes read while one writes.
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _add(self, cur, payload: dict):
+        age_group = (payload.get("child_info") or {}).get("age_group") or ""
+        for r in payload.get("responses") or []:
+            keys = _answer_keys(r.get("answer"))
+            if not keys or not r.get("id"):
+                continue
+            cur.execute(
+                "INSERT INTO question_totals VALUES (?, ?, 1) "
+                "ON CONFLICT(age_group, q_id) DO UPDATE SET n = n + 1",
+                (age_group, r["id"]))
+            cur.executemany(
+                "INSERT INTO answer_counts VALUES (?, ?, ?, 1) "
+                "ON CONFLICT(age_group, q_id, answer) DO UPDATE SET n = n + 1",
+                [(age_group, r["id"], k) for k in keys])
+
+    def record(self, payload: dict, source: Optional[str] = None) -> bool:
+        """
+        Adds one saved response. Returns False if `source` was already indexed.
+        """
+        return self.record_many([(payload, source)]) == 1
+
+    def record_many(self, items: Iterable[Tuple[dict, Optional[str]]]) -> int:
+        """
+        Adds (payload, source) pairs in a single transaction; returns how many were new.
+        """
+        added = 0
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            for payload, source in items:
+                if source is not None:
+                    cur.execute("INSERT OR IGNORE INTO indexed_files VALUES (?)", (source,))
+                    if cur.rowcount == 0:
+                        continue
+                self._add(cur, payload)
+                added += 1
+        return added
+
+    def sync(self, resp_dir: str, batch_size: int = 500) -> int:
+        """
+        Indexes response files that were written without going through save_response.
+        """
+        with self._lock:
+            known = {r[0] for r in self._conn.execute("SELECT name FROM indexed_files")}
+        added, batch = 0, []
+        for path in sorted(glob.glob(os.path.join(resp_dir, "*.json"))):
+            name = os.path.basename(path)
+            if name in known:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    batch.append((json.load(f), name))
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable response {path}: {e}")
+                continue
+            if len(batch) >= batch_size:
+                added += self.record_many(batch)
+                batch = []
+        if batch:
+            added += self.record_many(batch)
+        return added
+
+    def rebuild(self, resp_dir: str) -> int:
+        """
+        Drops all counts and re-derives them from the JSON files on disk.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answer_counts")
+            self._conn.execute("DELETE FROM question_totals")
+            self._conn.execute("DELETE FROM indexed_files")
+        return self.sync(resp_dir)
+
+    def distribution(self, q_id: str, age_group: str) -> Dict[str, int]:
+        """
+        Returns {answer: count} for one question within one age group.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT answer, n FROM answer_counts WHERE age_group = ? AND q_id = ? "
+                "ORDER BY n DESC", (age_group, q_id)).fetchall()
+        return dict(rows)
+
+    def answered(self, q_id: str, age_group: str) -> int:
+        """
+        Number of saved responses that answered this question.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT n FROM question_totals WHERE age_group = ? AND q_id = ?",
+                (age_group, q_id)).fetchone()
+        return row[0] if row else 0
+
+_indexes: Dict[str, ResponseStatsIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_stats_index(db_path: str = STATS_DB, resp_dir: Optional[str] = "data/responses") -> ResponseStatsIndex:
+    """
+    Process-wide index per database file. On first open it catches up with
+    any response files already on disk.
+    """
+    with _indexes_lock:
+        idx = _indexes.get(db_path)
+        if idx is None:
+            idx = ResponseStatsIndex(db_path)
+            if resp_dir and os.path.isdir(resp_dir):
+                idx.sync(resp_dir)
+            _indexes[db_path] = idx
+        return idx
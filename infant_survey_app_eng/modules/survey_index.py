@@ -0,0 +1,146 @@
+
+import os, re, threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from modules.survey_schema import SurveyPackView, QuestionView
+from modules.survey_snapshot import snapshot_path_for
+
+DAYS_PER_MONTH = 30  # the app has always counted age in months as days // 30
+
+@dataclass(frozen=True)
+class AgeGroup:
+    label: str
+    start_day: int
+    end_day: int  # inclusive
+
+    def contains(self, days: int) -> bool:
+        return self.start_day <= days <= self.end_day
+
+def _interval_from_label(label: str) -> Optional[Tuple[int, int]]:
+    # Fallback for packs without age_info: "4~6 months" / "14~35 days".
+    m = re.search(r"(\d+)\s*~\s*(\d+)\s*(days|months)", label.lower())
+    if not m:
+        return None
+    start, end = int(m.group(1)), int(m.group(2))
+    if m.group(3) == "days":
+        return start, end
+    return start * DAYS_PER_MONTH, end * DAYS_PER_MONTH + DAYS_PER_MONTH - 1
+
+def age_interval(q: QuestionView) -> Optional[Tuple[int, int]]:
+    """
+    Day interval of a question's age group, read from age_info once.
+    """
+    info = q.age_info or {}
+    start, end, unit = info.get("start"), info.get("end"), info.get("unit")
+    if start is not None and end is not None:
+        if unit == "days":
+            return int(start), int(end)
+        if unit == "months":
+            return int(start) * DAYS_PER_MONTH, int(end) * DAYS_PER_MONTH + DAYS_PER_MONTH - 1
+    return _interval_from_label(q.age)
+
+class SurveyIndex:
+    """
+    A questionnaire pre-bucketed for rendering: age groups in display order,
+    questions per age group and per (age group, category), and a day -> age
+    group table. Built once per file version; everything a rerun needs is a
+    dict lookup.
+    """
+
+    def __init__(self, pack: SurveyPackView, version: str = ""):
+        self.pack = pack
+        self.version = version
+
+        intervals: Dict[str, Optional[Tuple[int, int]]] = {}
+        self.by_age: Dict[str, List[QuestionView]] = {}
+        self.by_age_cat: Dict[Tuple[str, str], List[QuestionView]] = {}
+        for q in pack.questions:
+            if q.age not in self.by_age:
+                self.by_age[q.age] = []
+                intervals[q.age] = age_interval(q)
+            self.by_age[q.age].append(q)
+            self.by_age_cat.setdefault((q.age, q.category), []).append(q)
+
+        # Same order as the old age_sort_key: by start day, unknown groups last.
+        self.age_labels = sorted(self.by_age, key=lambda a: intervals[a][0] if intervals[a] else 9999)
+        self.age_groups = [AgeGroup(a, *intervals[a]) for a in self.age_labels if intervals[a]]
+        self.categories: Dict[str, List[str]] = {
+            a: sorted({q.category for q in qs}) for a, qs in self.by_age.items()
+        }
+
+        # days -> position in age_labels. Overlapping groups keep the first
+        # match in display order, as find_matching_index did.
+        last_day = max((g.end_day for g in self.age_groups), default=-1)
+        self._day_to_group = [0] * (last_day + 1)
+        for day in range(last_day + 1):
+            for g in self.age_groups:
+                if g.contains(day):
+                    self._day_to_group[day] = self.age_labels.index(g.label)
+                    break
+        self._rules = None
+        self._guidance = None
+        self._lock = threading.Lock()
+
+    def group_for_days(self, days: int) -> int:
+        """
+        Index into age_labels for a child `days` old (0 if no group matches).
+        """
+        if 0 <= days < len(self._day_to_group):
+            return self._day_to_group[days]
+        return 0
+
+    def questions_for(self, age: str, category: Optional[str] = None) -> List[QuestionView]:
+        if category is None:
+            return self.by_age.get(age, [])
+        return self.by_age_cat.get((age, category), [])
+
+    def categories_for(self, age: str) -> List[str]:
+        return self.categories.get(age, [])
+
+    @property
+    def rules(self):
+        """
+        Triage rule table for this questionnaire version, compiled on first use.
+        """
+        with self._lock:
+            if self._rules is None:
+                from agents.prescreen import compile_rules
+                self._rules = compile_rules(self.pack)
+            return self._rules
+
+    @property
+    def guidance(self):
+        """
+        Retrieval index over the questions' guidance texts, built on first use.
+        """
+        with self._lock:
+            if self._guidance is None:
+                from modules.guidance_index import GuidanceIndex
+                self._guidance = GuidanceIndex(self)
+            return self._guidance
+
+_indexes: Dict[str, Tuple[tuple, SurveyIndex]] = {}
+_indexes_lock = threading.Lock()
+
+def build_survey_index(path: str) -> SurveyIndex:
+    # Read-only views: the render path never mutates questions.
+    pack = SurveyPackView.load(path)
+    return SurveyIndex(pack, version=pack.version or "")
+
+def load_survey_index(path: str) -> SurveyIndex:
+    """
+    Process-wide SurveyIndex for `path`. A stat() per call detects edits;
+    the file is only re-read and re-validated when mtime or size changes
+    (of the JSON or of a snapshot built from it).
+    """
+    snap = snapshot_path_for(path)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size, os.stat(snap).st_mtime_ns if os.path.exists(snap) else 0)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        index = build_survey_index(path)
+        _indexes[path] = (stamp, index)
+        return index
@@ -1,6 +1,16 @@
 
-from pydantic import BaseModel, Field
-from typing import List, Optional, Any, Dict
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import List, Optional, Any, Dict, Callable, Tuple
+from dataclasses import dataclass, field
+import hashlib, json
+
+# Long clinician-facing texts that the survey page itself never renders.
+GUIDANCE_FIELDS = ("counseling", "item_guide", "positive_parenting", "caution", "caregiver_note",
+                   "pe_item", "pe_caution", "judgment", "edu_topic")
+
+def content_version(data: bytes) -> str:
+    # A pack's version is the hash of its JSON file; snapshots record the one they were built from.
+    return hashlib.sha1(data).hexdigest()[:12]
 
 # Blueprint for individual questions
 class Question(BaseModel):
@@ -37,3 +47,161 @@ class Question(BaseModel):
 class SurveyPack(BaseModel):
     meta: Optional[Dict[str, Any]] = None
     questions: List[Question]  # List of Questions
+
+    # Snapshots leave the guidance texts on disk until someone asks for them.
+    _guidance_loader: Optional[Callable[[], Dict[str, Dict[str, Optional[str]]]]] = PrivateAttr(default=None)
+    # Content hash of the source JSON, set by load().
+    _version: Optional[str] = PrivateAttr(default=None)
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._version
+
+    def load_guidance(self):
+        """
+        Fills the guidance fields of every question (no-op for packs loaded from JSON).
+        """
+        loader, self._guidance_loader = self._guidance_loader, None
+        if loader is None:
+            return
+        texts = loader()
+        for q in self.questions:
+            for name, value in texts.get(q.id, {}).items():
+                setattr(q, name, value)
+
+    def guidance(self, q_id: str) -> Dict[str, Optional[str]]:
+        """
+        Guidance texts of one question, loading them on first use.
+        """
+        self.load_guidance()
+        for q in self.questions:
+            if q.id == q_id:
+                return {name: getattr(q, name) for name in GUIDANCE_FIELDS}
+        return {}
+
+    @classmethod
+    def parse(cls, data: bytes) -> "SurveyPack":
+        """
+        Validates the bytes of a questionnaire JSON file; the version is their content hash.
+        """
+        pack = cls(**json.loads(data.decode("utf-8")))
+        pack._version = content_version(data)
+        return pack
+
+    @classmethod
+    def load(cls, path: str) -> "SurveyPack":
+        """
+        Reads a questionnaire JSON file, or its compact snapshot when one next to it
+        was built from the file's current content.
+        """
+        from modules.survey_snapshot import fresh_snapshot, read_snapshot
+        if path.endswith(".pxsnap"):
+            return read_snapshot(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        snap = fresh_snapshot(path, data)
+        return read_snapshot(snap) if snap else cls.parse(data)
+
+# --- Read-only fast path for rendering ---
+
+QUESTION_FIELDS = tuple(Question.model_fields)
+
+@dataclass(frozen=True, slots=True)
+class QuestionView:
+    """
+    Immutable, slotted copy of a Question for the render path.
+    Same attribute names as Question, but no validation and no per-instance dict.
+    """
+    id: str
+    age: str
+    category: str
+    qtype: str
+    text: str
+    number: Optional[str] = None
+    options: Optional[List[str]] = None
+    help: Optional[str] = None
+    criteria: Optional[str] = None
+    actions: Optional[str] = None
+    counseling: Optional[str] = None
+    item_guide: Optional[str] = None
+    positive_parenting: Optional[str] = None
+    caution: Optional[str] = None
+    caregiver_note: Optional[str] = None
+    pe_item: Optional[str] = None
+    pe_caution: Optional[str] = None
+    judgment: Optional[str] = None
+    edu_topic: Optional[str] = None
+    answer: Optional[Any] = None
+    age_info: Optional[Dict[str, Any]] = None
+    age_keys: Optional[List[str]] = None
+
+    @classmethod
+    def trusted(cls, data: dict) -> "QuestionView":
+        """
+        Skips __init__ and validation; only for data that was validated when the pack was built.
+        """
+        obj = object.__new__(cls)
+        for name, set_slot in _VIEW_SETTERS:
+            set_slot(obj, data.get(name))
+        return obj
+
+    @classmethod
+    def from_question(cls, q: Question) -> "QuestionView":
+        return cls.trusted(q.__dict__)
+
+    def to_question(self) -> Question:
+        return Question(**{name: getattr(self, name) for name in QUESTION_FIELDS})
+
+# Slot descriptors' __set__ bypasses the frozen __setattr__ guard.
+_VIEW_SETTERS = tuple((name, QuestionView.__dict__[name].__set__) for name in QUESTION_FIELDS)
+
+@dataclass(frozen=True, slots=True)
+class SurveyPackView:
+    """
+    Read-only survey pack made of QuestionViews. Authoring and import still go
+    through SurveyPack, which validates.
+    """
+    meta: Optional[Dict[str, Any]]
+    questions: Tuple[QuestionView, ...]
+    version: Optional[str] = None
+    # Snapshot guidance section, read on first guidance() call.
+    _guidance_loader: Optional[Callable[[], Dict[str, Dict[str, Optional[str]]]]] = None
+    _guidance: Dict[str, Dict[str, Optional[str]]] = field(default_factory=dict)
+
+    @classmethod
+    def from_pack(cls, pack: SurveyPack) -> "SurveyPackView":
+        return cls(pack.meta, tuple(QuestionView.from_question(q) for q in pack.questions), pack.version,
+                   pack._guidance_loader)
+
+    @classmethod
+    def trusted(cls, raw: dict, version: Optional[str] = None) -> "SurveyPackView":
+        """
+        Builds views straight from a prebuilt pack dict without pydantic validation.
+        """
+        return cls(raw.get("meta"), tuple(QuestionView.trusted(q) for q in raw["questions"]), version)
+
+    @classmethod
+    def load(cls, path: str) -> "SurveyPackView":
+        """
+        Like SurveyPack.load, but snapshots are read straight into views.
+        """
+        from modules.survey_snapshot import fresh_snapshot, read_snapshot_view
+        if path.endswith(".pxsnap"):
+            return read_snapshot_view(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        snap = fresh_snapshot(path, data)
+        return read_snapshot_view(snap) if snap else cls.from_pack(SurveyPack.parse(data))
+
+    def guidance(self, q_id: str) -> Dict[str, Optional[str]]:
+        """
+        Guidance texts of one question, loading the snapshot section on first use.
+        """
+        if self._guidance_loader is not None and not self._guidance:
+            self._guidance.update(self._guidance_loader())
+        if q_id in self._guidance:
+            return self._guidance[q_id]
+        for q in self.questions:
+            if q.id == q_id:
+                return {name: getattr(q, name) for name in GUIDANCE_FIELDS}
+        return {}
@@ -0,0 +1,214 @@
+
+# Compact on-disk form of a questionnaire pack.
+#
+#   MAGIC | u32 header length | header (JSON) | strings | core | guidance
+#
+# - Every string is stored once in a table and referenced by index (-1 = None).
+# - Contiguous integer lists such as age_info.days are stored as [start, end],
+#   and each distinct age_info is stored once.
+# - The guidance section (counseling, pe_caution, ...) has its own string table
+#   and is only read when SurveyPack.load_guidance() is called.
+#
+# Build:  python -m modules.survey_snapshot config/questionnaires/px_previsit_1.0.0.json
+import json, os, struct, sys
+from typing import Any, Dict, List, Optional
+
+from modules.survey_schema import GUIDANCE_FIELDS, Question, QuestionView, SurveyPack, SurveyPackView, content_version
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGIC = b"PXSNAP\x01"
+FORMAT_VERSION = 1
+
+# Fields needed to render a question (criteria/actions feed the "Detailed Info" expander).
+# Strings are stored as table indexes, string lists as lists of indexes, and
+# age_info as an index into a table of distinct age_info values.
+CORE_STR_FIELDS = ("id", "age", "category", "qtype", "text", "number", "help", "criteria", "actions")
+CORE_LIST_FIELDS = ("options", "age_keys")
+
+def snapshot_path_for(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + ".pxsnap"
+
+def fresh_snapshot(json_path: str, data: bytes) -> Optional[str]:
+    """
+    The snapshot next to `json_path` if it was built from exactly `data` (the file's
+    current bytes), else None. Compared by content, not mtime: a checkout or copy that
+    leaves an old snapshot newer than the edited JSON must not serve old questions.
+    """
+    snap = snapshot_path_for(json_path)
+    try:
+        with open(snap, "rb") as f:
+            header, _ = _read_header(f)
+    except (OSError, ValueError):
+        return None
+    return snap if header.get("source_version") == content_version(data) else None
+
+def _pack_bytes(obj, codec: str) -> bytes:
+    if codec == "msgpack":
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _unpack_bytes(data: bytes, codec: str):
+    if codec == "msgpack":
+        if msgpack is None:
+            raise ImportError("This snapshot was written with msgpack; install msgpack to read it")
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data.decode("utf-8"))
+
+class _Interner:
+    def __init__(self):
+        self.strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def __call__(self, s):
+        if s is None:
+            return -1
+        if s not in self._ids:
+            self._ids[s] = len(self.strings)
+            self.strings.append(s)
+        return self._ids[s]
+
+def _encode_any(v, intern):
+    # Generic values (age_info): strings -> table index, contiguous int runs -> {"r": [start, end]}.
+    if isinstance(v, str):
+        return {"s": intern(v)}
+    if isinstance(v, list):
+        if len(v) > 2 and all(isinstance(x, int) and not isinstance(x, bool) for x in v) \
+                and v == list(range(v[0], v[0] + len(v))):
+            return {"r": [v[0], v[-1]]}
+        return [_encode_any(x, intern) for x in v]
+    if isinstance(v, dict):
+        return {"d": {k: _encode_any(x, intern) for k, x in v.items()}}
+    return v
+
+def _decode_any(v, strings):
+    if isinstance(v, list):
+        return [_decode_any(x, strings) for x in v]
+    if isinstance(v, dict):
+        if "s" in v:
+            return strings[v["s"]]
+        if "r" in v:
+            return list(range(v["r"][0], v["r"][1] + 1))
+        return {k: _decode_any(x, strings) for k, x in v["d"].items()}
+    return v
+
+def write_snapshot(pack: SurveyPack, path: str, source_version: str = "", codec: str = None) -> str:
+    codec = codec or ("msgpack" if msgpack is not None else "json")
+    core_strings, guide_strings = _Interner(), _Interner()
+    age_infos, age_info_ids, core = [], {}, []
+    for q in pack.questions:
+        row = [core_strings(getattr(q, f)) for f in CORE_STR_FIELDS]
+        for f in CORE_LIST_FIELDS:
+            v = getattr(q, f)
+            row.append(None if v is None else [core_strings(x) for x in v])
+        key = json.dumps(q.age_info, sort_keys=True)
+        if key not in age_info_ids:
+            age_info_ids[key] = len(age_infos)
+            age_infos.append(_encode_any(q.age_info, core_strings))
+        row.append(age_info_ids[key])
+        core.append(row)
+    guidance = [[guide_strings(getattr(q, f)) for f in GUIDANCE_FIELDS] for q in pack.questions]
+
+    sections = [
+        ("strings", _pack_bytes(core_strings.strings, codec)),
+        ("core", _pack_bytes([age_infos, core], codec)),
+        ("guidance", _pack_bytes([guide_strings.strings, guidance], codec)),
+    ]
+    offsets, pos = {}, 0
+    for name, data in sections:
+        offsets[name] = [pos, len(data)]
+        pos += len(data)
+    header = json.dumps({
+        "format": FORMAT_VERSION, "codec": codec, "meta": pack.meta,
+        "source_version": source_version,
+        "core_str_fields": CORE_STR_FIELDS, "core_list_fields": CORE_LIST_FIELDS,
+        "guidance_fields": GUIDANCE_FIELDS, "sections": offsets,
+    }, ensure_ascii=False).encode("utf-8")
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for _, data in sections:
+            f.write(data)
+    os.replace(tmp, path)
+    return path
+
+def _read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a questionnaire snapshot")
+    (n,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(n).decode("utf-8"))
+    if header.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format: {header.get('format')}")
+    return header, len(MAGIC) + 4 + n
+
+def _read_section(f, base: int, header: dict, name: str) -> Any:
+    off, size = header["sections"][name]
+    f.seek(base + off)
+    return _unpack_bytes(f.read(size), header["codec"])
+
+def _read_core(path: str):
+    """
+    Decodes the render fields into one dict per question, plus a loader for the guidance section.
+    """
+    with open(path, "rb") as f:
+        header, base = _read_header(f)
+        strings = _read_section(f, base, header, "strings")
+        age_infos, core = _read_section(f, base, header, "core")
+
+    str_fields, list_fields = header["core_str_fields"], header["core_list_fields"]
+    n_str = len(str_fields)
+    strings.append(None)  # index -1 -> None
+    # Questions of one age group share a single (read-only) age_info dict.
+    age_infos = [_decode_any(a, strings) for a in age_infos]
+    rows = []
+    for row in core:
+        fields = {f: strings[i] for f, i in zip(str_fields, row)}
+        for f, v in zip(list_fields, row[n_str:]):
+            fields[f] = None if v is None else [strings[i] for i in v]
+        fields["age_info"] = age_infos[row[-1]]
+        rows.append(fields)
+    ids = [r["id"] for r in rows]
+
+    def load_guidance():
+        with open(path, "rb") as f:
+            h, b = _read_header(f)
+            g_strings, g_rows = _read_section(f, b, h, "guidance")
+        names = h["guidance_fields"]
+        return {q_id: {n: (g_strings[i] if i >= 0 else None) for n, i in zip(names, row)}
+                for q_id, row in zip(ids, g_rows)}
+
+    return header, rows, load_guidance
+
+def read_snapshot(path: str) -> SurveyPack:
+    """
+    Loads the render fields; guidance texts stay on disk until pack.load_guidance().
+    """
+    header, rows, load_guidance = _read_core(path)
+    # The snapshot was built from a validated pack, so validation is skipped here.
+    pack = SurveyPack.model_construct(meta=header.get("meta"), questions=[Question.model_construct(**r) for r in rows])
+    pack._version = header.get("source_version") or None
+    pack._guidance_loader = load_guidance
+    return pack
+
+def read_snapshot_view(path: str) -> SurveyPackView:
+    """
+    Same as read_snapshot, but straight into the slotted read-only views.
+    """
+    header, rows, load_guidance = _read_core(path)
+    return SurveyPackView(header.get("meta"), tuple(QuestionView.trusted(r) for r in rows),
+                          header.get("source_version") or None, load_guidance)
+
+def build_snapshot(json_path: str, out_path: str = None) -> str:
+    with open(json_path, "rb") as f:
+        data = f.read()
+    return write_snapshot(SurveyPack.parse(data), out_path or snapshot_path_for(json_path),
+                          source_version=content_version(data))
+
+if __name__ == "__main__":
+    for p in sys.argv[1:]:
+        out = build_snapshot(p)
+        print(f"{p} ({os.path.getsize(p)} bytes) -> {out} ({os.path.getsize(out)} bytes)")
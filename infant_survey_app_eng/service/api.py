@@ -0,0 +1,154 @@
+
+# service.core over HTTP. Each server process holds its own SurveyService (clients,
+# triage pool, PDF workers); more processes spread the stages across cores, and any of
+# them can serve a report started by another (the PDF is written to data/reports).
+# Run from infant_survey_app_eng/:  python -m service.api [--port 8601] [--workers 2]
+# then point the page at it:        SURVEY_API_URL=http://127.0.0.1:8601 streamlit run app.py
+import argparse, json, os
+from contextlib import asynccontextmanager
+
+try:
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+    from starlette.routing import Route
+except ImportError:
+    Starlette = None
+
+from service.core import SurveyService
+from utils.metrics import Trace, metrics, server_timing
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8601
+DATA_DIR_ENV = "SURVEY_DATA_DIR"   # responses and reports under one folder instead of data/
+# Streams are JSON lines: {"text": chunk} as they come, then {"spans": [...]} of the request.
+NDJSON = "application/x-ndjson"
+
+class BadRequest(ValueError):
+    pass
+
+async def _body(request: "Request", *required: str) -> dict:
+    try:
+        body = await request.json()
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest("body is not JSON")
+    if not isinstance(body, dict):
+        raise BadRequest("body must be a JSON object")
+    missing = [k for k in required if k not in body]
+    if missing:
+        raise BadRequest("missing: " + ", ".join(missing))
+    return body
+
+def _timed(body: dict, trace: Trace) -> "JSONResponse":
+    # The service's spans for this request travel back in a Server-Timing header.
+    return JSONResponse(body, headers={"Server-Timing": server_timing(trace.spans)} if trace.spans else None)
+
+async def _lines(chunks, trace: Trace):
+    async for chunk in chunks:
+        yield json.dumps({"text": chunk}, ensure_ascii=False) + "\n"
+    yield json.dumps({"spans": trace.spans}) + "\n"
+
+def create_app(service: SurveyService = None) -> "Starlette":
+    """
+    The ASGI app. Builds (and starts) a SurveyService for this process unless one is given.
+    """
+    if Starlette is None:
+        raise ImportError("starlette is required for the survey API: pip install starlette uvicorn")
+    data_dir = os.environ.get(DATA_DIR_ENV)
+    if service is not None:
+        svc = service
+    elif data_dir:
+        svc = SurveyService(resp_dir=os.path.join(data_dir, "responses"), report_dir=os.path.join(data_dir, "reports"))
+    else:
+        svc = SurveyService()
+
+    async def health(request):
+        return JSONResponse({"status": "ok", "pid": os.getpid(), "warming": svc.warming()})
+
+    async def survey(request):
+        # Clients send the version they hold; an unchanged questionnaire costs a 304.
+        wire = await svc.survey()
+        etag = f'"{wire["version"]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(wire, headers={"ETag": etag})
+
+    async def survey_for_age(request):
+        q = request.query_params
+        days = int(q["days"]) if q.get("days", "").isdigit() else None
+        return JSONResponse(await svc.survey_for_age(days=days, age=q.get("age")))
+
+    async def stats(request):
+        body, trace = await _body(request, "age", "questions"), Trace()
+        return _timed(await svc.stats(body["age"], [tuple(q) for q in body["questions"]], trace=trace), trace)
+
+    async def triage(request):
+        body, trace = await _body(request, "answers"), Trace()
+        return _timed(await svc.triage(body["answers"], int(body.get("months_old", 0)), trace=trace), trace)
+
+    async def summary(request):
+        body, trace = await _body(request, "responses", "child_info"), Trace()
+        chunks = svc.summarize(body["responses"], body["child_info"], body.get("flagged", ()), trace=trace)
+        return StreamingResponse(_lines(chunks, trace), media_type=NDJSON)
+
+    async def chat(request):
+        body, trace = await _body(request, "question"), Trace()
+        chunks = svc.chat(body["question"], body.get("history", []), body.get("scope", ""), trace=trace)
+        return StreamingResponse(_lines(chunks, trace), media_type=NDJSON)
+
+    async def submit(request):
+        body, trace = await _body(request, "child_info", "responses"), Trace()
+        return _timed(await svc.submit(body["child_info"], body["responses"], body.get("ai_summary", ""),
+                                       body.get("attachment"), trace=trace), trace)
+
+    async def report(request):
+        status, data = await svc.report(request.path_params["report_id"])
+        if status == "ready":
+            return Response(data, media_type="application/pdf")
+        if status == "pending":
+            return JSONResponse({"status": status}, status_code=202)
+        if status == "failed":
+            return JSONResponse({"status": status, "error": data}, status_code=500)
+        return JSONResponse({"status": status}, status_code=404)
+
+    async def prometheus(request):
+        return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+    async def bad_request(request, exc):
+        return JSONResponse({"error": str(exc)}, status_code=400)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        svc.start()
+        yield
+        svc.close()
+
+    return Starlette(routes=[
+        Route("/health", health),
+        Route("/survey", survey),
+        Route("/survey/age", survey_for_age),
+        Route("/stats", stats, methods=["POST"]),
+        Route("/triage", triage, methods=["POST"]),
+        Route("/summary", summary, methods=["POST"]),
+        Route("/chat", chat, methods=["POST"]),
+        Route("/submit", submit, methods=["POST"]),
+        Route("/report/{report_id}", report),
+        Route("/metrics", prometheus),
+    ], exception_handlers={BadRequest: bad_request}, lifespan=lifespan)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default=DEFAULT_HOST)
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--workers", type=int, default=1, help="server processes (one per core for CPU-bound stages)")
+    ap.add_argument("--data-dir", help="where responses and reports go (default: data/)")
+    args = ap.parse_args()
+    if args.data_dir:
+        os.environ[DATA_DIR_ENV] = args.data_dir   # inherited by the worker processes
+    import uvicorn
+    # Import string + factory: each worker process builds its own app and service.
+    uvicorn.run("service.api:create_app", factory=True, host=args.host, port=args.port,
+                workers=args.workers, log_level="warning")
+
+if __name__ == "__main__":
+    main()
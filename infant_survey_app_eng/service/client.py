@@ -0,0 +1,198 @@
+
+# What the Streamlit page calls: the operations of service.core, blocking and free of
+# Streamlit. With SURVEY_API_URL set they go to a service.api server over HTTP;
+# otherwise a SurveyService runs in this process on a background event loop.
+#   SURVEY_API_URL=http://127.0.0.1:8601
+import asyncio, json, os, threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from modules.survey_index import SurveyIndex
+from modules.survey_schema import QuestionView, SurveyPackView
+from utils.metrics import metrics, parse_server_timing
+
+API_URL_ENV = "SURVEY_API_URL"
+HTTP_TIMEOUT = 120.0   # a summary streams for tens of seconds
+
+async def _anext(agen):
+    return await agen.__anext__()
+
+class SurveyClient(ABC):
+    """
+    Timed calls with the page's fallbacks: no statistics or warnings when the service
+    cannot answer, and an error line in place of a summary or chat answer. The service's
+    own spans for a call join the calling thread's trace (the rerun's profile).
+    """
+
+    @abstractmethod
+    def survey(self) -> SurveyIndex:
+        ...
+
+    @abstractmethod
+    def _call(self, op: str, **kw):
+        ...
+
+    @abstractmethod
+    def _stream(self, op: str, **kw) -> Iterator[str]:
+        ...
+
+    @abstractmethod
+    def _report(self, report_id: str) -> Tuple[str, Optional[object]]:
+        ...
+
+    def _unary(self, op: str, fallback, **kw):
+        try:
+            with metrics.span(f"client.{op}"):
+                return self._call(op, **kw)
+        except Exception as e:
+            metrics.error(f"client.{op}", e)
+            return fallback
+
+    def _streamed(self, op: str, failed: str, **kw) -> Iterator[str]:
+        try:
+            with metrics.span(f"client.{op}"):
+                yield from self._stream(op, **kw)
+        except Exception as e:
+            metrics.error(f"client.{op}", e)
+            yield f"{failed}: {str(e)}"
+
+    def stats(self, age: str, questions: Iterable[QuestionView]) -> Dict[str, Optional[str]]:
+        return self._unary("stats", {}, age=age, questions=[(q.id, q.qtype) for q in questions])
+
+    def triage(self, answers: Dict[str, object], months_old: int) -> Dict[str, Optional[str]]:
+        if not answers:
+            return {}
+        return self._unary("triage", {}, answers={k: str(v) for k, v in answers.items()}, months_old=months_old)
+
+    def summarize(self, responses: List[dict], child_info: dict, flagged: Iterable[str] = ()) -> Iterator[str]:
+        return self._streamed("summarize", "Error during AI analysis", responses=responses,
+                              child_info=child_info, flagged=sorted(flagged))
+
+    def chat(self, question: str, history: List[dict] = (), scope: str = "") -> Iterator[str]:
+        return self._streamed("chat", "Error during AI answer", question=question, history=list(history),
+                              scope=scope or "")
+
+    def submit(self, child_info: dict, responses: List[dict], ai_summary: str,
+               attachment: Optional[str] = None) -> dict:
+        """
+        {"response_id", "report_id", "report_error"}. Raises if the response was not taken.
+        """
+        with metrics.span("client.submit"):
+            return self._call("submit", child_info=child_info, responses=responses, ai_summary=ai_summary,
+                              attachment=attachment)
+
+    def report(self, report_id: str) -> Tuple[str, Optional[object]]:
+        """
+        ("ready", pdf bytes), ("pending", None), ("failed", message) or ("unknown", None).
+        """
+        try:
+            return self._report(report_id)
+        except Exception as e:
+            metrics.error("client.report", e)
+            return "failed", str(e)
+
+class LocalClient(SurveyClient):
+    """
+    A SurveyService in this process. Its coroutines run on one event loop thread;
+    callers block on their results.
+    """
+
+    def __init__(self, service=None):
+        if service is None:
+            from service.core import SurveyService
+            service = SurveyService().start()
+        self.service = service
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="survey-service-loop", daemon=True).start()
+
+    def _await(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def survey(self) -> SurveyIndex:
+        # The service's own index: shared process-wide, nothing to copy.
+        return self.service.index()
+
+    def _call(self, op: str, **kw):
+        return self._await(getattr(self.service, op)(trace=metrics.current_trace(), **kw))
+
+    def _stream(self, op: str, **kw) -> Iterator[str]:
+        agen = getattr(self.service, op)(trace=metrics.current_trace(), **kw)
+        try:
+            while True:
+                try:
+                    yield self._await(_anext(agen))
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._await(agen.aclose())
+
+    def _report(self, report_id: str) -> Tuple[str, Optional[object]]:
+        return self._await(self.service.report(report_id))
+
+class HttpClient(SurveyClient):
+    """
+    A service.api server. The questionnaire is fetched once per version (the server
+    answers 304 while it is unchanged) and indexed here for rendering.
+    """
+    ROUTES = {"stats": "/stats", "triage": "/triage", "summarize": "/summary", "chat": "/chat", "submit": "/submit"}
+
+    def __init__(self, base_url: str, timeout: float = HTTP_TIMEOUT):
+        import httpx
+        self.base_url = base_url
+        self.http = httpx.Client(base_url=base_url, timeout=timeout)
+        self._survey: Tuple[str, Optional[SurveyIndex]] = ("", None)
+
+    def survey(self) -> SurveyIndex:
+        version, index = self._survey
+        r = self.http.get("/survey", headers={"If-None-Match": f'"{version}"'} if index is not None else {})
+        if r.status_code == 304:
+            return index
+        r.raise_for_status()
+        raw = r.json()
+        # Validated by the service when it loaded the file.
+        index = SurveyIndex(SurveyPackView.trusted(raw, raw["version"]), version=raw["version"])
+        self._survey = (raw["version"], index)
+        return index
+
+    def _call(self, op: str, **kw):
+        r = self.http.post(self.ROUTES[op], json=kw)
+        r.raise_for_status()
+        metrics.add_spans(parse_server_timing(r.headers.get("server-timing", "")))
+        return r.json()
+
+    def _stream(self, op: str, **kw) -> Iterator[str]:
+        with self.http.stream("POST", self.ROUTES[op], json=kw) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                msg = json.loads(line)
+                if "spans" in msg:
+                    metrics.add_spans(msg["spans"])
+                else:
+                    yield msg["text"]
+
+    def _report(self, report_id: str) -> Tuple[str, Optional[object]]:
+        r = self.http.get(f"/report/{report_id}")
+        if r.status_code == 200:
+            return "ready", r.content
+        if r.status_code in (202, 404):
+            return r.json()["status"], None
+        if r.status_code == 500:
+            return "failed", r.json().get("error")
+        # Anything else (a redirect from a proxy, a 4xx/5xx without our body) is a failure
+        # the page can show, not an exception or a bare None.
+        return "failed", f"HTTP {r.status_code}"
+
+_clients: Dict[str, SurveyClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(url: Optional[str] = None) -> SurveyClient:
+    """
+    The process-wide client: HTTP when `url` (default: SURVEY_API_URL) is set, else in process.
+    """
+    url = os.environ.get(API_URL_ENV, "") if url is None else url
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = HttpClient(url) if url else LocalClient()
+        return _clients[url]
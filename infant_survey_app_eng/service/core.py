@@ -0,0 +1,436 @@
+
+# The survey's business logic behind async calls, with no Streamlit in it: load the
+# questionnaire (or one age group of it), answer statistics, triage, the clinical
+# summary and the sidebar chat (both streamed), submit and the PDF report. Blocking
+# work runs on the service's thread pool, PDFs in the report worker processes; the
+# event loop only hands out results. Served over HTTP by service.api, or called in
+# process through service.client.
+import asyncio, json, os, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from agents import providers, registry
+from agents.budget import chat_context
+from agents.streaming import stream_text
+from agents.summary import PROMPT_VERSION, stream_summary
+from agents.triage import TriageEngine, TriageItem
+from modules.guidance_index import format_hits
+from modules.persistence import ResponseWriter, stats_db_for
+from modules.report import DEFAULT_WORKERS, REPORT_DIR, ReportHandle, ReportService
+from modules.response_stats import get_stats_index
+from modules.survey_index import SurveyIndex, load_survey_index
+from modules.survey_schema import GUIDANCE_FIELDS, QUESTION_FIELDS, QuestionView
+from utils.metrics import Trace, configure as configure_metrics, metrics
+from utils.semantic_cache import shareable
+
+SURVEY_PATH = "config/questionnaires/px_previsit_1.0.0.json"
+RESP_DIR = "data/responses"
+# Summaries containing these (even after partial output) are left for the batch job.
+SUMMARY_FAILED = ("API Key is not set", "Error during AI analysis")
+SERVICE_THREADS = 32        # blocking calls in flight: streams hold one each until they end
+MAX_REPORT_HANDLES = 1000   # this process's report futures, oldest dropped first
+SAVE_TIMEOUT = 10.0         # seconds Submit waits for the response to be on disk
+REPORT_STALE_AFTER = 60.0   # seconds after which a saved response without a PDF is rendered again
+REPORT_ID = re.compile(r"^[0-9]{8}_[0-9]{6}_[0-9a-f]{12}$")   # modules.persistence.new_response_id
+# The survey page never renders these; they stay on the service.
+WIRE_FIELDS = tuple(f for f in QUESTION_FIELDS if f not in GUIDANCE_FIELDS and f != "answer")
+
+_END = object()
+
+def _traced(trace: Optional[Trace], fn: Callable, *args):
+    # On a pool thread: the spans of this call go to the request's trace, if it has one.
+    with metrics.use_trace(trace):
+        return fn(*args)
+
+def question_json(q: QuestionView) -> dict:
+    return {f: getattr(q, f) for f in WIRE_FIELDS if getattr(q, f) is not None}
+
+class SurveyService:
+    """
+    One per process. Shared pieces (survey index, statistics, triage engine) are opened
+    on first use, as the Streamlit page used to hold them; the response writer and the
+    PDF worker processes belong to the service and are stopped by close().
+    """
+
+    def __init__(self, survey_path: str = SURVEY_PATH, resp_dir: str = RESP_DIR, report_dir: str = REPORT_DIR,
+                 threads: int = SERVICE_THREADS, report_workers: int = DEFAULT_WORKERS):
+        self.survey_path = survey_path
+        self.resp_dir = resp_dir
+        self.report_dir = report_dir
+        self.report_workers = report_workers
+        self._threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="survey-service")
+        self._triage: Optional[TriageEngine] = None
+        self._writer: Optional[ResponseWriter] = None
+        self._report_service: Optional[ReportService] = None
+        self._closed = False
+        self._by_id: Tuple[str, Dict[str, QuestionView]] = ("", {})
+        self._wire: Tuple[str, dict] = ("", {})
+        self._reports: Dict[str, ReportHandle] = {}
+        self._warm_up: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Metrics sinks and the shared model clients, built before the first request.
+        """
+        configure_metrics()
+        self._warm_up = registry.warm_up()
+        return self
+
+    def warming(self) -> bool:
+        # Still building clients in the background: requests work, but the first ones are slow.
+        return self._warm_up is not None and self._warm_up.is_alive()
+
+    def close(self):
+        """
+        Stops taking work, writes the queued responses and waits for the PDF workers to
+        exit: forked workers that outlived the server would keep its port and stdout open.
+        """
+        # Calls still running (a model stream) finish on their own; nothing new starts.
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            writer, reports = self._writer, self._report_service
+            self._writer = self._report_service = None
+            self._closed = True
+        if writer is not None:
+            writer.close()
+        if reports is not None:
+            reports.close()
+
+    def writer(self) -> ResponseWriter:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SurveyService is closed")
+            if self._writer is None:
+                self._writer = ResponseWriter(self.resp_dir)
+            return self._writer
+
+    def reports(self) -> ReportService:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SurveyService is closed")
+            if self._report_service is None:
+                os.makedirs(self.report_dir, exist_ok=True)
+                self._report_service = ReportService(workers=self.report_workers)
+            return self._report_service
+
+    async def _run(self, fn: Callable, *args, trace: Optional[Trace] = None):
+        return await asyncio.get_running_loop().run_in_executor(self._threads, _traced, trace, fn, *args)
+
+    async def _iterate(self, make: Callable[[], Iterator[str]], trace: Optional[Trace] = None) -> AsyncIterator[str]:
+        """
+        Runs a blocking generator on the thread pool and yields its chunks as they
+        come. Closing the iterator (client gone) stops the generator at the next chunk.
+        The generator's spans are in `trace` by the time the iterator ends.
+        """
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        closed = threading.Event()
+
+        def pump():
+            with metrics.use_trace(trace):
+                gen = make()
+                try:
+                    for chunk in gen:
+                        if closed.is_set():
+                            break
+                        loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+                except Exception as e:
+                    loop.call_soon_threadsafe(chunks.put_nowait, e)
+                finally:
+                    gen.close()
+            loop.call_soon_threadsafe(chunks.put_nowait, _END)
+
+        loop.run_in_executor(self._threads, pump)
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is _END:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            closed.set()
+
+    # --- questionnaire ---
+
+    def index(self) -> SurveyIndex:
+        # A stat() per call; re-read only when the file changes.
+        return load_survey_index(self.survey_path)
+
+    def _questions_by_id(self, survey: SurveyIndex) -> Dict[str, QuestionView]:
+        version, by_id = self._by_id
+        if version != survey.version or not by_id:
+            by_id = {q.id: q for q in survey.pack.questions}
+            self._by_id = (survey.version, by_id)
+        return by_id
+
+    async def survey(self) -> dict:
+        """
+        The questionnaire for rendering: {"version", "meta", "questions"}, without the
+        clinician guidance texts. Built once per file version.
+        """
+        survey = await self._run(self.index)
+        version, wire = self._wire
+        if version != survey.version or not wire:
+            wire = {"version": survey.version, "meta": survey.pack.meta,
+                    "questions": [question_json(q) for q in survey.pack.questions]}
+            self._wire = (survey.version, wire)
+        return wire
+
+    async def survey_for_age(self, days: Optional[int] = None, age: Optional[str] = None) -> dict:
+        """
+        One age group, picked by label or by the child's age in days:
+        {"version", "age", "age_labels", "categories": {category: [question]}}.
+        """
+        survey = await self._run(self.index)
+        if age is None:
+            age = survey.age_labels[survey.group_for_days(days or 0)] if survey.age_labels else ""
+        return {"version": survey.version, "age": age, "age_labels": survey.age_labels,
+                "categories": {c: [question_json(q) for q in survey.questions_for(age, c)]
+                               for c in survey.categories_for(age)}}
+
+    # --- answers ---
+
+    def _stats(self, age: str, questions: Iterable[Tuple[str, str]]) -> Dict[str, Optional[str]]:
+        try:
+            with metrics.span("stats"):
+                stats = get_stats_index(stats_db_for(self.resp_dir), resp_dir=self.resp_dir)
+                out = {}
+                for q_id, q_type in questions:
+                    total = stats.answered(q_id, age)
+                    if not total:
+                        out[q_id] = None
+                    # Free-text and number answers have no meaningful per-option breakdown.
+                    elif q_type not in ("single", "multi", "scale"):
+                        out[q_id] = f"{total} other guardians have answered this question."
+                    else:
+                        dist = stats.distribution(q_id, age)
+                        parts = [f"{ans} {cnt * 100 // total}%" for ans, cnt in dist.items()]
+                        out[q_id] = f"{total} other guardians answered: " + ", ".join(parts)
+                return out
+        except Exception as e:
+            metrics.error("stats", e)
+            return {}
+
+    async def stats(self, age: str, questions: Iterable[Tuple[str, str]],
+                    trace: Optional[Trace] = None) -> Dict[str, Optional[str]]:
+        """
+        How other guardians of the same age group answered, per (question id, qtype).
+        """
+        return await self._run(self._stats, age, list(questions), trace=trace)
+
+    def triage_engine(self) -> TriageEngine:
+        with self._lock:
+            if self._triage is None:
+                self._triage = TriageEngine(lambda: registry.chat_model(role="triage"))
+            return self._triage
+
+    def _triage_answers(self, answers: Dict[str, str], months_old: int) -> Dict[str, Optional[str]]:
+        if not answers or not providers.ready("triage"):
+            return {}
+        try:
+            with metrics.span("triage"):
+                survey = self.index()
+                by_id = self._questions_by_id(survey)
+                items = [TriageItem(q_id, by_id[q_id].text, str(a), months_old)
+                         for q_id, a in answers.items() if q_id in by_id]
+                return self.triage_engine().triage(items, survey.rules)
+        except Exception as e:
+            metrics.error("triage", e)
+            return {}
+
+    async def triage(self, answers: Dict[str, str], months_old: int,
+                     trace: Optional[Trace] = None) -> Dict[str, Optional[str]]:
+        """
+        Rules decide clear-cut answers; AI analyzes the rest at once.
+        Returns {q_id: 'Immediate Warning/Advice' or None}.
+        """
+        return await self._run(self._triage_answers, answers, months_old, trace=trace)
+
+    # --- summary and chat ---
+
+    def _summary(self, responses: List[dict], child_info: dict, flagged: Iterable[str]) -> Iterator[str]:
+        if not providers.ready("summary"):
+            yield "API Key is not set in the code, or the local model is not installed."
+            return
+        try:
+            with metrics.span("summary"):
+                yield from stream_summary(registry.chat_model(role="summary"), responses, child_info,
+                                          rules=self.index().rules, flagged=set(flagged))
+        except Exception as e:
+            metrics.error("summary", e)
+            yield f"Error during AI analysis: {str(e)}"
+
+    def summarize(self, responses: List[dict], child_info: dict, flagged: Iterable[str] = (),
+                  trace: Optional[Trace] = None) -> AsyncIterator[str]:
+        """
+        Streams the 'Clinical Summary Report'. Long surveys are cut to the prompt
+        budget, flagged answers first.
+        """
+        return self._iterate(lambda: self._summary(responses, child_info, flagged), trace)
+
+    def _chat(self, question: str, history: List[dict], scope: str) -> Iterator[str]:
+        # The same question asked before (in any wording) for this age group is answered from the cache.
+        # Once the conversation holds the caregiver's own turns or summary the answer depends
+        # on it, so the cache is skipped altogether.
+        cached, q_vec = None, None
+        if shareable(history):
+            try:
+                with metrics.span("chat.cache"):
+                    cached, q_vec = registry.semantic_cache().lookup(question, scope)
+            except Exception as e: metrics.error("chat.cache", e)
+        if cached:
+            yield cached.answer
+            return
+
+        # The questionnaire's own guidance for the selected age group, searched locally.
+        hits = []
+        try:
+            with metrics.span("chat.guidance"):
+                hits = self.index().guidance.search(question, scope or None)
+        except Exception as e: metrics.error("chat.guidance", e)
+
+        # Document retrieval only when the guidance does not cover the question; it runs
+        # in the background while the rest of the prompt is put together.
+        rag_future = None
+        if not (hits and hits[0].coverage >= 1.0):
+            try:
+                rag = registry.rag_chain()
+                if rag: rag_future = rag.submit({"question": question})
+            except Exception as e: metrics.error("chat.rag", e)
+
+        llm_agent = registry.chat_model(temperature=0.3)
+
+        rag_answer = ""
+        if rag_future:
+            with metrics.span("chat.rag_wait"):
+                try: rag_answer = rag_future.result().get("answer", "")
+                except Exception as e: metrics.error("chat.rag", e)
+
+        # History, guidance and documents share one token budget; repeats are cut.
+        ctx = chat_context(question, history, format_hits(hits), rag_answer)
+        prompt_template = f"""
+        You are a kind and professional pediatric counseling AI.
+        Answer in English.
+        [History] {ctx["history"]}
+        [Questionnaire Guidance] {ctx["guidance"] or "None"}
+        [Medical Info] {ctx["documents"]}
+        [Current Question] {question}
+        """
+
+        parts = []
+        try:
+            with metrics.span("chat.answer"):
+                for chunk in stream_text(llm_agent, prompt_template, label="chat"):
+                    parts.append(chunk)
+                    yield chunk
+            if q_vec is not None:
+                registry.semantic_cache().put(question, "".join(parts), scope, q_vec)
+        except Exception as e:
+            metrics.error("chat.answer", e)
+            yield f"Error during AI answer: {str(e)}"
+
+    def chat(self, question: str, history: List[dict] = (), scope: str = "",
+             trace: Optional[Trace] = None) -> AsyncIterator[str]:
+        """
+        Streams the sidebar chatbot's answer. `history` is the recent messages as
+        {"role", "content"}; `scope` the selected age group.
+        """
+        return self._iterate(lambda: self._chat(question, list(history), scope or ""), trace)
+
+    # --- submit and report ---
+
+    def report_path(self, report_id: str) -> str:
+        return os.path.join(self.report_dir, f"resp_{report_id}.pdf")
+
+    def _submit(self, child_info: dict, responses: List[dict], ai_summary: str, attachment: Optional[str]) -> dict:
+        payload = {
+            "submitted_at": datetime.now().isoformat(),
+            "child_info": child_info,
+            "attachment": attachment,
+            "ai_summary": ai_summary,
+            "summary_version": None if any(m in ai_summary for m in SUMMARY_FAILED) else PROMPT_VERSION,
+            "responses": responses
+        }
+        # Written by a background thread (batched with other submissions); the id is
+        # assigned right away so the PDF starts while the file is being written.
+        saved = self.writer().submit(payload)
+        rid = payload["response_id"]
+        out = {"response_id": rid, "report_id": None, "report_error": None}
+        try:
+            self._start_report(rid, payload)
+            out["report_id"] = rid
+        except Exception as e:
+            metrics.error("report", e)
+            out["report_error"] = str(e)
+        # Only a response that is on disk is reported as submitted; a failed or stuck
+        # write raises to the caller instead of being left in a future nobody reads.
+        saved.result(SAVE_TIMEOUT)
+        return out
+
+    async def submit(self, child_info: dict, responses: List[dict], ai_summary: str,
+                     attachment: Optional[str] = None, trace: Optional[Trace] = None) -> dict:
+        """
+        Saves the response and starts its PDF. Returns {"response_id", "report_id",
+        "report_error"} once the response is written (raises if it could not be);
+        poll report(report_id) for the PDF.
+        """
+        return await self._run(self._submit, child_info, responses, ai_summary or "", attachment, trace=trace)
+
+    def _start_report(self, report_id: str, payload: dict):
+        # Queues the PDF render unless this process already has one for the id.
+        reports = self.reports()
+        with self._lock:
+            if report_id in self._reports:
+                return
+            self._reports[report_id] = reports.submit(payload, out_path=self.report_path(report_id))
+            while len(self._reports) > MAX_REPORT_HANDLES:
+                self._reports.pop(next(iter(self._reports)))
+
+    def _rerender(self, report_id: str, src: str) -> Tuple[str, Optional[object]]:
+        # No process is known to be rendering this one (a restart, or the owner died):
+        # start it again from the saved response. Another server process may still be
+        # on it, so only once the response has waited longer than a render takes.
+        try:
+            if time.time() - os.path.getmtime(src) < REPORT_STALE_AFTER:
+                return "pending", None
+            with open(src, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            self._start_report(report_id, payload)
+        except Exception as e:
+            metrics.error("report", e)
+            return "failed", str(e)
+        return "pending", None
+
+    def _report(self, report_id: str) -> Tuple[str, Optional[object]]:
+        if not REPORT_ID.match(report_id or ""):
+            return "unknown", None
+        path = self.report_path(report_id)
+        # Files first: with several server processes the render may have been started by another one.
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return "ready", f.read()
+        if os.path.exists(path + ".err"):
+            with open(path + ".err", "r", encoding="utf-8") as f:
+                return "failed", f.read()
+        with self._lock:
+            handle = self._reports.get(report_id)
+        if handle is not None:
+            if not handle.done():
+                return "pending", None
+            if handle.error is not None:
+                return "failed", str(handle.error)
+            return "ready", handle.pdf()
+        src = os.path.join(self.resp_dir, f"resp_{report_id}.json")
+        if os.path.exists(src):
+            return self._rerender(report_id, src)
+        return "unknown", None
+
+    async def report(self, report_id: str) -> Tuple[str, Optional[object]]:
+        """
+        ("ready", pdf bytes), ("pending", None), ("failed", message) or ("unknown", None).
+        """
+        return await self._run(self._report, report_id)
@@ -5,9 +5,21 @@ try:
     from .embeddings import get_embeddings
     from .vectorstore import get_vectorstore, ensure_faiss_index
     from .rag import build_rag_chain
+    from .llm_cache import get_llm_cache, cached_llm
+    from .ingest import ingest_directory
+    from .embedding_cache import cached_embeddings
+    from .bm25 import BM25Index, HybridRetriever
+    from .semantic_cache import SemanticCache
+    from .ann import IndexSpec
 except ImportError:
     # Absolute import (for testing)
     from splitters import get_text_splitter
     from embeddings import get_embeddings
     from vectorstore import get_vectorstore, ensure_faiss_index
     from rag import build_rag_chain
+    from llm_cache import get_llm_cache, cached_llm
+    from ingest import ingest_directory
+    from embedding_cache import cached_embeddings
+    from bm25 import BM25Index, HybridRetriever
+    from semantic_cache import SemanticCache
+    from ann import IndexSpec
@@ -0,0 +1,169 @@
+
+# Approximate nearest-neighbour index types for the FAISS vector store. A spec such as
+# "ivf:nlist=1024,nprobe=16" or "hnsw:m=32,ef_search=64" picks the index and its
+# build/search parameters; get_vectorstore(index=...) builds, persists and reloads it.
+import math, uuid
+from dataclasses import dataclass, fields, replace
+from typing import Callable, List, Optional, Sequence, Union
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+KINDS = ("flat", "ivf", "hnsw", "pq", "ivfpq")
+MIN_POINTS_PER_CENTROID = 39   # below this faiss k-means warns and clusters poorly
+MAX_TRAIN_POINTS = 256         # training sample per centroid
+RETRAIN_GROWTH = 4             # retrain IVF/PQ once the corpus outgrows its training set this much
+
+# Read-only, paged in on demand. MMAP maps IVF lists; MMAP_IFC maps flat/HNSW/PQ code
+# storage but is rejected for IVF files, so load_mmapped() tries both.
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if faiss else 0
+MMAP_CODES_FLAGS = MMAP_FLAGS | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+@dataclass(frozen=True)
+class IndexSpec:
+    kind: str = "flat"
+    nlist: int = 0              # IVF cells; 0 = about 4 * sqrt(n)
+    nprobe: int = 8             # IVF cells visited per query
+    m: int = 32                 # HNSW links per node
+    ef_construction: int = 200
+    ef_search: int = 64
+    pq_m: int = 0               # PQ sub-quantizers; 0 = largest of 64/32/16/8/4 leaving >= 8 dims each
+    pq_bits: int = 8
+
+    SEARCH_PARAMS = ("nprobe", "ef_search")
+
+    def __post_init__(self):
+        if self.kind not in KINDS:
+            raise ValueError(f"Unknown index kind {self.kind!r}, expected one of {KINDS}")
+
+    @classmethod
+    def parse(cls, spec: Union[str, "IndexSpec", None]) -> "IndexSpec":
+        if spec is None or isinstance(spec, IndexSpec):
+            return spec or cls()
+        kind, _, params = spec.partition(":")
+        kwargs = {}
+        for item in filter(None, params.split(",")):
+            key, _, value = item.partition("=")
+            if key.strip() not in {f.name for f in fields(cls)} or key.strip() == "kind":
+                raise ValueError(f"Unknown index parameter {key!r} in {spec!r}")
+            kwargs[key.strip()] = int(value)
+        return cls(kind.strip() or "flat", **kwargs)
+
+    def __str__(self):
+        default = IndexSpec()
+        params = [f"{f.name}={getattr(self, f.name)}" for f in fields(self)
+                  if f.name != "kind" and getattr(self, f.name) != getattr(default, f.name)]
+        return self.kind + (":" + ",".join(params) if params else "")
+
+    @property
+    def trained(self) -> bool:
+        return self.kind in ("ivf", "pq", "ivfpq")
+
+    def build_key(self) -> "IndexSpec":
+        # Search-time parameters can change without rebuilding.
+        return replace(self, **{p: getattr(IndexSpec(), p) for p in self.SEARCH_PARAMS})
+
+    def resolve(self, n: int, dim: int) -> "IndexSpec":
+        """
+        Concrete parameters for `n` vectors of `dim`; corpora too small to train on fall back to flat.
+        """
+        spec = self
+        if spec.kind in ("ivf", "ivfpq"):
+            nlist = spec.nlist or int(4 * math.sqrt(n))
+            nlist = min(nlist, n // MIN_POINTS_PER_CENTROID)
+            if nlist < 2:
+                return IndexSpec("flat")
+            spec = replace(spec, nlist=nlist, nprobe=min(spec.nprobe, nlist))
+        if spec.kind in ("pq", "ivfpq"):
+            # faiss k-means gets far slower below 8 dims per sub-vector
+            pq_m = spec.pq_m or next((m for m in (64, 32, 16, 8, 4) if dim % m == 0 and dim // m >= 8), 0)
+            bits = min(spec.pq_bits, int(math.log2(max(n // MIN_POINTS_PER_CENTROID, 1))))
+            if not pq_m or dim % pq_m or bits < 4:
+                return IndexSpec("flat")
+            spec = replace(spec, pq_m=pq_m, pq_bits=bits)
+        return spec
+
+    def factory(self) -> str:
+        return {"flat": "Flat", "ivf": f"IVF{self.nlist},Flat", "hnsw": f"HNSW{self.m}",
+                # "np": skip polysemous training, which only helps Hamming-filtered search
+                "pq": f"PQ{self.pq_m}x{self.pq_bits}np",
+                "ivfpq": f"IVF{self.nlist},PQ{self.pq_m}x{self.pq_bits}np"}[self.kind]
+
+    def chroma_metadata(self) -> dict:
+        # Chroma only builds HNSW; applied when the collection is first created.
+        if self.kind != "hnsw":
+            return {}
+        return {"hnsw:space": "l2", "hnsw:M": self.m, "hnsw:construction_ef": self.ef_construction,
+                "hnsw:search_ef": self.ef_search}
+
+def apply_search_params(index, spec: IndexSpec):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(spec.nprobe, ivf.nlist)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = spec.ef_search
+
+def build_index(spec: IndexSpec, vectors: np.ndarray, seed: int = 0):
+    """
+    Builds and fills a faiss index for `vectors` (L2, like FAISS.from_texts). Positions
+    follow the row order, as the LangChain wrapper expects.
+    """
+    if faiss is None:
+        raise ImportError("faiss is required: pip install faiss-cpu")
+    n, dim = vectors.shape
+    spec = spec.resolve(n, dim)
+    index = faiss.index_factory(dim, spec.factory())
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = spec.ef_construction
+    if not index.is_trained:
+        cells = max(spec.nlist, 2 ** spec.pq_bits if spec.kind != "ivf" else 0)
+        sample = vectors
+        if n > MAX_TRAIN_POINTS * cells:
+            rows = np.random.default_rng(seed).choice(n, MAX_TRAIN_POINTS * cells, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(sample)
+    index.add(vectors)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()   # reconstruct() for MMR search
+    apply_search_params(index, spec)
+    return index
+
+def load_mmapped(read: Callable[[int], object]):
+    """
+    read(io_flags) with the memory-map flags this index type accepts.
+    """
+    try:
+        return read(MMAP_CODES_FLAGS)
+    except RuntimeError:
+        return read(MMAP_FLAGS)
+
+def removable(index) -> bool:
+    # Flat and PQ codes compact on removal, which is what the LangChain wrapper assumes.
+    # IVF keeps ids and HNSW cannot remove at all, so those are rebuilt instead.
+    return isinstance(index, faiss.IndexFlatCodes)
+
+def faiss_store(texts: List[str], embeddings, metadatas: Optional[Sequence[dict]] = None,
+                ids: Optional[List[str]] = None, spec: Union[str, IndexSpec, None] = None):
+    """
+    FAISS.from_texts with a configurable index.
+    """
+    try:
+        from langchain_community.vectorstores import FAISS
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+    except ImportError:
+        from langchain.vectorstores import FAISS
+        from langchain.docstore.in_memory import InMemoryDocstore
+    from langchain_core.documents import Document
+
+    ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+    metadatas = metadatas or [{}] * len(texts)
+    vectors = np.asarray(embeddings.embed_documents(list(texts)), dtype=np.float32)
+    index = build_index(IndexSpec.parse(spec), vectors)
+    docstore = InMemoryDocstore({i: Document(id=i, page_content=t, metadata=m or {})
+                                 for i, t, m in zip(ids, texts, metadatas)})
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids)))
@@ -0,0 +1,179 @@
+
+# In-process lexical retrieval (BM25 over an inverted index) and hybrid fusion with
+# a vector store. Exact terms such as "DDH" or "otitis media" are found without an
+# embedding round-trip; confident keyword matches skip the vector search entirely.
+import math, re, threading
+from collections import Counter
+from typing import Container, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from langchain_core.documents import Document
+except ImportError:
+    Document = None
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it its my
+of on or our should so than that the their them then there these they this to was
+what when where which who why will with you your me we he she his her baby child
+""".split())
+
+RRF_K = 60  # reciprocal rank fusion constant
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """
+    Inverted index: term -> {doc number: term frequency}. add()/remove() keep it in
+    step with the vector store's chunk ids.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self.docs: Dict[int, Tuple[str, str, dict]] = {}   # number -> (id, text, metadata)
+        self.numbers: Dict[str, int] = {}                  # id -> number
+        self._next = 0
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], metadatas: Optional[Sequence[dict]] = None):
+        metadatas = metadatas or [{}] * len(texts)
+        with self._lock:
+            for doc_id, text, meta in zip(ids, texts, metadatas):
+                if doc_id in self.numbers:
+                    self._remove(doc_id)
+                n = self._next
+                self._next += 1
+                tf = Counter(tokenize(text))
+                for term, c in tf.items():
+                    self.postings.setdefault(term, {})[n] = c
+                self.lengths[n] = sum(tf.values())
+                self._total_len += self.lengths[n]
+                self.docs[n] = (doc_id, text, meta or {})
+                self.numbers[doc_id] = n
+
+    def _remove(self, doc_id: str):
+        n = self.numbers.pop(doc_id, None)
+        if n is None:
+            return
+        _, text, _ = self.docs.pop(n)
+        for term in set(tokenize(text)):
+            p = self.postings.get(term)
+            if p is not None:
+                p.pop(n, None)
+                if not p:
+                    del self.postings[term]
+        self._total_len -= self.lengths.pop(n)
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def search(self, query: str, k: int = 4, allow: Optional[Container[int]] = None) -> List[Tuple[str, float, float]]:
+        """
+        Top-k (id, score, coverage); coverage is the share of query terms the chunk contains.
+        `allow` restricts the search to these doc numbers (see numbers_for()).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            n_docs = len(self.docs)
+            if not terms or not n_docs:
+                return []
+            avg = self._total_len / n_docs
+            scores: Dict[int, float] = {}
+            matched: Dict[int, int] = {}
+            for term in terms:
+                p = self.postings.get(term)
+                if not p:
+                    continue
+                idf = math.log(1 + (n_docs - len(p) + 0.5) / (len(p) + 0.5))
+                for n, tf in p.items():
+                    if allow is not None and n not in allow:
+                        continue
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * self.lengths[n] / avg))
+                    scores[n] = scores.get(n, 0.0) + idf * norm
+                    matched[n] = matched.get(n, 0) + 1
+            top = sorted(scores.items(), key=lambda x: -x[1])[:k]
+            return [(self.docs[n][0], s, matched[n] / len(terms)) for n, s in top]
+
+    def numbers_for(self, ids: Iterable[str]) -> frozenset:
+        with self._lock:
+            return frozenset(self.numbers[i] for i in ids if i in self.numbers)
+
+    def document(self, doc_id: str):
+        _, text, meta = self.docs[self.numbers[doc_id]]
+        return Document(page_content=text, metadata=meta, id=doc_id) if Document else text
+
+def rrf_fuse(rankings: Sequence[Sequence[str]], k: int) -> List[str]:
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=lambda key: -scores[key])[:k]
+
+def vectorstore_chunks(vs) -> Tuple[List[str], List[str], List[dict]]:
+    """
+    (ids, texts, metadatas) of every chunk in a FAISS or Chroma store.
+    """
+    if hasattr(vs, "docstore") and hasattr(vs.docstore, "_dict"):  # FAISS
+        items = list(vs.docstore._dict.items())
+        return [i for i, _ in items], [d.page_content for _, d in items], [d.metadata for _, d in items]
+    data = vs.get(include=["documents", "metadatas"])  # Chroma
+    return list(data["ids"]), list(data["documents"]), [m or {} for m in data["metadatas"]]
+
+class HybridRetriever:
+    """
+    BM25 + vector search, fused by reciprocal rank. When each of the top-k lexical
+    hits contains every query term, the query is answered lexically and never embedded.
+    """
+
+    def __init__(self, vs, bm25: BM25Index, k: int = 4, fetch_k: Optional[int] = None,
+                 fast_path: bool = True):
+        self.vs, self.bm25 = vs, bm25
+        self.k = k
+        self.fetch_k = fetch_k or 2 * k
+        self.fast_path = fast_path
+        self.routes = Counter()
+        self.last_route = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_vectorstore(cls, vs, **kwargs) -> "HybridRetriever":
+        bm25 = BM25Index()
+        ids, texts, metas = vectorstore_chunks(vs)
+        bm25.add(ids, texts, metas)
+        return cls(vs, bm25, **kwargs)
+
+    def confident(self, hits, k: int) -> bool:
+        top = hits[:min(k, len(self.bm25))]
+        return bool(top) and len(top) == min(k, len(self.bm25)) and all(cov >= 1.0 for _, _, cov in top)
+
+    def _route(self, route: str):
+        with self._lock:
+            self.last_route = route
+            self.routes[route] += 1
+
+    def get_relevant_documents(self, query: str, k: Optional[int] = None) -> list:
+        k = k or self.k
+        lexical = self.bm25.search(query, self.fetch_k)
+        if self.fast_path and self.confident(lexical, k):
+            self._route("lexical")
+            return [self.bm25.document(doc_id) for doc_id, _, _ in lexical[:k]]
+        self._route("hybrid")
+        dense = self.vs.similarity_search(query, k=self.fetch_k) if self.vs is not None else []
+        lex_docs = [self.bm25.document(doc_id) for doc_id, _, _ in lexical]
+        # Chunks are matched by text: vector stores do not always return ids.
+        by_text = {d.page_content: d for d in lex_docs}
+        by_text.update((d.page_content, d) for d in dense)
+        keys = rrf_fuse([[d.page_content for d in dense], [d.page_content for d in lex_docs]], k)
+        return [by_text[t] for t in keys]
+
+    # LangChain retriever spelling
+    invoke = get_relevant_documents
@@ -0,0 +1,200 @@
+
+# Embedding cache: vectors live in an append-only float32 file that is read through
+# np.memmap, and a small SQLite table maps text hash -> row. One folder per
+# (provider, model), since each model has its own dimension.
+import hashlib, os, re, sqlite3, threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:
+    Embeddings = object
+
+EMBED_CACHE_DIR = "data/embedding_cache"
+EMBED_CACHE_ENV = "EMBED_CACHE_DIR"   # another cache folder (benchmarks, a scratch copy)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+QUERY_PREFIX = "query\0"   # key namespace of embed_query vectors
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+def cache_dir_for(root: str, provider: str, model: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{provider}__{model}")
+    return os.path.join(root, safe)
+
+class EmbeddingCache:
+    """
+    text hash -> float32 vector. get_many() returns read-only row views into the
+    memory map (no copy); put_many() appends rows under a file lock, so several
+    processes can share one cache folder.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.vec_path = os.path.join(path, "vectors.f32")
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._rows: Dict[str, int] = dict(self._conn.execute("SELECT key, row FROM rows"))
+            dim = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim: Optional[int] = int(dim[0]) if dim else None
+        self._mm: Optional[np.memmap] = None
+
+    def _map(self, need: int) -> Optional[np.memmap]:
+        # Remap only when rows beyond the current mapping are requested.
+        if self._mm is None or len(self._mm) < need:
+            n = os.path.getsize(self.vec_path) // (self.dim * 4) if os.path.exists(self.vec_path) else 0
+            self._mm = np.memmap(self.vec_path, dtype=np.float32, mode="r", shape=(n, self.dim)) if n else None
+        return self._mm
+
+    def _refresh(self, keys: Sequence[str]):
+        # Rows added by other processes since we loaded the index.
+        missing = [k for k in keys if k not in self._rows]
+        for i in range(0, len(missing), 500):
+            part = missing[i:i + 500]
+            q = f"SELECT key, row FROM rows WHERE key IN ({','.join('?' * len(part))})"
+            self._rows.update(self._conn.execute(q, part))
+        if self.dim is None:
+            dim = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            self.dim = int(dim[0]) if dim else None
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            if any(k not in self._rows for k in keys):
+                self._refresh(keys)
+            rows = [self._rows.get(k) for k in keys]
+            if self.dim is None or all(r is None for r in rows):
+                return [None] * len(keys)
+            mm = self._map(max(r for r in rows if r is not None) + 1)
+        return [None if r is None else mm[r] for r in rows]
+
+    def put_many(self, keys: Sequence[str], vectors) -> None:
+        arr = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        with self._lock, open(os.path.join(self.path, ".lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._refresh(keys)
+            if self.dim is None:
+                self.dim = arr.shape[1]
+                with self._conn:
+                    self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+            elif arr.shape[1] != self.dim:
+                raise ValueError(f"Embedding size {arr.shape[1]} does not match cache size {self.dim}")
+            new = [(k, v) for k, v in zip(keys, arr) if k not in self._rows]
+            if not new:
+                return
+            rowbytes = self.dim * 4
+            size = os.path.getsize(self.vec_path) if os.path.exists(self.vec_path) else 0
+            start = size // rowbytes  # a torn row from a crashed writer is overwritten
+            with open(self.vec_path, "r+b" if size else "wb") as f:
+                f.seek(start * rowbytes)
+                f.write(np.stack([v for _, v in new]).tobytes())
+            rows = {k: start + i for i, (k, _) in enumerate(new)}
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?)", rows.items())
+            self._rows.update(rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+class CachedEmbeddings(Embeddings):
+    """
+    Drop-in `embeddings=` for FAISS/Chroma: only texts missing from the cache are sent
+    to the wrapped model, deduplicated and in batches of `batch_size`.
+    """
+
+    def __init__(self, inner, provider: str, model: str, root: Optional[str] = None,
+                 batch_size: int = 1000, cache: Optional[EmbeddingCache] = None):
+        self.inner = inner
+        self.provider, self.model = provider, model
+        self.batch_size = batch_size
+        root = root or os.environ.get(EMBED_CACHE_ENV) or EMBED_CACHE_DIR
+        self.cache = cache or get_embedding_cache(cache_dir_for(root, provider, model))
+        self.hits = 0
+        self.misses = 0
+        self.embedded = 0   # texts sent to the wrapped model (misses minus duplicates)
+        self._lock = threading.Lock()
+
+    def embed_arrays(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Like embed_documents, but cached vectors come back as memory-map views.
+        """
+        keys = [text_key(t) for t in texts]
+        found = self.cache.get_many(keys)
+        todo: Dict[str, str] = {}
+        for k, t, v in zip(keys, texts, found):
+            if v is None:
+                todo.setdefault(k, t)
+        with self._lock:
+            misses = sum(1 for v in found if v is None)
+            self.hits += len(texts) - misses
+            self.misses += misses
+            self.embedded += len(todo)
+        if todo:
+            miss_keys = list(todo)
+            fresh: Dict[str, np.ndarray] = {}
+            for i in range(0, len(miss_keys), self.batch_size):
+                part = miss_keys[i:i + self.batch_size]
+                vecs = np.asarray(self.inner.embed_documents([todo[k] for k in part]), dtype=np.float32)
+                self.cache.put_many(part, vecs)
+                fresh.update(zip(part, vecs))
+            found = [v if v is not None else fresh[k] for k, v in zip(keys, found)]
+        return found
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [v.tolist() for v in self.embed_arrays(texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Query vectors come from the model's own embed_query and are kept under their own
+        # keys: models that embed questions differently from passages never mix the two.
+        key = text_key(QUERY_PREFIX + text)
+        v = self.cache.get_many([key])[0]
+        with self._lock:
+            if v is None:
+                self.misses += 1
+                self.embedded += 1
+            else:
+                self.hits += 1
+        if v is None:
+            v = np.asarray(self.inner.embed_query(text), dtype=np.float32)
+            self.cache.put_many([key], v[None, :])
+        return v.tolist()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits, misses, embedded = self.hits, self.misses, self.embedded
+        lookups = hits + misses
+        return {"hits": hits, "misses": misses, "embedded": embedded,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self.cache), "dim": self.cache.dim or 0}
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(path: str) -> EmbeddingCache:
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(path)
+        return _caches[path]
+
+def cached_embeddings(inner, provider: str, model: str, root: Optional[str] = None) -> CachedEmbeddings:
+    if isinstance(inner, CachedEmbeddings):
+        return inner
+    return CachedEmbeddings(inner, provider, model, root)
@@ -1,14 +1,32 @@
 
 from typing import Optional
-def get_embeddings(provider: str = "openai", model: Optional[str] = None):
+
+OPENAI_MODEL = "text-embedding-3-small"
+HF_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+def get_embeddings(provider: str = "openai", model: Optional[str] = None, cache_root: Optional[str] = None,
+                   http_client=None):
     provider = (provider or "openai").lower()
     if provider == "openai":
         # Use OpenAI's paid model (High performance)
         from langchain_openai import OpenAIEmbeddings
-        return OpenAIEmbeddings(model=model or "text-embedding-3-small")
+        model = model or OPENAI_MODEL
+        emb = OpenAIEmbeddings(model=model, http_client=http_client)
     elif provider in ("hf", "huggingface"):
         # Free model (Uses local computer resources)
         from langchain_huggingface import HuggingFaceEmbeddings
-        return HuggingFaceEmbeddings(model_name=model or "sentence-transformers/all-MiniLM-L6-v2")
+        model = model or HF_MODEL
+        emb = HuggingFaceEmbeddings(model_name=model)
+    elif provider == "fake":
+        # Test double, not a provider: benchmarks build benchmarks.fakes.HashEmbeddings themselves.
+        raise ValueError("The fake embeddings are for benchmarks only: use benchmarks.fakes.HashEmbeddings")
     else:
         raise ValueError(f"Unknown embeddings provider: {provider}")
+    if cache_root:
+        # Vectors for texts seen before are read from disk instead of recomputed.
+        try:
+            from .embedding_cache import cached_embeddings
+        except ImportError:
+            from embedding_cache import cached_embeddings
+        emb = cached_embeddings(emb, provider, model, cache_root)
+    return emb
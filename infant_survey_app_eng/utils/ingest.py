@@ -0,0 +1,250 @@
+
+# Incremental ingestion: a manifest remembers each file's hash and the ids of its
+# chunks, so only added or edited chunks are embedded and stale ones are deleted.
+import glob, hashlib, json, os, tempfile, time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+DOC_EXTS = (".pdf", ".docx", ".txt")
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_BATCH = 256   # chunks per embedding/upsert call
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_ids(source: str, texts: Iterable[str]) -> List[str]:
+    """
+    Content-addressed ids: an unchanged chunk keeps its id when the rest of its file
+    is edited. Repeats within one file get an occurrence suffix.
+    """
+    ids, seen = [], {}
+    for t in texts:
+        cid = hashlib.sha256(f"{source}\0{t}".encode("utf-8")).hexdigest()[:32]
+        n = seen.get(cid, 0)
+        seen[cid] = n + 1
+        ids.append(cid if n == 0 else f"{cid}-{n}")
+    return ids
+
+def load_manifest(path: str) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            m = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return m if m.get("version") == MANIFEST_VERSION else None
+
+def save_manifest(path: str, manifest: dict):
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def load_file(path: str) -> list:
+    from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+    lp = path.lower()
+    if lp.endswith(".pdf"): return PyPDFLoader(path).load()
+    if lp.endswith(".docx"): return Docx2txtLoader(path).load()
+    if lp.endswith(".txt"): return TextLoader(path, encoding="utf-8").load()
+    return []
+
+def list_documents(doc_dir: str) -> List[str]:
+    return sorted(p for p in glob.glob(os.path.join(doc_dir, "**/*"), recursive=True)
+                  if os.path.isfile(p) and p.lower().endswith(DOC_EXTS))
+
+def sync_store(store, add: Dict[str, Tuple[str, dict]], remove: Iterable[str],
+               create: Optional[Callable] = None):
+    """
+    Deletes `remove` ids and upserts `add` ({id: (text, metadata)}) into a LangChain
+    vector store. `create(texts, metadatas, ids)` builds the store when there is none yet.
+    """
+    remove = list(remove)
+    if store is not None and remove:
+        store.delete(ids=remove)
+    if not add:
+        return store
+    ids = list(add)
+    texts = [add[i][0] for i in ids]
+    metas = [add[i][1] for i in ids]
+    if store is None:
+        if create is None:
+            raise ValueError("No vector store to add to")
+        return create(texts, metas, ids)
+    # Upsert: a run interrupted before its manifest was saved may have added some of these already.
+    if hasattr(store, "get_by_ids"):
+        present = [d.id for d in store.get_by_ids(ids) if getattr(d, "id", None)]
+        if present:
+            store.delete(ids=present)
+    store.add_texts(texts, metadatas=metas, ids=ids)
+    return store
+
+def _default_splitter():
+    try:
+        from .splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        from splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+
+def _parse(path: str, rel: str, splitter) -> Tuple[str, Optional[list], float, Optional[str]]:
+    """
+    Worker: load and split one file. Returns (rel, [(text, metadata)], seconds, error).
+    Only plain tuples cross the process boundary.
+    """
+    t0 = time.perf_counter()
+    try:
+        chunks = splitter.split_documents(load_file(path))
+    except Exception as e:
+        return rel, None, time.perf_counter() - t0, str(e)
+    return rel, [(c.page_content, c.metadata) for c in chunks], time.perf_counter() - t0, None
+
+def _parsed(jobs, splitter, workers: int, max_pending: int):
+    """
+    Yields _parse results. With workers > 1 files are parsed in a process pool, and at
+    most `max_pending` files are in flight, so memory does not grow with the corpus.
+    """
+    if workers <= 1:
+        for path, rel in jobs:
+            yield _parse(path, rel, splitter)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for path, rel in jobs:
+            pending.add(pool.submit(_parse, path, rel, splitter))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    yield f.result()
+        for f in as_completed(pending):
+            yield f.result()
+
+def _with_rates(report: dict, t_start: float) -> dict:
+    report["seconds"] = time.perf_counter() - t_start
+    parsed = report["added"] + report["changed"] + report["failed"]
+    report["parse_files_per_sec"] = parsed / report["parse_seconds"] if report["parse_seconds"] else 0.0
+    report["embed_chunks_per_sec"] = report["embedded"] / report["embed_seconds"] if report["embed_seconds"] else 0.0
+    return dict(report)
+
+def ingest_directory(doc_dir: str, store, manifest_path: str, splitter=None,
+                     create: Optional[Callable] = None, persist: Optional[Callable] = None,
+                     workers: int = DEFAULT_WORKERS, batch_size: int = DEFAULT_BATCH,
+                     max_pending: Optional[int] = None, checkpoint_every: float = 10.0,
+                     progress: Optional[Callable[[dict], None]] = None):
+    """
+    Brings `store` in line with the files under `doc_dir`; returns (store, report).
+
+    Stages: scan (stat/hash against the manifest) -> parse+split (process pool)
+    -> embed+upsert in batches of `batch_size` chunks. The manifest is checkpointed
+    every `checkpoint_every` seconds, covering only files whose chunks are all
+    stored, so an interrupted build resumes where it stopped. `progress(report)`
+    is called after every batch.
+    """
+    splitter = splitter or _default_splitter()
+    max_pending = max_pending or max(2 * workers, 1)
+    manifest = load_manifest(manifest_path) or {"version": MANIFEST_VERSION, "files": {}}
+    old_files: Dict[str, dict] = manifest["files"]
+    new_files: Dict[str, dict] = {}
+    report = {"files": 0, "added": 0, "changed": 0, "deleted": 0, "unchanged": 0, "failed": 0,
+              "embedded": 0, "removed": 0, "batches": 0,
+              "scan_seconds": 0.0, "parse_seconds": 0.0, "embed_seconds": 0.0, "seconds": 0.0}
+    t_start = time.perf_counter()
+
+    # Stage 1: decide which files need parsing.
+    jobs, stats = [], {}
+    for path in list_documents(doc_dir):
+        rel = os.path.relpath(path, doc_dir)
+        st = os.stat(path)
+        old = old_files.get(rel)
+        if old and old["mtime_ns"] == st.st_mtime_ns and old["size"] == st.st_size:
+            new_files[rel] = old
+            report["unchanged"] += 1
+            continue
+        digest = file_hash(path)
+        if old and old["hash"] == digest:
+            # Touched but not edited.
+            new_files[rel] = dict(old, mtime_ns=st.st_mtime_ns, size=st.st_size)
+            report["unchanged"] += 1
+            continue
+        stats[rel] = {"hash": digest, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        jobs.append((path, rel))
+    report["files"] = len(jobs)
+    remove: List[str] = [cid for rel, old in old_files.items() if rel not in new_files and rel not in stats
+                         for cid in old["chunks"]]
+    report["deleted"] = sum(1 for rel in old_files if rel not in new_files and rel not in stats)
+    report["scan_seconds"] = time.perf_counter() - t_start
+
+    # What the manifest may claim right now: an edited file keeps its old entry until
+    # its new chunks are stored, so an interrupted run still knows what to delete.
+    committed = dict(new_files)
+    committed.update((rel, old_files[rel]) for rel in stats if rel in old_files)
+    waiting: List[Tuple[str, dict]] = []
+    add: Dict[str, Tuple[str, dict]] = {}
+    last_checkpoint = time.perf_counter()
+
+    def checkpoint():
+        if persist is not None and store is not None:
+            persist(store)
+        save_manifest(manifest_path, {"version": MANIFEST_VERSION, "files": committed})
+
+    def flush():
+        nonlocal store, remove, last_checkpoint
+        if add or remove:
+            t0 = time.perf_counter()
+            store = sync_store(store, add, remove, create)
+            report["embed_seconds"] += time.perf_counter() - t0
+            report["embedded"] += len(add)
+            report["removed"] += len(remove)
+            report["batches"] += 1
+            add.clear()
+            remove = []
+        committed.update(waiting)
+        waiting.clear()
+        if time.perf_counter() - last_checkpoint >= checkpoint_every:
+            checkpoint()
+            last_checkpoint = time.perf_counter()
+        if progress is not None:
+            progress(_with_rates(report, t_start))
+
+    # Stages 2 and 3: parse in the pool, embed and upsert in batches as results arrive.
+    for rel, chunks, seconds, error in _parsed(jobs, splitter, workers, max_pending):
+        report["parse_seconds"] += seconds
+        old = old_files.get(rel)
+        if error is not None:
+            print(f"Failed to load document {os.path.join(doc_dir, rel)}: {error}")
+            report["failed"] += 1
+            if old:
+                committed[rel] = new_files[rel] = old  # keep serving the previous version
+            continue
+        ids = chunk_ids(rel, [t for t, _ in chunks])
+        kept = set(old["chunks"]) if old else set()
+        remove.extend(kept - set(ids))
+        for cid, (text, meta) in zip(ids, chunks):
+            if cid not in kept:
+                add[cid] = (text, dict(meta, chunk_id=cid))
+                if len(add) >= batch_size:
+                    flush()
+        new_files[rel] = dict(stats[rel], chunks=ids)
+        waiting.append((rel, new_files[rel]))
+        report["changed" if old else "added"] += 1
+    flush()
+    if report["batches"] or new_files != old_files:
+        checkpoint()
+
+    return store, _with_rates(report, t_start)
+
+def text_ids(texts: List[str], metadatas: Optional[List[dict]] = None) -> List[str]:
+    # For callers that pass raw texts rather than files: id = hash of text + metadata.
+    metadatas = metadatas or [{}] * len(texts)
+    keys = [json.dumps(m, sort_keys=True, ensure_ascii=False, default=str) for m in metadatas]
+    return chunk_ids("", [f"{k}\0{t}" for k, t in zip(keys, texts)])
@@ -0,0 +1,195 @@
+
+import hashlib, json, os, sqlite3, threading, time
+from typing import Dict, Optional
+
+try:
+    from .metrics import metrics
+except ImportError:
+    from metrics import metrics
+
+# Shared by every replica that mounts the same data/ folder.
+LLM_CACHE_DB = "data/llm_cache.sqlite"
+LLM_CACHE_ENV = "LLM_CACHE_DB"   # another database file (benchmarks, a scratch copy)
+DEFAULT_TTL = 7 * 24 * 3600        # seconds
+DEFAULT_MAX_ENTRIES = 20000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key       TEXT PRIMARY KEY,
+    model     TEXT,
+    content   TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    created   REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+def normalize_prompt(messages) -> list:
+    """
+    (role, text) pairs with whitespace collapsed, so indentation in f-string prompts
+    does not split the cache.
+    """
+    if isinstance(messages, str):
+        messages = [("human", messages)]
+    out = []
+    for m in messages:
+        if isinstance(m, tuple):
+            role, content = m[0], m[1]
+        else:
+            role, content = getattr(m, "type", "human"), getattr(m, "content", m)
+        out.append([str(role), " ".join(str(content).split())])
+    return out
+
+def model_name(llm) -> str:
+    return str(getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__)
+
+def cache_key(model: str, temperature, messages) -> str:
+    raw = json.dumps([model, temperature, normalize_prompt(messages)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """
+    Disk-backed prompt -> completion cache with TTL and LRU eviction by entry
+    count and total size. Counters are stored in the database, so hit/miss
+    numbers aggregate across processes.
+    """
+
+    def __init__(self, db_path: str = LLM_CACHE_DB, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        d = os.path.dirname(db_path)
+        if d: os.makedirs(d, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def _bump(self, name: str, n: int = 1):
+        self._conn.execute(
+            "INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+            (name, n, n))
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT content, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._bump("expired")
+                row = None
+            if row is None:
+                self._bump("misses")
+                metrics.inc("llm_cache_total", result="miss")
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+            self._bump("hits")
+            metrics.inc("llm_cache_total", result="hit")
+            return row[0]
+
+    def set(self, key: str, content: str, model: Optional[str] = None):
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, size, now, now))
+            self._evict(now)
+
+    def _evict(self, now: float):
+        cur = self._conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        evicted = cur.rowcount
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            # Least recently used first, until both limits hold again.
+            for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                count, total, evicted = count - 1, total - size, evicted + 1
+        if evicted:
+            self._bump("evictions", evicted)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            out = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            out["entries"], out["bytes"] = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        for name in ("hits", "misses", "expired", "evictions"):
+            out.setdefault(name, 0)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM counters")
+
+class CachedMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+class CachedChatModel:
+    """
+    Wraps any chat model with invoke(); identical prompts are answered from the cache.
+    """
+
+    def __init__(self, llm, cache: Optional[LLMCache] = None):
+        self.llm = llm
+        self.cache = cache or get_llm_cache()
+        self.model_name = model_name(llm)
+        self.temperature = getattr(llm, "temperature", None)
+
+    def invoke(self, messages, **kwargs):
+        key = cache_key(self.model_name, self.temperature, messages)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return CachedMessage(hit)
+        resp = self.llm.invoke(messages, **kwargs)
+        content = resp.content if hasattr(resp, "content") else str(resp)
+        self.cache.set(key, content, model=self.model_name)
+        return resp
+
+    def stream(self, messages, **kwargs):
+        """
+        Hits come back as a single chunk; misses are streamed through and stored once complete.
+        """
+        key = cache_key(self.model_name, self.temperature, messages)
+        hit = self.cache.get(key)
+        if hit is not None:
+            yield CachedMessage(hit)
+            return
+        if not hasattr(self.llm, "stream"):
+            yield self.invoke(messages, **kwargs)
+            return
+        parts = []
+        for chunk in self.llm.stream(messages, **kwargs):
+            parts.append(getattr(chunk, "content", "") or "")
+            yield chunk
+        self.cache.set(key, "".join(parts), model=self.model_name)
+
+_caches: Dict[str, LLMCache] = {}
+_caches_lock = threading.Lock()
+
+def get_llm_cache(db_path: Optional[str] = None) -> LLMCache:
+    db_path = db_path or os.environ.get(LLM_CACHE_ENV) or LLM_CACHE_DB
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = LLMCache(db_path)
+        return _caches[db_path]
+
+def cached_llm(llm, cache: Optional[LLMCache] = None):
+    if isinstance(llm, CachedChatModel):
+        return llm
+    return CachedChatModel(llm, cache)
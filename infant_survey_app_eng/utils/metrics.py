@@ -0,0 +1,261 @@
+
+# Process-wide latency and counter metrics. Stages are timed as spans into histograms
+# (p50/p95/p99 over recent samples); counters hold tokens, cache hits and errors. The
+# spans of one Streamlit rerun (with those the service timed for it) are also kept for
+# the profile panel. Exported as
+# Prometheus text and/or JSON lines to local files:
+#   METRICS_PROM=data/metrics.prom   (rewritten every EXPORT_INTERVAL seconds)
+#   METRICS_JSONL=data/metrics.jsonl (one line per finished span)
+import atexit, json, logging, math, os, threading, time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+RECENT_SAMPLES = 2048      # per histogram, for the quantiles
+QUANTILES = (0.5, 0.95, 0.99)
+PROM_ENV = "METRICS_PROM"
+JSONL_ENV = "METRICS_JSONL"
+EXPORT_INTERVAL = 15.0
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(kw: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+def _prom_labels(labels: Labels, **extra) -> str:
+    parts = [f'{k}="{v}"' for k, v in labels + tuple(extra.items())]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    """
+    Cumulative bucket counts for Prometheus, plus the last RECENT_SAMPLES values
+    for quantiles that follow the current load.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)   # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent: "deque[float]" = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value: float):
+        self.buckets[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantiles(self, qs=QUANTILES) -> Dict[float, float]:
+        s = sorted(self.recent)
+        if not s:
+            return {q: 0.0 for q in qs}
+        # Nearest rank.
+        return {q: s[max(0, math.ceil(q * len(s)) - 1)] for q in qs}
+
+class Trace:
+    """
+    Spans finished on one thread since trace() was called, in order.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, Optional[str]]] = []   # (stage, seconds, error type)
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+class Metrics:
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.jsonl_path: Optional[str] = None
+        self._jsonl_lock = threading.Lock()
+
+    def inc(self, name: str, n: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+            h.observe(value)
+
+    def record_span(self, stage: str, seconds: float, error: Optional[str] = None, **labels):
+        self.observe("stage_seconds", seconds, stage=stage, **labels)
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.spans.append((stage, seconds, error))
+        if self.jsonl_path:
+            line = json.dumps({"ts": time.time(), "stage": stage, "seconds": round(seconds, 6),
+                               "error": error, **labels}, ensure_ascii=False)
+            try:
+                with self._jsonl_lock, open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.warning("metrics JSONL sink %s failed: %s", self.jsonl_path, e)
+
+    @contextmanager
+    def span(self, stage: str, **labels) -> Iterator[None]:
+        """
+        Times the block as `stage`; an exception's type is noted on the span and re-raised
+        (the handler that catches it counts it with error()). Streamlit's stop/rerun
+        signals are not Exceptions and leave no error.
+        """
+        t0, error = time.perf_counter(), None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record_span(stage, time.perf_counter() - t0, error, **labels)
+
+    def error(self, stage: str, exc: BaseException):
+        """
+        For handlers that recover: the failure is counted and logged instead of vanishing.
+        Handlers that must stay quiet (they print their own message) inc() the counter.
+        """
+        self.inc("stage_errors_total", stage=stage, error=type(exc).__name__)
+        logger.warning("%s failed: %s: %s", stage, type(exc).__name__, exc)
+
+    def trace(self) -> Trace:
+        """
+        Starts collecting this thread's spans (one per Streamlit rerun); replaces the last trace.
+        """
+        self._local.trace = Trace()
+        return self._local.trace
+
+    def current_trace(self) -> Optional[Trace]:
+        return getattr(self._local, "trace", None)
+
+    @contextmanager
+    def use_trace(self, trace: Optional[Trace]) -> Iterator[None]:
+        """
+        Spans finished on this thread inside the block go to `trace` (another thread's,
+        e.g. the request being served); None collects nothing.
+        """
+        previous = self.current_trace()
+        self._local.trace = trace
+        try:
+            yield
+        finally:
+            self._local.trace = previous
+
+    def add_spans(self, spans: Iterable[Tuple[str, float, Optional[str]]]):
+        """
+        Spans timed elsewhere (the service process) join this thread's trace; its
+        histograms are not touched, the other process has them.
+        """
+        trace = self.current_trace()
+        if trace is not None:
+            trace.spans.extend((stage, float(seconds), error) for stage, seconds, error in spans)
+
+    def snapshot(self) -> Dict[str, list]:
+        """
+        {"stages": [(name, labels, count, p50, p95, p99, mean)], "counters": [(name, labels, value)]}.
+        """
+        with self._lock:
+            hs = [(n, dict(l), h.count, h.sum, h.quantiles()) for (n, l), h in self.histograms.items()]
+            cs = [(n, dict(l), v) for (n, l), v in self.counters.items()]
+        stages = [(n, l, c, q[0.5], q[0.95], q[0.99], s / c if c else 0.0) for n, l, c, s, q in sorted(hs, key=str)]
+        return {"stages": stages, "counters": sorted(cs, key=str)}
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            hists = sorted((k, (list(h.buckets), h.count, h.sum, h.quantiles())) for k, h in self.histograms.items())
+        for name in sorted({n for (n, _), _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            lines += [f"{name}{_prom_labels(l)} {v:g}" for (n, l), v in counters if n == name]
+        for name in sorted({n for (n, _), _ in hists}):
+            lines.append(f"# TYPE {name} histogram")
+            for (n, l), (buckets, count, total, _) in hists:
+                if n != name:
+                    continue
+                acc = 0
+                for bound, c in zip(BUCKETS + (float("inf"),), buckets):
+                    acc += c
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_prom_labels(l, le=le)} {acc}")
+                lines.append(f"{name}_sum{_prom_labels(l)} {total:.6f}")
+                lines.append(f"{name}_count{_prom_labels(l)} {count}")
+            # Quantiles of the recent window, as a separate gauge family.
+            lines.append(f"# TYPE {name}_recent gauge")
+            for (n, l), (_, _, _, qs) in hists:
+                if n == name:
+                    lines += [f"{name}_recent{_prom_labels(l, quantile=f'{q:g}')} {v:.6f}" for q, v in qs.items()]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        d = os.path.dirname(path)
+        if d: os.makedirs(d, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)   # scrapers never see a half-written file
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+metrics = Metrics()
+
+def server_timing(spans: Iterable[Tuple[str, float, Optional[str]]]) -> str:
+    """
+    Spans as an HTTP Server-Timing header value: `stats;dur=1.25, triage;dur=30.1;desc="ValueError"`.
+    """
+    return ", ".join(f"{stage};dur={seconds * 1000:.3f}" + (f';desc="{error}"' if error else "")
+                     for stage, seconds, error in spans)
+
+def parse_server_timing(value: str) -> List[Tuple[str, float, Optional[str]]]:
+    spans = []
+    for entry in filter(None, (e.strip() for e in value.split(","))):
+        stage, *params = [p.strip() for p in entry.split(";")]
+        fields = dict(p.split("=", 1) for p in params if "=" in p)
+        try:
+            seconds = float(fields.get("dur", 0)) / 1000
+        except ValueError:
+            continue
+        spans.append((stage, seconds, fields["desc"].strip('"') if "desc" in fields else None))
+    return spans
+
+_exporter: Dict[str, threading.Thread] = {}
+_exporter_lock = threading.Lock()
+
+def configure(prom_path: Optional[str] = None, jsonl_path: Optional[str] = None,
+              interval: float = EXPORT_INTERVAL) -> Metrics:
+    """
+    Turns on the file sinks (default: from METRICS_PROM / METRICS_JSONL), once per process.
+    """
+    prom_path = prom_path or os.environ.get(PROM_ENV)
+    jsonl_path = jsonl_path or os.environ.get(JSONL_ENV)
+    if jsonl_path:
+        d = os.path.dirname(jsonl_path)
+        if d: os.makedirs(d, exist_ok=True)
+        metrics.jsonl_path = jsonl_path
+    with _exporter_lock:
+        if prom_path and prom_path not in _exporter:
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        metrics.write_prometheus(prom_path)
+                    except OSError as e:
+                        logger.warning("metrics export to %s failed: %s", prom_path, e)
+            t = threading.Thread(target=run, name="metrics-export", daemon=True)
+            t.start()
+            _exporter[prom_path] = t
+            atexit.register(lambda: metrics.write_prometheus(prom_path))
+    return metrics
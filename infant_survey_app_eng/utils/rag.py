@@ -1,20 +1,35 @@
 
 from typing import Optional, List
 
-def build_rag_chain(vs, llm=None, k: int = 4):
-    # Use GPT-4o-mini by default if LLM is not provided
+try:
+    from .llm_cache import cached_llm
+    from .bm25 import HybridRetriever
+except ImportError:
+    from llm_cache import cached_llm
+    from bm25 import HybridRetriever
+
+def build_rag_chain(vs, llm=None, k: int = 4, cache=None, hybrid: bool = True):
+    # The app's configured "rag" model (see agents.providers) if LLM is not provided
     if llm is None:
-        from langchain_openai import ChatOpenAI
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
+        try:
+            from agents.registry import chat_model
+            llm = chat_model(temperature=0.2, role="rag")
+        except ImportError:
+            from langchain_openai import ChatOpenAI
+            llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
+    # Identical questions over the same context are answered from the shared cache.
+    llm = cached_llm(llm, cache)
+    # Keyword matches are found locally; only the rest goes through the vector search.
+    retriever = HybridRetriever.from_vectorstore(vs, k=k) if hybrid else None
 
     def ask(query: str) -> dict:
         # 1. Find 4 similar documents (k=4).
-        docs = vs.similarity_search(query, k=k)
+        docs = retriever.get_relevant_documents(query) if retriever else vs.similarity_search(query, k=k)
         # 2. Combine found document contents into one text.
-        context = "\\n\\n".join([d.page_content for d in docs])
+        context = "\n\n".join([d.page_content for d in docs])
 
         # 3. Construct the prompt (Context + Question)
-        prompt = f\"\"\"You are a pediatric questionnaire assistant agent.
+        prompt = f"""You are a pediatric questionnaire assistant agent.
         Based on the context below, kindly answer the user's question in English.
 
         [Context]
@@ -22,7 +37,7 @@ def build_rag_chain(vs, llm=None, k: int = 4):
 
         [Question]
         {query}
-        \"\"\"
+        """
         # 4. Request answer from AI.
         resp = llm.invoke(prompt)
 
@@ -0,0 +1,175 @@
+
+# Semantic answer cache: a new question is embedded and compared with earlier
+# questions from the same scope (age group); a close enough match returns the
+# stored answer without retrieval or generation. Answers that depended on a caregiver's
+# own conversation are neither looked up nor stored (see shareable).
+import threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    from .metrics import metrics
+except ImportError:
+    from metrics import metrics
+
+DEFAULT_THRESHOLD = 0.92      # cosine similarity
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL = 7 * 24 * 3600   # seconds
+
+PRIVATE_MARKER = "[Analysis Result]"   # the chat message carrying a child's summary
+
+def shareable(history) -> bool:
+    """
+    True when an answer generated with this chat history can be shared across
+    caregivers: no earlier user turns and no analysis result, only the greeting.
+    """
+    return not any(m.get("role") == "user" or PRIVATE_MARKER in str(m.get("content", ""))
+                   for m in history or [])
+
+@dataclass
+class _Entry:
+    scope: str
+    question: str
+    answer: str
+    created: float
+
+@dataclass(frozen=True)
+class SemanticHit:
+    answer: str
+    question: str       # the earlier question that matched
+    similarity: float
+
+class _Scope:
+    # One inner-product index per scope over unit vectors (= cosine similarity).
+    def __init__(self, dim: int):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim)) if faiss is not None else None
+        self.vectors: Dict[int, np.ndarray] = {}
+
+    def add(self, entry_id: int, vec: np.ndarray):
+        if self.index is not None:
+            self.index.add_with_ids(vec[None, :], np.array([entry_id], dtype=np.int64))
+        else:
+            self.vectors[entry_id] = vec
+
+    def remove(self, entry_id: int):
+        if self.index is not None:
+            self.index.remove_ids(np.array([entry_id], dtype=np.int64))
+        else:
+            self.vectors.pop(entry_id, None)
+
+    def __len__(self) -> int:
+        return self.index.ntotal if self.index is not None else len(self.vectors)
+
+    def nearest(self, vec: np.ndarray) -> Tuple[Optional[int], float]:
+        if self.index is not None:
+            if self.index.ntotal == 0:
+                return None, 0.0
+            sims, ids = self.index.search(vec[None, :], 1)
+            return (int(ids[0][0]), float(sims[0][0])) if ids[0][0] >= 0 else (None, 0.0)
+        best, best_sim = None, -1.0
+        for i, v in self.vectors.items():
+            s = float(v @ vec)
+            if s > best_sim:
+                best, best_sim = i, s
+        return best, best_sim
+
+class SemanticCache:
+    """
+    question -> answer cache with nearest-neighbour lookup per scope, LRU eviction
+    past `max_entries`, and a TTL. Works with any LangChain embeddings (see
+    utils.embeddings.get_embeddings).
+    """
+
+    def __init__(self, embeddings, threshold: float = DEFAULT_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()   # LRU order, oldest first
+        self._scopes: Dict[str, _Scope] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def embed(self, question: str) -> np.ndarray:
+        vec = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def lookup(self, question: str, scope: str = "",
+               vector: Optional[np.ndarray] = None) -> Tuple[Optional[SemanticHit], np.ndarray]:
+        """Returns (hit or None, question vector); pass the vector on to put() after a miss."""
+        vec = self.embed(question) if vector is None else vector
+        now = time.time()
+        with self._lock:
+            s = self._scopes.get(scope)
+            entry_id, sim = s.nearest(vec) if s is not None else (None, 0.0)
+            entry = self._entries.get(entry_id) if entry_id is not None else None
+            if entry is not None and now - entry.created > self.ttl:
+                self._drop(entry_id)
+                self.counters["expired"] += 1
+                entry = None
+            if entry is None or sim < self.threshold:
+                self.counters["misses"] += 1
+                metrics.inc("semantic_cache_total", result="miss")
+                return None, vec
+            self._entries.move_to_end(entry_id)
+            self.counters["hits"] += 1
+            metrics.inc("semantic_cache_total", result="hit")
+            return SemanticHit(entry.answer, entry.question, sim), vec
+
+    def put(self, question: str, answer: str, scope: str = "", vector: Optional[np.ndarray] = None):
+        vec = self.embed(question) if vector is None else vector
+        with self._lock:
+            s = self._scopes.get(scope)
+            if s is None:
+                s = self._scopes[scope] = _Scope(len(vec))
+            entry_id = self._next_id
+            self._next_id += 1
+            s.add(entry_id, vec)
+            self._entries[entry_id] = _Entry(scope, question, answer, time.time())
+            self._evict()
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        s = self._scopes[entry.scope]
+        s.remove(entry_id)
+        if not len(s):
+            del self._scopes[entry.scope]
+
+    def _evict(self):
+        now = time.time()
+        # Oldest-used first; expired entries are dropped as they are met.
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if now - entry.created > self.ttl:
+                self._drop(entry_id)
+                self.counters["expired"] += 1
+            elif len(self._entries) > self.max_entries:
+                self._drop(entry_id)
+                self.counters["evictions"] += 1
+            else:
+                break
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            out = dict(self.counters)
+            out["entries"] = len(self._entries)
+            out["scopes"] = len(self._scopes)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
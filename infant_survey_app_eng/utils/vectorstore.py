@@ -1,25 +1,75 @@
-
-from typing import List, Optional
+from typing import List, Optional, Union
 from pathlib import Path
 
-def get_vectorstore(texts: List[str], metadatas: Optional[List[dict]] = None,
-                    embeddings=None, index_dir: Optional[str] = None):
+try:
+    from .ingest import MANIFEST_NAME, MANIFEST_VERSION, load_manifest, save_manifest, sync_store, text_ids
+    from .ann import IndexSpec, apply_search_params, faiss_store, load_mmapped, removable, RETRAIN_GROWTH
+except ImportError:
+    from ingest import MANIFEST_NAME, MANIFEST_VERSION, load_manifest, save_manifest, sync_store, text_ids
+    from ann import IndexSpec, apply_search_params, faiss_store, load_mmapped, removable, RETRAIN_GROWTH
+
+def _load(index_dir: str, embeddings, spec: IndexSpec, mmap: bool):
     try:
         from langchain_community.vectorstores import FAISS
     except ImportError:
         from langchain.vectorstores import FAISS
 
+    def read(flags):
+        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True, io_flags=flags)
+
+    vs = load_mmapped(read) if mmap else read(0)
+    apply_search_params(vs.index, spec)
+    return vs
+
+def get_vectorstore(texts: List[str], metadatas: Optional[List[dict]] = None,
+                    embeddings=None, index_dir: Optional[str] = None,
+                    index: Union[str, IndexSpec, None] = None, mmap: bool = False):
+    """
+    `index` picks the FAISS index type (see utils.ann.IndexSpec, default exact "flat").
+    With `mmap`, an index that needs no update is opened memory-mapped.
+    """
+    spec = IndexSpec.parse(index)
+
+    def create(t, m, ids):
+        return faiss_store(t, embeddings, m, ids, spec)
+
+    if not index_dir:
+        return create(texts, metadatas, None)
+
     # Load existing index if available (Saves time)
-    if index_dir and Path(index_dir, "index.faiss").exists():
-        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
-
-    # Create new if not exists
-    vs = FAISS.from_texts(texts=texts, embedding=embeddings, metadatas=metadatas)
-    if index_dir:
-        Path(index_dir).mkdir(parents=True, exist_ok=True)
-        vs.save_local(index_dir) # Save to disk
+    exists = Path(index_dir, "index.faiss").exists()
+    if exists and not texts:
+        return _load(index_dir, embeddings, spec, mmap)
+    manifest_path = Path(index_dir, MANIFEST_NAME)
+    manifest = load_manifest(str(manifest_path)) if exists else None
+
+    # Built before the manifest existed (chunk ids unknown), with other build parameters,
+    # or trained on a much smaller corpus: rebuild once.
+    ids = text_ids(texts, metadatas)
+    rebuild = manifest is None or (
+        IndexSpec.parse(manifest.get("index")).build_key() != spec.build_key()
+        or (spec.trained and len(ids) > RETRAIN_GROWTH * manifest.get("trained_on", 0)))
+    known = set() if rebuild else set(manifest["chunks"])
+
+    # Embed only texts the index does not have yet; drop the ones no longer passed in.
+    metas = metadatas or [{}] * len(texts)
+    add = {i: (t, m) for i, t, m in zip(ids, texts, metas) if i not in known}
+    remove = known - set(ids)
+    if not rebuild and not add and not remove:
+        return _load(index_dir, embeddings, spec, mmap)
+    vs = None if rebuild else _load(index_dir, embeddings, spec, mmap=False)
+    if vs is not None and remove and not removable(vs.index):
+        rebuild, vs, remove = True, None, set()
+        add = {i: (t, m) for i, t, m in zip(ids, texts, metas)}
+    vs = sync_store(vs, add, remove, create)
+    Path(index_dir).mkdir(parents=True, exist_ok=True)
+    vs.save_local(index_dir) # Save to disk
+    trained_on = len(ids) if rebuild else manifest.get("trained_on", len(ids))
+    save_manifest(str(manifest_path), {"version": MANIFEST_VERSION, "chunks": ids,
+                                       "index": str(spec), "trained_on": trained_on})
     return vs
 
 def ensure_faiss_index(docs: List[str], metas: Optional[List[dict]] = None,
-                       index_dir: str = "storage/faiss/previsit", embeddings=None):
-    return get_vectorstore(docs, metas, embeddings, index_dir=index_dir)
+                       index_dir: str = "storage/faiss/previsit", embeddings=None,
+                       index: Union[str, IndexSpec, None] = None, mmap: bool = False):
+    return get_vectorstore(docs, metas, embeddings, index_dir=index_dir, index=index, mmap=mmap)